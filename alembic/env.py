@@ -2,39 +2,20 @@ import os
 import sys
 from logging.config import fileConfig
 
-from sqlalchemy import engine_from_config, pool
 from alembic import context
-from app.models.base import Base  # Chỉ import metadata, không engine async
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from app.models.base import Base  # Chỉ import metadata, không engine async
+from app.database import get_sync_engine, to_sync_url
+
 config = context.config
 fileConfig(config.config_file_name)
 target_metadata = Base.metadata
 
-# env.py
-from sqlalchemy import engine_from_config, pool
-from alembic import context
-from app.models.base import Base
-import os
-
-target_metadata = Base.metadata
 
 def get_sync_database_url():
-    url = os.getenv("DATABASE_URL")
-    if url.startswith("postgresql+asyncpg://"):
-        url = url.replace("postgresql+asyncpg://", "postgresql+psycopg2://")
-    return url
-
-configuration = context.config.get_section(config.config_ini_section)
-configuration["sqlalchemy.url"] = get_sync_database_url()
-
-connectable = engine_from_config(configuration, prefix="sqlalchemy.", poolclass=pool.NullPool)
-
-with connectable.connect() as connection:
-    context.configure(connection=connection, target_metadata=target_metadata)
-    with context.begin_transaction():
-        context.run_migrations()
+    return to_sync_url(os.getenv("DATABASE_URL", config.get_main_option("sqlalchemy.url")))
 
 
 def run_migrations_offline():
@@ -48,19 +29,14 @@ def run_migrations_offline():
     with context.begin_transaction():
         context.run_migrations()
 
+
 def run_migrations_online():
-    configuration = config.get_section(config.config_ini_section)
-    configuration["sqlalchemy.url"] = get_sync_database_url()
-    connectable = engine_from_config(
-        configuration,
-        prefix="sqlalchemy.",
-        poolclass=pool.NullPool,
-    )
-    with connectable.connect() as connection:
+    with get_sync_engine(get_sync_database_url()).connect() as connection:
         context.configure(connection=connection, target_metadata=target_metadata)
         with context.begin_transaction():
             context.run_migrations()
 
+
 if context.is_offline_mode():
     run_migrations_offline()
 else:
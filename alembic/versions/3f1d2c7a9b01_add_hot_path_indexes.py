@@ -0,0 +1,52 @@
+"""add indexes for hot query predicates
+
+Revision ID: 3f1d2c7a9b01
+Revises: 1234567890ab
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1d2c7a9b01'
+down_revision = '1234567890ab'
+branch_labels = None
+depends_on = None
+
+
+# (index name, table, definition)
+INDEXES = [
+    # Tra cứu token khi xác thực
+    ('ix_account_token_token_value', 'account_token', '(token_value)'),
+    # Kiểm tra trùng lịch: tsrange(started_time, finished_time) && tsrange(checkin, checkout)
+    ('ix_booking_timeslot_room_period', 'booking_timeslot',
+     'USING gist (room_id, tsrange(started_time, finished_time))'),
+    ('ix_booking_timeslot_invoice_id', 'booking_timeslot', '(invoice_id)'),
+    ('ix_booking_customer_id_status', 'booking', '(customer_id, status)'),
+    ('ix_booking_zp_trans_id', 'booking', '(zp_trans_id)'),
+    ('ix_booking_detail_booking_id_status', 'booking_detail', '(booking_id, status)'),
+    ('ix_invoice_partner_id_finished_time', 'invoice', '(partner_id, finished_time)'),
+    ('ix_invoice_booking_detail_id', 'invoice', '(booking_detail_id)'),
+    ('ix_resort_images_resort_id', 'resort_images', '(resort_id)'),
+    ('ix_service_resort_id', 'service', '(resort_id)'),
+    ('ix_room_type_resort_id', 'room_type', '(resort_id)'),
+    ('ix_room_images_room_type_id', 'room_images', '(room_type_id)'),
+    ('ix_offer_room_type_id', 'offer', '(room_type_id)'),
+]
+
+
+def upgrade():
+    # btree_gist cho phép đưa cột integer room_id vào cùng GiST index với tsrange
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+
+    # CONCURRENTLY không chạy được trong transaction
+    with op.get_context().autocommit_block():
+        for name, table, definition in INDEXES:
+            op.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} {definition}')
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, _, _ in reversed(INDEXES):
+            op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
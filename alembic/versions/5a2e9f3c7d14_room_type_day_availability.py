@@ -0,0 +1,46 @@
+"""room_type_day_availability daily counters
+
+Revision ID: 5a2e9f3c7d14
+Revises: 8c4e7b2d5f10
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5a2e9f3c7d14'
+down_revision = '8c4e7b2d5f10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'room_type_day_availability',
+        sa.Column('room_type_id', sa.Integer(), sa.ForeignKey('room_type.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('booked_rooms', sa.Integer(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('room_type_id', 'day'),
+    )
+
+    # Dựng số liệu từ booking_timeslot hiện có, mỗi timeslot tính cho các đêm
+    # từ ngày bắt đầu tới trước ngày kết thúc (ít nhất một đêm)
+    op.execute("""
+        INSERT INTO room_type_day_availability (room_type_id, day, booked_rooms)
+        SELECT r.room_type_id, d::date, count(*)
+        FROM booking_timeslot bt
+        JOIN room r ON r.id = bt.room_id
+        CROSS JOIN LATERAL generate_series(
+            bt.started_time::date::timestamp,
+            GREATEST(bt.finished_time::date - 1, bt.started_time::date)::timestamp,
+            interval '1 day'
+        ) AS d
+        WHERE r.room_type_id IS NOT NULL
+        GROUP BY r.room_type_id, d::date
+    """)
+
+
+def downgrade():
+    op.drop_table('room_type_day_availability')
@@ -0,0 +1,64 @@
+"""booking_timeslot period column with exclusion constraint
+
+Revision ID: 8c4e7b2d5f10
+Revises: 3f1d2c7a9b01
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c4e7b2d5f10'
+down_revision = '3f1d2c7a9b01'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conn = op.get_bind()
+
+    # tsrange() lỗi với khoảng ngược, còn EXCLUDE lỗi với dữ liệu đang trùng lịch,
+    # nên kiểm tra trước để báo lỗi rõ ràng thay vì lỗi giữa chừng
+    inverted = conn.execute(sa.text(
+        "SELECT count(*) FROM booking_timeslot WHERE finished_time < started_time"
+    )).scalar()
+    if inverted:
+        raise RuntimeError(f"{inverted} booking_timeslot rows have finished_time < started_time, fix them first")
+
+    overlapping = conn.execute(sa.text("""
+        SELECT count(*) FROM booking_timeslot a
+        JOIN booking_timeslot b
+          ON a.room_id = b.room_id
+         AND a.started_time < b.started_time
+         AND tsrange(a.started_time, a.finished_time) && tsrange(b.started_time, b.finished_time)
+    """)).scalar()
+    if overlapping:
+        raise RuntimeError(f"{overlapping} pairs of overlapping booking_timeslot rows, fix them first")
+
+    op.execute(
+        'ALTER TABLE booking_timeslot ADD COLUMN period tsrange '
+        'GENERATED ALWAYS AS (tsrange(started_time, finished_time)) STORED'
+    )
+    # Hai timeslot của cùng một phòng không được trùng nhau - database chặn overbooking
+    # kể cả khi hai transaction cùng chọn một phòng
+    op.execute(
+        'ALTER TABLE booking_timeslot ADD CONSTRAINT ex_booking_timeslot_room_period '
+        'EXCLUDE USING gist (room_id WITH =, period WITH &&)'
+    )
+
+    # Index của exclusion constraint phục vụ luôn các truy vấn trùng lịch
+    with op.get_context().autocommit_block():
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_booking_timeslot_room_period')
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.execute(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_booking_timeslot_room_period '
+            'ON booking_timeslot USING gist (room_id, tsrange(started_time, finished_time))'
+        )
+
+    op.execute('ALTER TABLE booking_timeslot DROP CONSTRAINT IF EXISTS ex_booking_timeslot_room_period')
+    op.execute('ALTER TABLE booking_timeslot DROP COLUMN IF EXISTS period')
@@ -0,0 +1,64 @@
+"""NOTIFY triggers on booking_timeslot and room for the in-memory availability index
+
+Revision ID: 9d4b1e6a2c38
+Revises: 5a2e9f3c7d14
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '9d4b1e6a2c38'
+down_revision = '5a2e9f3c7d14'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Payload gọn dạng CSV, thời gian là epoch microsecond của timestamp (không timezone):
+    #   I,<room_id>,<start>,<end>  timeslot được thêm
+    #   D,<room_id>,<start>,<end>  timeslot bị xóa
+    #   R,<room_id>,<room_type_id> phòng được thêm hoặc đổi loại phòng
+    #   X,<room_id>                phòng bị xóa
+    op.execute("""
+        CREATE OR REPLACE FUNCTION notify_availability_index() RETURNS trigger AS $$
+        BEGIN
+            IF TG_TABLE_NAME = 'booking_timeslot' THEN
+                IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                    PERFORM pg_notify('availability_index', concat_ws(',', 'D', OLD.room_id,
+                        (extract(epoch FROM OLD.started_time) * 1000000)::bigint,
+                        (extract(epoch FROM OLD.finished_time) * 1000000)::bigint));
+                END IF;
+                IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                    PERFORM pg_notify('availability_index', concat_ws(',', 'I', NEW.room_id,
+                        (extract(epoch FROM NEW.started_time) * 1000000)::bigint,
+                        (extract(epoch FROM NEW.finished_time) * 1000000)::bigint));
+                END IF;
+            ELSE
+                IF TG_OP = 'DELETE' THEN
+                    PERFORM pg_notify('availability_index', concat_ws(',', 'X', OLD.id));
+                ELSE
+                    PERFORM pg_notify('availability_index', concat_ws(',', 'R', NEW.id, coalesce(NEW.room_type_id::text, '')));
+                END IF;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER trg_booking_timeslot_notify_availability
+        AFTER INSERT OR UPDATE OR DELETE ON booking_timeslot
+        FOR EACH ROW EXECUTE FUNCTION notify_availability_index()
+    """)
+    op.execute("""
+        CREATE TRIGGER trg_room_notify_availability
+        AFTER INSERT OR UPDATE OF room_type_id OR DELETE ON room
+        FOR EACH ROW EXECUTE FUNCTION notify_availability_index()
+    """)
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS trg_room_notify_availability ON room")
+    op.execute("DROP TRIGGER IF EXISTS trg_booking_timeslot_notify_availability ON booking_timeslot")
+    op.execute("DROP FUNCTION IF EXISTS notify_availability_index()")
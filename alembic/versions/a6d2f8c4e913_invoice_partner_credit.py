@@ -0,0 +1,34 @@
+"""invoice credited_at / credit_reversed_at for exactly-once partner balance credits
+
+Revision ID: a6d2f8c4e913
+Revises: f3a9c5d1e7b2
+Create Date: 2026-10-18 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6d2f8c4e913'
+down_revision = 'f3a9c5d1e7b2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('invoice', sa.Column('credited_at', sa.TIMESTAMP(), nullable=True))
+    op.add_column('invoice', sa.Column('credit_reversed_at', sa.TIMESTAMP(), nullable=True))
+
+    # Invoice có từ trước được coi là đã đối soát với partner.balance hiện tại: đánh dấu đã cộng
+    # để cơ chế mới chỉ áp dụng cho invoice tạo sau migration, không cộng lại lịch sử
+    op.execute("""
+        UPDATE invoice
+        SET credited_at = coalesce(finished_time, now())
+        WHERE partner_id IS NOT NULL
+    """)
+
+
+def downgrade():
+    op.drop_column('invoice', 'credit_reversed_at')
+    op.drop_column('invoice', 'credited_at')
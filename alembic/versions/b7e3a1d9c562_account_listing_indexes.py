@@ -0,0 +1,35 @@
+"""indexes for keyset pagination of admin account listing
+
+Revision ID: b7e3a1d9c562
+Revises: 9d4b1e6a2c38
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e3a1d9c562'
+down_revision = '9d4b1e6a2c38'
+branch_labels = None
+depends_on = None
+
+
+# (index name, table, definition)
+INDEXES = [
+    # Danh sách tài khoản duyệt account theo account_id rồi tra customer/partner theo account_id
+    ('ix_customer_account_id', 'customer', '(account_id)'),
+    ('ix_partner_account_id', 'partner', '(account_id)'),
+]
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, table, definition in INDEXES:
+            op.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} {definition}')
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, _, _ in reversed(INDEXES):
+            op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
@@ -0,0 +1,36 @@
+"""availability index NOTIFY triggers are installed on demand, not by migration
+
+Revision ID: b8e4c2a6d017
+Revises: a6d2f8c4e913
+Create Date: 2026-10-18 22:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8e4c2a6d017'
+down_revision = 'a6d2f8c4e913'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Index trong bộ nhớ mặc định tắt nhưng trigger vẫn làm mọi lần ghi booking_timeslot / room
+    # gửi NOTIFY. Gỡ trigger, giữ hàm notify_availability_index(); cài lại bằng
+    # python -m app.commands.availability index-enable khi bật index
+    op.execute("DROP TRIGGER IF EXISTS trg_room_notify_availability ON room")
+    op.execute("DROP TRIGGER IF EXISTS trg_booking_timeslot_notify_availability ON booking_timeslot")
+
+
+def downgrade():
+    op.execute("""
+        CREATE TRIGGER trg_booking_timeslot_notify_availability
+        AFTER INSERT OR UPDATE OR DELETE ON booking_timeslot
+        FOR EACH ROW EXECUTE FUNCTION notify_availability_index()
+    """)
+    op.execute("""
+        CREATE TRIGGER trg_room_notify_availability
+        AFTER INSERT OR UPDATE OF room_type_id OR DELETE ON room
+        FOR EACH ROW EXECUTE FUNCTION notify_availability_index()
+    """)
@@ -0,0 +1,55 @@
+"""pg_trgm + unaccent trigram indexes for resort and account search
+
+Revision ID: c4a8e2f7b913
+Revises: b7e3a1d9c562
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4a8e2f7b913'
+down_revision = 'b7e3a1d9c562'
+branch_labels = None
+depends_on = None
+
+
+# (index name, table, column) - GIN trigram trên search_normalize(column)
+INDEXES = [
+    ('ix_resort_name_trgm', 'resort', 'name'),
+    ('ix_resort_address_trgm', 'resort', 'address'),
+    ('ix_account_username_trgm', 'account', 'username'),
+    ('ix_customer_fullname_trgm', 'customer', 'fullname'),
+    ('ix_partner_name_trgm', 'partner', 'name'),
+]
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.execute('CREATE EXTENSION IF NOT EXISTS unaccent')
+
+    # unaccent() chỉ là STABLE (phụ thuộc search_path) nên không dùng được trong index expression.
+    # Wrapper chỉ định rõ dictionary và schema nên khai báo IMMUTABLE được.
+    # "Đà Nẵng" -> "da nang", khớp với người dùng gõ không dấu.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION search_normalize(text) RETURNS text
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+        AS $$ SELECT lower(public.unaccent('public.unaccent'::regdictionary, $1)) $$
+    """)
+
+    # CONCURRENTLY không chạy được trong transaction
+    with op.get_context().autocommit_block():
+        for name, table, column in INDEXES:
+            op.execute(
+                f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} '
+                f'ON {table} USING gin (search_normalize({column}) gin_trgm_ops)'
+            )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, _, _ in reversed(INDEXES):
+            op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+
+    op.execute('DROP FUNCTION IF EXISTS search_normalize(text)')
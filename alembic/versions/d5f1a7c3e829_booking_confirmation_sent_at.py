@@ -0,0 +1,34 @@
+"""booking.confirmation_sent_at marks the confirmation email as sent
+
+Revision ID: d5f1a7c3e829
+Revises: b8e4c2a6d017
+Create Date: 2026-10-18 23:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5f1a7c3e829'
+down_revision = 'b8e4c2a6d017'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('booking', sa.Column('confirmation_sent_at', sa.TIMESTAMP(), nullable=True))
+
+    # Booking đã thanh toán trước migration coi như đã gửi email, không gửi lại lịch sử
+    op.execute("UPDATE booking SET confirmation_sent_at = now() WHERE status = 'paid'")
+
+    # Chỉ chứa booking đã thanh toán còn chờ email, dùng cho enqueue-confirmations
+    op.create_index(
+        'ix_booking_confirmation_pending', 'booking', ['id'],
+        postgresql_where=sa.text("status = 'paid' AND confirmation_sent_at IS NULL")
+    )
+
+
+def downgrade():
+    op.drop_index('ix_booking_confirmation_pending', table_name='booking')
+    op.drop_column('booking', 'confirmation_sent_at')
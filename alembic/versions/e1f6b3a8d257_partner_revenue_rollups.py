@@ -0,0 +1,65 @@
+"""partner daily and monthly revenue rollups
+
+Revision ID: e1f6b3a8d257
+Revises: c4a8e2f7b913
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1f6b3a8d257'
+down_revision = 'c4a8e2f7b913'
+branch_labels = None
+depends_on = None
+
+
+# (bảng, cột thời gian, biểu thức tính từ invoice.finished_time)
+ROLLUPS = [
+    ('partner_revenue_daily', 'day', "i.finished_time::date"),
+    ('partner_revenue_monthly', 'month', "date_trunc('month', i.finished_time)::date"),
+]
+
+
+def upgrade():
+    for table, period, _ in ROLLUPS:
+        op.create_table(
+            table,
+            sa.Column('partner_id', sa.Integer(), sa.ForeignKey('partner.id', ondelete='CASCADE'), nullable=False),
+            sa.Column(period, sa.Date(), nullable=False),
+            sa.Column('resort_id', sa.Integer(), sa.ForeignKey('resort.id', ondelete='CASCADE'), nullable=False),
+            sa.Column('bookings', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('revenue', sa.Numeric(14, 2), nullable=False, server_default='0'),
+            sa.PrimaryKeyConstraint('partner_id', period, 'resort_id'),
+        )
+
+    # Dựng số liệu từ invoice hiện có. Invoice không có finished_time (tạo bởi POST /payment cũ)
+    # không thuộc ngày nào nên không được tính.
+    for table, period, expression in ROLLUPS:
+        op.execute(f"""
+            INSERT INTO {table} (partner_id, {period}, resort_id, bookings, revenue)
+            SELECT i.partner_id, {expression}, rt.resort_id, count(*), coalesce(sum(i.cost), 0)
+            FROM invoice i
+            JOIN booking_detail bd ON bd.id = i.booking_detail_id
+            JOIN offer o ON o.id = bd.offer_id
+            JOIN room_type rt ON rt.id = o.room_type_id
+            WHERE i.partner_id IS NOT NULL AND i.finished_time IS NOT NULL
+            GROUP BY 1, 2, 3
+        """)
+
+    # Phân trang lịch sử rút tiền theo partner, mới nhất trước
+    with op.get_context().autocommit_block():
+        op.execute(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_withdraw_partner_id_created_at '
+            'ON withdraw (partner_id, created_at)'
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_withdraw_partner_id_created_at')
+
+    for table, _, _ in reversed(ROLLUPS):
+        op.drop_table(table)
@@ -0,0 +1,35 @@
+"""account_token.token_value is TEXT: JWTs carry roles and ids and can exceed 500 chars
+
+Revision ID: e7c3b9d1f456
+Revises: d5f1a7c3e829
+Create Date: 2026-10-18 23:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7c3b9d1f456'
+down_revision = 'd5f1a7c3e829'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # varchar -> text không ghi lại bảng và giữ nguyên index
+    op.alter_column(
+        'account_token', 'token_value',
+        existing_type=sa.String(length=500),
+        type_=sa.Text(),
+        existing_nullable=False
+    )
+
+
+def downgrade():
+    op.alter_column(
+        'account_token', 'token_value',
+        existing_type=sa.Text(),
+        type_=sa.String(length=500),
+        existing_nullable=False
+    )
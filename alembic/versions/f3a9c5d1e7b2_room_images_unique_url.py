@@ -0,0 +1,45 @@
+"""unique (room_type_id, url) on room_images for bulk upsert
+
+Revision ID: f3a9c5d1e7b2
+Revises: e1f6b3a8d257
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a9c5d1e7b2'
+down_revision = 'e1f6b3a8d257'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Mỗi (room_type_id, url) giữ một ảnh: ưu tiên ảnh chưa xóa, sau đó id nhỏ nhất.
+    # room_images không được bảng nào tham chiếu nên xóa bản trùng an toàn.
+    op.execute("""
+        DELETE FROM room_images ri
+        USING (
+            SELECT id, row_number() OVER (
+                PARTITION BY room_type_id, url
+                ORDER BY coalesce(is_deleted, false), id
+            ) AS rn
+            FROM room_images
+        ) ranked
+        WHERE ri.id = ranked.id AND ranked.rn > 1
+    """)
+
+    # CONCURRENTLY không chạy được trong transaction. Nếu ảnh trùng được thêm giữa lúc xóa và
+    # lúc tạo index thì lệnh tạo index lỗi: chạy lại migration (DROP trước vì index lỗi vẫn còn, INVALID)
+    with op.get_context().autocommit_block():
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS uq_room_images_room_type_url')
+        op.execute(
+            'CREATE UNIQUE INDEX CONCURRENTLY uq_room_images_room_type_url '
+            'ON room_images (room_type_id, url)'
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS uq_room_images_room_type_url')
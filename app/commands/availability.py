@@ -0,0 +1,131 @@
+"""
+Dựng lại và kiểm tra bảng room_type_day_availability (số phòng đã giữ theo từng đêm).
+
+    python -m app.commands.availability check                 # so sánh với booking_timeslot, exit 1 nếu lệch
+    python -m app.commands.availability check --room-type 3
+    python -m app.commands.availability rebuild               # tính lại toàn bộ từ booking_timeslot
+    python -m app.commands.availability rebuild --room-type 3
+
+Trigger NOTIFY cho index phòng trống trong bộ nhớ (AVAILABILITY_INDEX_ENABLED):
+
+    python -m app.commands.availability index-enable    # cài trigger, chạy trước khi bật index
+    python -m app.commands.availability index-disable   # gỡ trigger, chạy sau khi đã tắt index
+"""
+import argparse
+import asyncio
+import sys
+from typing import Optional
+
+from sqlalchemy import text
+
+import app.models  # noqa: F401 - nạp models trước app.database để tránh import vòng
+from app.db_async import AsyncSessionLocal
+from app.services import availability_index
+
+# Số phòng đã giữ theo (room_type_id, đêm) tính trực tiếp từ booking_timeslot,
+# cùng quy ước với availability_service.night_range
+EXPECTED_SQL = """
+    SELECT r.room_type_id, d::date AS day, count(*) AS booked_rooms
+    FROM booking_timeslot bt
+    JOIN room r ON r.id = bt.room_id
+    CROSS JOIN LATERAL generate_series(
+        bt.started_time::date::timestamp,
+        GREATEST(bt.finished_time::date - 1, bt.started_time::date)::timestamp,
+        interval '1 day'
+    ) AS d
+    WHERE r.room_type_id IS NOT NULL {filter}
+    GROUP BY r.room_type_id, d::date
+"""
+
+DIFF_SQL = """
+    WITH expected AS ({expected}),
+    stored AS (
+        SELECT room_type_id, day, booked_rooms
+        FROM room_type_day_availability
+        WHERE booked_rooms <> 0 {filter}
+    )
+    SELECT coalesce(e.room_type_id, s.room_type_id) AS room_type_id,
+           coalesce(e.day, s.day) AS day,
+           coalesce(e.booked_rooms, 0) AS expected,
+           coalesce(s.booked_rooms, 0) AS stored
+    FROM expected e
+    FULL OUTER JOIN stored s ON s.room_type_id = e.room_type_id AND s.day = e.day
+    WHERE coalesce(e.booked_rooms, 0) <> coalesce(s.booked_rooms, 0)
+    ORDER BY 1, 2
+"""
+
+
+def _filters(room_type_id: Optional[int]) -> tuple[str, str, dict]:
+    if room_type_id is None:
+        return "", "", {}
+    return "AND r.room_type_id = :room_type_id", "AND room_type_id = :room_type_id", {"room_type_id": room_type_id}
+
+
+async def check(room_type_id: Optional[int], limit: int) -> int:
+    expected_filter, stored_filter, params = _filters(room_type_id)
+    sql = DIFF_SQL.format(expected=EXPECTED_SQL.format(filter=expected_filter), filter=stored_filter)
+
+    async with AsyncSessionLocal() as db:
+        rows = (await db.execute(text(sql), params)).all()
+
+    for row in rows[:limit]:
+        print(f"room_type={row.room_type_id} day={row.day} expected={row.expected} stored={row.stored}")
+    if len(rows) > limit:
+        print(f"... {len(rows) - limit} more")
+    print(f"{len(rows)} mismatched (room_type, day) row(s)")
+    return 1 if rows else 0
+
+
+async def rebuild(room_type_id: Optional[int]) -> int:
+    expected_filter, stored_filter, params = _filters(room_type_id)
+
+    async with AsyncSessionLocal() as db:
+        # SHARE chặn ghi vào booking_timeslot trong lúc dựng lại để không mất thay đổi đồng thời,
+        # vẫn cho phép đọc
+        await db.execute(text("LOCK TABLE booking_timeslot IN SHARE MODE"))
+        await db.execute(text(f"DELETE FROM room_type_day_availability WHERE true {stored_filter}"), params)
+        result = await db.execute(text(
+            "INSERT INTO room_type_day_availability (room_type_id, day, booked_rooms) "
+            + EXPECTED_SQL.format(filter=expected_filter)
+        ), params)
+        await db.commit()
+
+    print(f"Rebuilt {result.rowcount} (room_type, day) row(s)")
+    return 0
+
+
+async def set_index_triggers(enabled: bool) -> int:
+    statements = availability_index.install_triggers_sql() if enabled else availability_index.uninstall_triggers_sql()
+    async with AsyncSessionLocal() as db:
+        for statement in statements:
+            await db.execute(text(statement))
+        await db.commit()
+
+    print(f"Availability index triggers {'installed' if enabled else 'removed'}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    check_parser = sub.add_parser("check")
+    check_parser.add_argument("--room-type", type=int)
+    check_parser.add_argument("--limit", type=int, default=50, help="Số dòng sai lệch tối đa được in ra")
+
+    rebuild_parser = sub.add_parser("rebuild")
+    rebuild_parser.add_argument("--room-type", type=int)
+
+    sub.add_parser("index-enable")
+    sub.add_parser("index-disable")
+
+    args = parser.parse_args()
+    if args.command == "check":
+        sys.exit(asyncio.run(check(args.room_type, args.limit)))
+    if args.command in ("index-enable", "index-disable"):
+        sys.exit(asyncio.run(set_index_triggers(args.command == "index-enable")))
+    sys.exit(asyncio.run(rebuild(args.room_type)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Quản lý background job queue.
+
+    python -m app.commands.jobs worker --concurrency 4
+    python -m app.commands.jobs stats
+    python -m app.commands.jobs dead --limit 20
+    python -m app.commands.jobs requeue-dead
+    python -m app.commands.jobs requeue-processing
+    python -m app.commands.jobs enqueue-confirmations   # booking đã thanh toán chưa gửi email xác nhận
+"""
+import argparse
+import asyncio
+import json
+import signal
+
+import app.models  # noqa: F401 - nạp models trước app.database để tránh import vòng
+from app.services import job_queue, mail_delivery
+
+
+async def _worker(concurrency: int):
+    # Import để đăng ký handler cho các job sau thanh toán
+    import app.services.payment_jobs  # noqa: F401
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    # Consumer dừng sau job đang chạy và lần BLMOVE hiện tại (tối đa 1s)
+    await job_queue.run_worker(concurrency, stop)
+    print(f"[JOBS] Mail metrics: {json.dumps(mail_delivery.metrics())}")
+    await mail_delivery.close()
+    print("[JOBS] Worker stopped")
+
+
+async def _run(args):
+    if args.command == "worker":
+        await _worker(args.concurrency)
+    elif args.command == "stats":
+        print(json.dumps(await job_queue.stats()))
+    elif args.command == "dead":
+        for job_data in await job_queue.list_dead(args.limit):
+            print(json.dumps(job_data, ensure_ascii=False))
+    elif args.command == "requeue-dead":
+        print(f"Requeued {await job_queue.requeue_dead()} dead job(s)")
+    elif args.command == "requeue-processing":
+        print(f"Requeued {await job_queue.requeue_processing()} processing job(s)")
+    elif args.command == "enqueue-confirmations":
+        from app.services import payment_jobs
+        print(f"Enqueued {await payment_jobs.enqueue_all_pending_confirmations()} confirmation job(s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    worker = sub.add_parser("worker")
+    worker.add_argument("--concurrency", type=int, default=job_queue.JOB_WORKER_CONCURRENCY)
+
+    sub.add_parser("stats")
+
+    dead = sub.add_parser("dead")
+    dead.add_argument("--limit", type=int, default=20)
+
+    sub.add_parser("requeue-dead")
+    sub.add_parser("requeue-processing")
+    sub.add_parser("enqueue-confirmations")
+
+    asyncio.run(_run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
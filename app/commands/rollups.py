@@ -0,0 +1,123 @@
+"""
+Dựng lại và kiểm tra bảng doanh thu tổng hợp của partner (partner_revenue_daily, partner_revenue_monthly).
+
+    python -m app.commands.rollups check                # so sánh với invoice, exit 1 nếu lệch
+    python -m app.commands.rollups check --partner 3
+    python -m app.commands.rollups rebuild              # tính lại toàn bộ từ invoice
+    python -m app.commands.rollups rebuild --partner 3
+"""
+import argparse
+import asyncio
+import sys
+from typing import Optional
+
+from sqlalchemy import text
+
+import app.models  # noqa: F401 - nạp models trước app.database để tránh import vòng
+from app.db_async import AsyncSessionLocal
+
+# (bảng, cột thời gian, biểu thức tính từ invoice.finished_time), cùng quy ước với revenue_rollup
+ROLLUPS = [
+    ("partner_revenue_daily", "day", "i.finished_time::date"),
+    ("partner_revenue_monthly", "month", "date_trunc('month', i.finished_time)::date"),
+]
+
+EXPECTED_SQL = """
+    SELECT i.partner_id, {expression} AS {period}, rt.resort_id,
+           count(*) AS bookings, coalesce(sum(i.cost), 0) AS revenue
+    FROM invoice i
+    JOIN booking_detail bd ON bd.id = i.booking_detail_id
+    JOIN offer o ON o.id = bd.offer_id
+    JOIN room_type rt ON rt.id = o.room_type_id
+    WHERE i.partner_id IS NOT NULL AND i.finished_time IS NOT NULL {filter}
+    GROUP BY 1, 2, 3
+"""
+
+DIFF_SQL = """
+    WITH expected AS ({expected}),
+    stored AS (
+        SELECT partner_id, {period}, resort_id, bookings, revenue
+        FROM {table}
+        WHERE bookings <> 0 {filter}
+    )
+    SELECT coalesce(e.partner_id, s.partner_id) AS partner_id,
+           coalesce(e.{period}, s.{period}) AS period,
+           coalesce(e.resort_id, s.resort_id) AS resort_id,
+           coalesce(e.bookings, 0) AS expected_bookings,
+           coalesce(s.bookings, 0) AS stored_bookings,
+           coalesce(e.revenue, 0) AS expected_revenue,
+           coalesce(s.revenue, 0) AS stored_revenue
+    FROM expected e
+    FULL OUTER JOIN stored s
+        ON s.partner_id = e.partner_id AND s.{period} = e.{period} AND s.resort_id = e.resort_id
+    WHERE coalesce(e.bookings, 0) <> coalesce(s.bookings, 0)
+       OR coalesce(e.revenue, 0) <> coalesce(s.revenue, 0)
+    ORDER BY 1, 2, 3
+"""
+
+
+def _filters(partner_id: Optional[int]) -> tuple[str, str, dict]:
+    if partner_id is None:
+        return "", "", {}
+    return "AND i.partner_id = :partner_id", "AND partner_id = :partner_id", {"partner_id": partner_id}
+
+
+async def check(partner_id: Optional[int], limit: int) -> int:
+    expected_filter, stored_filter, params = _filters(partner_id)
+    mismatched = 0
+
+    async with AsyncSessionLocal() as db:
+        for table, period, expression in ROLLUPS:
+            expected = EXPECTED_SQL.format(expression=expression, period=period, filter=expected_filter)
+            sql = DIFF_SQL.format(expected=expected, table=table, period=period, filter=stored_filter)
+            rows = (await db.execute(text(sql), params)).all()
+
+            for row in rows[:limit]:
+                print(f"{table}: partner={row.partner_id} {period}={row.period} resort={row.resort_id} "
+                      f"bookings={row.expected_bookings}/{row.stored_bookings} "
+                      f"revenue={row.expected_revenue}/{row.stored_revenue} (expected/stored)")
+            if len(rows) > limit:
+                print(f"... {len(rows) - limit} more")
+            print(f"{table}: {len(rows)} mismatched row(s)")
+            mismatched += len(rows)
+
+    return 1 if mismatched else 0
+
+
+async def rebuild(partner_id: Optional[int]) -> int:
+    expected_filter, stored_filter, params = _filters(partner_id)
+
+    async with AsyncSessionLocal() as db:
+        # SHARE chặn tạo invoice trong lúc dựng lại để không mất thay đổi đồng thời, vẫn cho phép đọc
+        await db.execute(text("LOCK TABLE invoice IN SHARE MODE"))
+        for table, period, expression in ROLLUPS:
+            await db.execute(text(f"DELETE FROM {table} WHERE true {stored_filter}"), params)
+            result = await db.execute(text(
+                f"INSERT INTO {table} (partner_id, {period}, resort_id, bookings, revenue) "
+                + EXPECTED_SQL.format(expression=expression, period=period, filter=expected_filter)
+            ), params)
+            print(f"Rebuilt {result.rowcount} {table} row(s)")
+        await db.commit()
+
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    check_parser = sub.add_parser("check")
+    check_parser.add_argument("--partner", type=int)
+    check_parser.add_argument("--limit", type=int, default=50, help="Số dòng sai lệch tối đa được in ra mỗi bảng")
+
+    rebuild_parser = sub.add_parser("rebuild")
+    rebuild_parser.add_argument("--partner", type=int)
+
+    args = parser.parse_args()
+    if args.command == "check":
+        sys.exit(asyncio.run(check(args.partner, args.limit)))
+    sys.exit(asyncio.run(rebuild(args.partner)))
+
+
+if __name__ == "__main__":
+    main()
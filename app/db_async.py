@@ -1,23 +1,20 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from fastapi import Depends
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import sessionmaker
 import os
 
+from app.db_engine import create_async_db_engine, TimeoutSession, set_local_statement_timeout_sql
+
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql+asyncpg://user:password@db:5432/fastapi_db")
 
-# Engine async - disable prepared statements for Supabase pgbouncer
-engine = create_async_engine(
-    DATABASE_URL, 
-    echo=True,
-    connect_args={
-        "statement_cache_size": 0,  # Required for pgbouncer transaction mode
-        "prepared_statement_cache_size": 0
-    }
-)
+# Engine async - pool, echo, timeout cấu hình qua biến môi trường (xem app/db_engine.py)
+engine = create_async_db_engine(DATABASE_URL)
 
 # Session async
 AsyncSessionLocal = sessionmaker(
     bind=engine,
     class_=AsyncSession,
+    sync_session_class=TimeoutSession,
     expire_on_commit=False
 )
 
@@ -25,3 +22,21 @@ AsyncSessionLocal = sessionmaker(
 async def get_db():
     async with AsyncSessionLocal() as session:
         yield session
+
+
+def statement_timeout(timeout_ms: int):
+    """
+    Dependency đặt statement timeout riêng cho một route, thay cho DB_STATEMENT_TIMEOUT_MS:
+
+        @router.get("/search", dependencies=[Depends(statement_timeout(3000))])
+
+    get_db được FastAPI cache trong một request nên route dùng chung session này.
+    """
+    async def dependency(db: AsyncSession = Depends(get_db)):
+        db.info["statement_timeout_ms"] = timeout_ms
+        if db.in_transaction():
+            # Transaction đã mở trước đó (vd. trong dependency xác thực), áp dụng ngay
+            connection = await db.connection()
+            await connection.exec_driver_sql(set_local_statement_timeout_sql(timeout_ms))
+
+    return dependency
@@ -0,0 +1,168 @@
+# db_engine.py - tạo engine dùng chung cho bản async và sync
+import os
+import threading
+import time
+
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
+
+
+def _env_bool(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
+# Config - pool tính theo từng worker process: tổng kết nối = số worker * (POOL_SIZE + MAX_OVERFLOW)
+DB_ECHO = _env_bool("DB_ECHO", "false")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", "true")
+# Chạy sau pgbouncer thì để pgbouncer giữ pool, app không giữ kết nối (NullPool)
+DB_USE_PGBOUNCER = _env_bool("DB_USE_PGBOUNCER", "false")
+# Timeout mặc định cho mọi câu lệnh, 0 = không giới hạn
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+
+# Mốc (ms) cho histogram thời gian chờ lấy kết nối
+WAIT_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+
+class PoolStats:
+    """Thống kê thời gian chờ checkout kết nối của một pool"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_ms_total = 0.0
+        self.wait_ms_max = 0.0
+        self.wait_buckets = [0] * (len(WAIT_BUCKETS_MS) + 1)
+
+    def record(self, wait_ms: float, timed_out: bool):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_ms_total += wait_ms
+            self.wait_ms_max = max(self.wait_ms_max, wait_ms)
+            for i, bound in enumerate(WAIT_BUCKETS_MS):
+                if wait_ms <= bound:
+                    self.wait_buckets[i] += 1
+                    break
+            else:
+                self.wait_buckets[-1] += 1
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            attempts = self.checkouts + self.timeouts
+            buckets = {f"le_{bound}ms": count for bound, count in zip(WAIT_BUCKETS_MS, self.wait_buckets)}
+            buckets["gt_%dms" % WAIT_BUCKETS_MS[-1]] = self.wait_buckets[-1]
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_ms_avg": round(self.wait_ms_total / attempts, 3) if attempts else 0.0,
+                "wait_ms_max": round(self.wait_ms_max, 3),
+                "wait_ms_buckets": buckets,
+            }
+
+
+class _InstrumentedPoolMixin:
+    """
+    Đo thời gian chờ trong _do_get (gồm cả thời gian mở kết nối mới khi dùng overflow).
+    Pool.recreate() tạo pool mới qua self.__class__ nên thống kê bắt đầu lại từ 0.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            self.stats.record((time.perf_counter() - started) * 1000, timed_out)
+
+
+class InstrumentedQueuePool(_InstrumentedPoolMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def _pool_kwargs(pool_class) -> dict:
+    if DB_USE_PGBOUNCER:
+        return {"poolclass": NullPool}
+    return {
+        "poolclass": pool_class,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+def create_async_db_engine(url: str):
+    return create_async_engine(
+        url,
+        echo=DB_ECHO,
+        connect_args={
+            "statement_cache_size": 0,  # Required for pgbouncer transaction mode
+            "prepared_statement_cache_size": 0
+        },
+        **_pool_kwargs(InstrumentedAsyncQueuePool)
+    )
+
+
+def create_sync_db_engine(url: str):
+    return create_engine(url, echo=DB_ECHO, **_pool_kwargs(InstrumentedQueuePool))
+
+
+def pool_metrics(engine) -> dict:
+    """Trạng thái pool của engine (sync hoặc async) trong worker hiện tại"""
+    pool = getattr(engine, "sync_engine", engine).pool
+    if not isinstance(pool, _InstrumentedPoolMixin):
+        return {"pool": type(pool).__name__}
+
+    capacity = pool.size() + pool._max_overflow
+    checked_out = pool.checkedout()
+    return {
+        "pool": type(pool).__name__,
+        "size": pool.size(),
+        "max_overflow": pool._max_overflow,
+        "checked_out": checked_out,
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "saturation": round(checked_out / capacity, 3) if capacity else 0.0,
+        **pool.stats.as_dict(),
+    }
+
+
+class TimeoutSession(Session):
+    """
+    Session đặt statement_timeout bằng SET LOCAL ở đầu mỗi transaction.
+    SET LOCAL chỉ sống trong transaction nên vẫn an toàn với pgbouncer transaction mode.
+    Timeout lấy từ session.info["statement_timeout_ms"], mặc định DB_STATEMENT_TIMEOUT_MS.
+    """
+
+
+def set_local_statement_timeout_sql(timeout_ms: int) -> str:
+    return f"SET LOCAL statement_timeout = {int(timeout_ms)}"
+
+
+@event.listens_for(TimeoutSession, "after_begin")
+def _apply_statement_timeout(session, transaction, connection):
+    timeout_ms = session.info.get("statement_timeout_ms", DB_STATEMENT_TIMEOUT_MS)
+    if timeout_ms:
+        connection.exec_driver_sql(set_local_statement_timeout_sql(timeout_ms))
+
@@ -1,3 +1,5 @@
+import asyncio
+
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
@@ -6,6 +8,10 @@ from app.routers.customer import cart, history, zalopay
 from app.routers.public import resorts, search, roomtypes, auth
 from app.routers.partner import partner, room_management
 from app.routers.admin import withdraw, partner_approval, account_management
+from app.services import token_cache, token_revocation, password_hasher, zalopay_service, email_service, mail_delivery, availability_index
+from app.services.auth_service import AUTH_STATELESS
+from app.db_async import engine as async_engine
+from app.db_engine import pool_metrics
 
 app = FastAPI()
 
@@ -39,12 +45,53 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Header phân trang của danh sách tài khoản admin
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "X-Total-Count-Exact"],
 )
 
+@app.on_event("startup")
+async def start_background_tasks():
+    email_service.load_templates()
+    # Lắng nghe invalidate token cache từ các worker khác
+    app.state.background_tasks = [asyncio.create_task(token_cache.listen_for_invalidations())]
+    if AUTH_STATELESS:
+        # Đồng bộ danh sách token bị revoke cho stateless JWT mode
+        app.state.background_tasks.append(asyncio.create_task(token_revocation.refresh_periodically()))
+    if availability_index.AVAILABILITY_INDEX_ENABLED:
+        # Index phòng trống trong bộ nhớ, cập nhật qua LISTEN/NOTIFY
+        app.state.background_tasks.append(asyncio.create_task(availability_index.run()))
+
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    for task in app.state.background_tasks:
+        task.cancel()
+    password_hasher.shutdown()
+    await zalopay_service.close_client()
+    await mail_delivery.close()
+
+
 @app.get("/")
 def read_root():
     return {"status": "ok", "message": "Backend is running"}
 
+
+@app.get("/metrics/db-pool")
+def db_pool_metrics():
+    # Số liệu của worker đang xử lý request, mỗi worker có pool riêng
+    return pool_metrics(async_engine)
+
+
+@app.get("/metrics/mail")
+def mail_metrics():
+    # Queue email của worker đang xử lý request; email sau thanh toán được gửi từ job worker
+    return mail_delivery.metrics()
+
+
+@app.get("/metrics/availability-index")
+def availability_index_metrics():
+    return availability_index.index.stats()
+
 # Auth routes
 app.include_router(auth.router)
 
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, Numeric, ForeignKey, TIMESTAMP
+from sqlalchemy import create_engine, Column, Integer, String, Text, Boolean, Numeric, ForeignKey, TIMESTAMP
 from sqlalchemy.orm import relationship, declarative_base
 from datetime import datetime
 from app.database import Base
@@ -8,7 +8,7 @@ class AccountToken(Base):
 
     token_id = Column(Integer, primary_key=True, autoincrement=True)
     account_id = Column(Integer, ForeignKey('account.account_id'), nullable=False)
-    token_value = Column(String(500), nullable=False)
+    token_value = Column(Text, nullable=False, index=True)  # JWT kèm roles / customer_id / partner_id, dài hơn 500 ký tự
     expires_at = Column(TIMESTAMP)
     issued_at = Column(TIMESTAMP, default=datetime.utcnow)
     is_revoked = Column(Boolean, default=False)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, ForeignKey, String, Numeric, TIMESTAMP
+from sqlalchemy import Column, Integer, ForeignKey, String, Numeric, TIMESTAMP, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -11,7 +11,16 @@ class Booking(Base):
     created_at = Column(TIMESTAMP, server_default=func.now())
     status = Column(String(255))
     cost = Column(Numeric(12, 2))
-    zp_trans_id = Column(String(255), nullable=True)  # ZaloPay transaction ID
+    zp_trans_id = Column(String(255), nullable=True, index=True)  # ZaloPay transaction ID
+    confirmation_sent_at = Column(TIMESTAMP, nullable=True)  # Đã gửi email xác nhận (payment_jobs)
+
+    __table_args__ = (
+        Index("ix_booking_customer_id_status", "customer_id", "status"),
+        Index(
+            "ix_booking_confirmation_pending", "id",
+            postgresql_where=text("status = 'paid' AND confirmation_sent_at IS NULL")
+        ),
+    )
 
     # Relationship with Customer
     customer = relationship("Customer", back_populates="bookings")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, ForeignKey, Numeric, TIMESTAMP, String
+from sqlalchemy import Column, Integer, ForeignKey, Numeric, TIMESTAMP, String, Index
 from sqlalchemy.orm import relationship
 from app.database import Base
 
@@ -13,6 +13,11 @@ class BookingDetail(Base):
     started_at = Column(TIMESTAMP)
     finished_at = Column(TIMESTAMP)
     status = Column(String(255))
+
+    __table_args__ = (
+        Index("ix_booking_detail_booking_id_status", "booking_id", "status"),
+    )
+
     # Relationship with Booking
     booking = relationship("Booking", back_populates="booking_details")
 
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, ForeignKey, DateTime, UniqueConstraint
+from sqlalchemy import Column, Integer, ForeignKey, DateTime, UniqueConstraint, Computed, func
+from sqlalchemy.dialects.postgresql import TSRANGE, ExcludeConstraint
 from sqlalchemy.orm import relationship
 from app.database import Base  # adjust import if needed
 
@@ -8,10 +9,27 @@ class BookingTimeSlot(Base):
     room_id = Column(Integer, ForeignKey("room.id"), primary_key=True)
     started_time = Column(DateTime, primary_key=True)  # matches SQL timestamp
     finished_time = Column(DateTime)  # matches SQL timestamp
-    invoice_id = Column(Integer)  # Assuming you want to add this field
+    invoice_id = Column(Integer, index=True)  # Assuming you want to add this field
+    # [started_time, finished_time), do database tính - không ghi trực tiếp
+    period = Column(TSRANGE, Computed("tsrange(started_time, finished_time)", persisted=True))
 
     __table_args__ = (
         UniqueConstraint("room_id", "started_time", name="uq_room_started_time"),  # Unique constraint adjusted
+        # Chặn hai timeslot trùng nhau trên cùng một phòng
+        ExcludeConstraint(
+            (room_id, "="),
+            (period, "&&"),
+            name="ex_booking_timeslot_room_period",
+            using="gist"
+        ),
     )
     # Relationships
-    room = relationship("Room", back_populates="booking_timeslots")
\ No newline at end of file
+    room = relationship("Room", back_populates="booking_timeslots")
+
+    @classmethod
+    def overlaps(cls, start, end):
+        """
+        Điều kiện timeslot trùng với khoảng [start, end).
+        Dùng được index của ex_booking_timeslot_room_period.
+        """
+        return cls.period.op("&&")(func.tsrange(start, end))
@@ -8,7 +8,7 @@ class Customer(Base):
     __tablename__ = 'customer'
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    account_id = Column(Integer, ForeignKey('account.account_id'), nullable=False)
+    account_id = Column(Integer, ForeignKey('account.account_id'), nullable=False, index=True)
     fullname = Column(String(100))
     email = Column(String(150), unique=True)
     phone_number = Column(String(10))
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, ForeignKey, Numeric, TIMESTAMP, String
+from sqlalchemy import Column, Integer, ForeignKey, Numeric, TIMESTAMP, String, Index
 from sqlalchemy.orm import relationship
 from app.database import Base
 
@@ -8,10 +8,17 @@ class Invoice(Base):
     id = Column(Integer, primary_key=True, index=True)
     customer_id = Column(Integer, ForeignKey("customer.id"))
     partner_id = Column(Integer, ForeignKey("partner.id"))
-    booking_detail_id = Column(Integer, ForeignKey("booking_detail.id"))
+    booking_detail_id = Column(Integer, ForeignKey("booking_detail.id"), index=True)
     cost = Column(Numeric(12, 2))
     finished_time = Column(TIMESTAMP)
     payment_method = Column(String(255))
+    # Thời điểm cost được cộng vào / trừ khỏi partner.balance (app/services/partner_balance.py)
+    credited_at = Column(TIMESTAMP)
+    credit_reversed_at = Column(TIMESTAMP)
+
+    __table_args__ = (
+        Index("ix_invoice_partner_id_finished_time", "partner_id", "finished_time"),
+    )
 
     # Relationship with Customer
     customer = relationship("Customer", back_populates="invoices")
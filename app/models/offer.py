@@ -7,7 +7,7 @@ class Offer(Base):
     __tablename__ = "offer"
 
     id = Column(Integer, primary_key=True)
-    room_type_id = Column(Integer, ForeignKey("room_type.id"))
+    room_type_id = Column(Integer, ForeignKey("room_type.id"), index=True)
     cost = Column(Numeric(12, 2))
 
     room_type = relationship("RoomType", back_populates="offers")
@@ -7,7 +7,7 @@ class Partner(Base):
     __tablename__ = 'partner'
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    account_id = Column(Integer, ForeignKey('account.account_id'), nullable=False)
+    account_id = Column(Integer, ForeignKey('account.account_id'), nullable=False, index=True)
     name = Column(String(100))
     phone_number = Column(String(10))
     address = Column(String(255))
@@ -0,0 +1,27 @@
+from sqlalchemy import Column, Integer, Date, ForeignKey, Numeric
+from app.database import Base
+
+
+class PartnerRevenueDaily(Base):
+    """
+    Số invoice và doanh thu của một resort (thuộc partner) trong một ngày, cập nhật cùng
+    transaction với việc tạo invoice (xem revenue_rollup.record_invoices).
+    """
+    __tablename__ = "partner_revenue_daily"
+
+    partner_id = Column(Integer, ForeignKey("partner.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    resort_id = Column(Integer, ForeignKey("resort.id", ondelete="CASCADE"), primary_key=True)
+    bookings = Column(Integer, nullable=False, server_default="0")
+    revenue = Column(Numeric(14, 2), nullable=False, server_default="0")
+
+
+class PartnerRevenueMonthly(Base):
+    """Như PartnerRevenueDaily nhưng theo tháng, `month` là ngày đầu tháng"""
+    __tablename__ = "partner_revenue_monthly"
+
+    partner_id = Column(Integer, ForeignKey("partner.id", ondelete="CASCADE"), primary_key=True)
+    month = Column(Date, primary_key=True)
+    resort_id = Column(Integer, ForeignKey("resort.id", ondelete="CASCADE"), primary_key=True)
+    bookings = Column(Integer, nullable=False, server_default="0")
+    revenue = Column(Numeric(14, 2), nullable=False, server_default="0")
@@ -6,7 +6,7 @@ class ResortImage(Base):
     __tablename__ = "resort_images"
 
     id = Column(Integer, primary_key=True, index=True)
-    resort_id = Column(Integer, ForeignKey("resort.id"))
+    resort_id = Column(Integer, ForeignKey("resort.id"), index=True)
     url = Column(String(255))
 
     resort = relationship("Resort", back_populates="images")
\ No newline at end of file
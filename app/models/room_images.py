@@ -1,5 +1,5 @@
 # app/models/room_images.py
-from sqlalchemy import Column, Integer, String, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, ForeignKey, Boolean, Index
 from sqlalchemy.orm import relationship
 from app.database import Base
 
@@ -7,8 +7,13 @@ class RoomImage(Base):
     __tablename__ = "room_images"
 
     id = Column(Integer, primary_key=True)
-    room_type_id = Column(Integer, ForeignKey("room_type.id"))
+    room_type_id = Column(Integer, ForeignKey("room_type.id"), index=True)
     url = Column(String(255))
     is_deleted = Column(Boolean, default=False)
 
+    __table_args__ = (
+        # Khóa ON CONFLICT khi upsert ảnh hàng loạt
+        Index("uq_room_images_room_type_url", "room_type_id", "url", unique=True),
+    )
+
     room_type = relationship("RoomType", back_populates="images")
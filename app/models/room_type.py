@@ -6,7 +6,7 @@ class RoomType(Base):
     __tablename__ = "room_type"
 
     id = Column(Integer, primary_key=True, index=True)
-    resort_id = Column(Integer, ForeignKey("resort.id"))
+    resort_id = Column(Integer, ForeignKey("resort.id"), index=True)
     name = Column(String(255))
     area = Column(Float)
     quantity_standard = Column(String(255))
@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, Date, ForeignKey
+from app.database import Base
+
+
+class RoomTypeDayAvailability(Base):
+    """
+    Số phòng đã được giữ của một loại phòng trong từng đêm, cập nhật cùng transaction
+    với booking_timeslot (xem availability_service.apply_timeslot_delta).
+    Đêm `day` là khoảng từ ngày `day` tới sáng hôm sau.
+    """
+    __tablename__ = "room_type_day_availability"
+
+    room_type_id = Column(Integer, ForeignKey("room_type.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    booked_rooms = Column(Integer, nullable=False, server_default="0")
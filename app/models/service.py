@@ -7,7 +7,7 @@ class Service(Base):
     __tablename__ = "service"
 
     id = Column(Integer, primary_key=True, index=True)
-    resort_id = Column(Integer, ForeignKey("resort.id"))
+    resort_id = Column(Integer, ForeignKey("resort.id"), index=True)
     name = Column(String(255))
 
     resort = relationship("Resort", back_populates="services")
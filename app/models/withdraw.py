@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, Numeric, ForeignKey, TIMESTAMP
+from sqlalchemy import create_engine, Column, Integer, String, Boolean, Numeric, ForeignKey, TIMESTAMP, Index
 from sqlalchemy.orm import relationship, declarative_base
 from datetime import datetime
 from app.database import Base
@@ -13,6 +13,10 @@ class Withdraw(Base):
     finished_at = Column(TIMESTAMP)
     status = Column(String(255))
 
+    __table_args__ = (
+        Index("ix_withdraw_partner_id_created_at", "partner_id", "created_at"),
+    )
+
     # Relationship with Partner
     partner = relationship('Partner')
 
@@ -1,15 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, or_
+from sqlalchemy import select
 from sqlalchemy.orm import selectinload
 from typing import Optional
 from pydantic import BaseModel
 
 from app.db_async import get_db
 from app.models.account import Account
-from app.models.customer import Customer
-from app.models.partner import Partner
 from app.dependencies.auth import get_current_admin
+from app.services import token_cache, token_revocation
+from app.services.account_listing import AccountFilter, list_accounts, total_count, invalidate_counts
+from app.services.auth_service import revoke_account_tokens_async
 
 
 router = APIRouter(prefix="/api/v1/admin/accounts", tags=["Admin Account Management"])
@@ -37,82 +38,46 @@ class AccountListResponse(BaseModel):
 
 @router.get("", response_model=list[AccountListResponse])
 async def get_accounts(
+    response: Response,
     current_admin: Account = Depends(get_current_admin),
     db: AsyncSession = Depends(get_db),
     account_type: Optional[str] = Query(None, description="Lọc theo loại: CUSTOMER hoặc PARTNER"),
     status: Optional[str] = Query(None, description="Lọc theo trạng thái: ACTIVE, BANNED"),
     search: Optional[str] = Query(None, description="Tìm kiếm theo username hoặc tên"),
-    page: int = Query(1, ge=1),
-    page_size: int = Query(20, le=100)
+    cursor: Optional[str] = Query(None, description="Giá trị header X-Next-Cursor của trang trước"),
+    page: int = Query(1, ge=1, description="Deprecated, dùng cursor. Bị bỏ qua khi có cursor"),
+    page_size: int = Query(20, ge=1, le=100)
 ):
-    """Lấy danh sách tài khoản khách hàng và đối tác"""
-    results = []
-    
-    # Query customers
-    if account_type is None or account_type.upper() == "CUSTOMER":
-        customer_query = (
-            select(Account, Customer)
-            .join(Customer, Account.account_id == Customer.account_id)
-            .where(Account.is_deleted == False)
-        )
-        
-        if status:
-            customer_query = customer_query.where(Account.status == status.upper())
-        
-        if search:
-            customer_query = customer_query.where(
-                or_(
-                    Account.username.ilike(f"%{search}%"),
-                    Customer.fullname.ilike(f"%{search}%")
-                )
-            )
-        
-        customers = (await db.execute(customer_query)).all()
-        for account, customer in customers:
-            results.append(AccountListResponse(
-                account_id=account.account_id,
-                username=account.username,
-                status=account.status,
-                account_type="CUSTOMER",
-                name=customer.fullname,
-                phone_number=customer.phone_number
-            ))
-    
-    # Query partners
-    if account_type is None or account_type.upper() == "PARTNER":
-        partner_query = (
-            select(Account, Partner)
-            .join(Partner, Account.account_id == Partner.account_id)
-            .where(Account.is_deleted == False)
+    """
+    Lấy danh sách tài khoản khách hàng và đối tác, sắp theo account_id.
+    Trang tiếp theo lấy bằng cursor trong header X-Next-Cursor (không có header nghĩa là hết dữ liệu).
+    """
+    flt = AccountFilter(
+        account_type=account_type.upper() if account_type else None,
+        status=status.upper() if status else None,
+        search=(search or "").strip() or None
+    )
+    offset = 0 if cursor else (page - 1) * page_size
+
+    rows, next_cursor = await list_accounts(db, flt, page_size, cursor=cursor, offset=offset)
+    total, exact = await total_count(db, flt)
+
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    response.headers["X-Total-Count"] = str(total)
+    response.headers["X-Total-Count-Exact"] = "true" if exact else "false"
+
+    return [
+        AccountListResponse(
+            account_id=row.account_id,
+            username=row.username,
+            status=row.status,
+            account_type=row.account_type,
+            name=row.name,
+            phone_number=row.phone_number
         )
-        
-        if status:
-            partner_query = partner_query.where(Account.status == status.upper())
-        
-        if search:
-            partner_query = partner_query.where(
-                or_(
-                    Account.username.ilike(f"%{search}%"),
-                    Partner.name.ilike(f"%{search}%")
-                )
-            )
-        
-        partners = (await db.execute(partner_query)).all()
-        for account, partner in partners:
-            results.append(AccountListResponse(
-                account_id=account.account_id,
-                username=account.username,
-                status=account.status,
-                account_type="PARTNER",
-                name=partner.name,
-                phone_number=partner.phone_number
-            ))
-    
-    # Pagination
-    start = (page - 1) * page_size
-    end = start + page_size
-    
-    return results[start:end]
+        for row in rows
+    ]
 
 
 @router.post("/ban", response_model=BanAccountResponse)
@@ -149,8 +114,13 @@ async def ban_account(
         )
     
     account.status = "BANNED"
+    revoked_tokens = await revoke_account_tokens_async(db, account.account_id)
     await db.commit()
     await db.refresh(account)
+    # Công bố sau commit: database và danh sách revoke trên Redis không lệch nhau nếu commit lỗi
+    await token_revocation.revoke_tokens(revoked_tokens)
+    await token_cache.invalidate_account(account.account_id)
+    await invalidate_counts()
     
     return BanAccountResponse(
         message="Account has been banned successfully",
@@ -185,6 +155,8 @@ async def unban_account(
     account.status = "ACTIVE"
     await db.commit()
     await db.refresh(account)
+    await token_cache.invalidate_account(account.account_id)
+    await invalidate_counts()
     
     return BanAccountResponse(
         message="Account has been unbanned successfully",
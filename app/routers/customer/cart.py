@@ -1,19 +1,18 @@
 from fastapi import APIRouter, Depends, Query, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_
+from sqlalchemy import select
 from sqlalchemy.orm import selectinload, joinedload
 from typing import List
 from decimal import Decimal
+from datetime import datetime
 
 from app.models.account import Account
 from app.models.booking import Booking
 from app.models.booking_detail import BookingDetail
-from app.models.booking_timeslot import BookingTimeSlot
 from app.models.invoice import Invoice
 from app.models.number_of_room import BookingDetailUpdate
 from app.models.offer import Offer
 from app.models.room_type import RoomType
-from app.models.room import Room
 from app.models.resort import Resort
 from app.schemas.booking import BookingDetailCreate
 from app.schemas.cart import CartResponse, CartItemResponse, AddToCartRequest
@@ -21,6 +20,8 @@ from app.db_async import get_db
 from app.schemas.payment import PaymentRequest
 from app.services import crud_booking as crud
 from app.services.booking_timeslot_service import create_booking_timeslots, validate_room_availability, delete_booking_timeslots_by_invoice
+from app.services.availability_service import get_availability_counts
+from app.services.partner_balance import reverse_booking_details
 from app.dependencies.auth import get_current_account
 
 router = APIRouter(prefix="/api/v1", tags=["Cart"])
@@ -60,6 +61,12 @@ async def get_cart(
             detail="Không tìm thấy giỏ hàng"
         )
 
+    availability = await get_availability_counts(db, [
+        (detail.offer.room_type.id, detail.started_at, detail.finished_at)
+        for detail in cart.booking_details
+        if detail.offer and detail.offer.room_type and detail.started_at and detail.finished_at
+    ], exact=True)
+
     cart_items: List[CartItemResponse] = []
     total_cost = Decimal("0")
 
@@ -71,31 +78,7 @@ async def get_cart(
         # Calculate available rooms for this item's date range
         available_rooms = 0
         if room_type and detail.started_at and detail.finished_at:
-            # Count total rooms for this room type
-            total_rooms_result = await db.execute(
-                select(func.count(Room.id)).where(Room.room_type_id == room_type.id)
-            )
-            total_rooms = total_rooms_result.scalar() or 0
-
-            # Count booked rooms in the date range
-            booked_rooms_subq = (
-                select(BookingTimeSlot.room_id)
-                .join(Room, Room.id == BookingTimeSlot.room_id)
-                .where(
-                    and_(
-                        Room.room_type_id == room_type.id,
-                        BookingTimeSlot.started_time < detail.finished_at,
-                        BookingTimeSlot.finished_time > detail.started_at
-                    )
-                )
-                .distinct()
-            )
-            booked_rooms_result = await db.execute(
-                select(func.count()).select_from(booked_rooms_subq.subquery())
-            )
-            booked_rooms = booked_rooms_result.scalar() or 0
-
-            available_rooms = total_rooms - booked_rooms
+            available_rooms = availability[(room_type.id, detail.started_at, detail.finished_at)]["available_rooms"]
 
         item = CartItemResponse(
             id=detail.id,
@@ -375,6 +358,9 @@ async def cancel_booking_detail(
             # Xóa BookingTimeSlot để giải phóng phòng
             await delete_booking_timeslots_by_invoice(db, invoice.id)
 
+        # Trừ lại tiền đã cộng cho partner, cùng transaction với việc hủy
+        await reverse_booking_details(db, [booking_detail_id])
+
         booking_detail.status = "CANCELLED"
         await db.commit()
 
@@ -421,6 +407,7 @@ async def process_payment(
         partner_id=partner_id,
         booking_detail_id=booking_detail.id,
         cost=payment_request.paid_amount,
+        finished_time=datetime.now(),
         payment_method=payment_request.payment_method,
     )
     db.add(invoice)
@@ -428,6 +415,9 @@ async def process_payment(
     
     # Tạo BookingTimeSlot cho các phòng được book
     await create_booking_timeslots(db, booking_detail, invoice_id=invoice.id)
+
+    # Endpoint cũ không xác thực và số tiền do client gửi lên: không cộng vào doanh thu tổng hợp
+    # hay số dư partner. Tiền thật chỉ đi qua ZaloPay (settlement_service.settle_booking)
     
     await db.commit()
     await db.refresh(invoice)
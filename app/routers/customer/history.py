@@ -10,6 +10,7 @@ from app.models.resort import Resort
 from app.db_async import get_db
 from app.dependencies.auth import get_current_account
 from app.services.booking_timeslot_service import delete_booking_timeslots_by_booking_detail
+from app.services.partner_balance import reverse_booking_details
 
 router = APIRouter(prefix="/api/v1/customer", tags=["Resorts"])
 
@@ -105,6 +106,9 @@ async def cancel_booking_detail(
     # Xóa BookingTimeSlot để giải phóng phòng
     await delete_booking_timeslots_by_booking_detail(db, booking_detail_id)
 
+    # Trừ lại tiền đã cộng cho partner, cùng transaction với việc hủy
+    await reverse_booking_details(db, [booking_detail_id])
+
     await db.commit()
 
     offer = booking_detail.offer
@@ -1,20 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload, joinedload
 from sqlalchemy import select
-from decimal import Decimal
-from datetime import datetime
 import json
 
 from app.models.account import Account
 from app.models.booking import Booking
-from app.models.booking_detail import BookingDetail
-from app.models.invoice import Invoice
-from app.models.offer import Offer
-from app.models.room_type import RoomType
 from app.db_async import get_db
-from app.services.booking_timeslot_service import create_booking_timeslots
-from app.services.email_service import send_booking_confirmation_email
+from app.services.settlement_service import settle_booking
+from app.services.payment_jobs import enqueue_settlement_jobs, enqueue_pending_confirmation
 from app.schemas.zalopay import (
     CreatePaymentRequest,
     CreatePaymentResponse,
@@ -66,7 +59,7 @@ async def create_payment(
             detail="Giỏ hàng trống hoặc chưa có giá"
         )
 
-    zalo_result = zalopay_service.create_order(
+    zalo_result = await zalopay_service.create_order(
         booking_id=booking.id,
         amount=amount,
         description=f"Thanh toan booking #{booking.id}",
@@ -111,64 +104,15 @@ async def zalopay_callback(callback: ZaloPayCallback, db: AsyncSession = Depends
     if not booking_id:
         return {"return_code": -1, "return_message": "missing booking_id"}
 
-    result = await db.execute(
-        select(Booking)
-        .filter(Booking.id == booking_id)
-        .options(
-            selectinload(Booking.customer),
-            selectinload(Booking.booking_details)
-            .selectinload(BookingDetail.offer)
-            .selectinload(Offer.room_type)
-            .selectinload(RoomType.resort)
-        )
-    )
-    booking = result.scalar_one_or_none()
+    settlement = await settle_booking(db, booking_id=booking_id)
+    await db.commit()
 
-    if booking and booking.status == "pending":
-        booking.status = "paid"
-        created_invoices = []
-        payment_time = datetime.now()
-        
-        for detail in booking.booking_details:
-            detail.status = "PAID"
-            
-            # Lấy partner_id từ resort
-            partner_id = detail.offer.room_type.resort.partner_id
-            
-            invoice = Invoice(
-                customer_id=booking.customer_id,
-                partner_id=partner_id,
-                booking_detail_id=detail.id,
-                cost=detail.cost,
-                finished_time=payment_time,
-                payment_method="ZALOPAY"
-            )
-            db.add(invoice)
-            await db.flush()
-            created_invoices.append(invoice)
-            
-            # Tạo BookingTimeSlot cho các phòng được book
-            await create_booking_timeslots(db, detail, invoice_id=invoice.id)
-        
-        await db.commit()
-        
-        # Gửi email xác nhận kèm hóa đơn
-        try:
-            customer = booking.customer
-            if customer and customer.email:
-                await send_booking_confirmation_email(
-                    customer_email=customer.email,
-                    customer_name=customer.fullname,
-                    customer_phone=customer.phone_number,
-                    booking_id=booking.id,
-                    booking_details=booking.booking_details,
-                    invoices=created_invoices,
-                    total_cost=float(booking.cost or 0),
-                    payment_method="ZALOPAY",
-                    payment_time=payment_time
-                )
-        except Exception as e:
-            print(f"Failed to send booking confirmation email: {e}")
+    # Không giữ được phòng: booking đã được ghi REFUND_REQUIRED để hoàn tiền, vẫn báo ZaloPay
+    # đã nhận callback để ZaloPay không gọi lại
+    if settlement is None:
+        await enqueue_pending_confirmation(db, booking_id=booking_id)
+    elif not settlement.refund_required:
+        await enqueue_settlement_jobs(settlement)
 
     return {"return_code": 1, "return_message": "success"}
 
@@ -182,67 +126,16 @@ async def query_payment(
     """
     Query trạng thái thanh toán từ ZaloPay
     """
-    result = zalopay_service.query_order(request.app_trans_id)
+    result = await zalopay_service.query_order(request.app_trans_id)
     
     if result.get("return_code") == 1:
-        booking_result = await db.execute(
-            select(Booking)
-            .filter(Booking.zp_trans_id == request.app_trans_id)
-            .options(
-                selectinload(Booking.customer),
-                selectinload(Booking.booking_details)
-                .selectinload(BookingDetail.offer)
-                .selectinload(Offer.room_type)
-                .selectinload(RoomType.resort)
-            )
-        )
-        booking = booking_result.scalar_one_or_none()
-        
-        if booking and booking.status == "pending":
-            booking.status = "paid"
-            created_invoices = []
-            payment_time = datetime.now()
-            
-            for detail in booking.booking_details:
-                detail.status = "PAID"
-                
-                # Lấy partner_id từ resort
-                partner_id = detail.offer.room_type.resort.partner_id
-                
-                invoice = Invoice(
-                    customer_id=booking.customer_id,
-                    partner_id=partner_id,
-                    booking_detail_id=detail.id,
-                    cost=detail.cost,
-                    finished_time=payment_time,
-                    payment_method="ZALOPAY"
-                )
-                db.add(invoice)
-                await db.flush()
-                created_invoices.append(invoice)
-                
-                # Tạo BookingTimeSlot cho các phòng được book
-                await create_booking_timeslots(db, detail, invoice_id=invoice.id)
-            
-            await db.commit()
-            
-            # Gửi email xác nhận kèm hóa đơn
-            try:
-                customer = booking.customer
-                if customer and customer.email:
-                    await send_booking_confirmation_email(
-                        customer_email=customer.email,
-                        customer_name=customer.fullname,
-                        customer_phone=customer.phone_number,
-                        booking_id=booking.id,
-                        booking_details=booking.booking_details,
-                        invoices=created_invoices,
-                        total_cost=float(booking.cost or 0),
-                        payment_method="ZALOPAY",
-                        payment_time=payment_time
-                    )
-            except Exception as e:
-                print(f"Failed to send booking confirmation email: {e}")
+        settlement = await settle_booking(db, zp_trans_id=request.app_trans_id)
+        await db.commit()
+
+        if settlement is None:
+            await enqueue_pending_confirmation(db, zp_trans_id=request.app_trans_id)
+        elif not settlement.refund_required:
+            await enqueue_settlement_jobs(settlement)
 
     return QueryPaymentResponse(
         return_code=result.get("return_code"),
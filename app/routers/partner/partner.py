@@ -1,21 +1,30 @@
 from decimal import Decimal
-from fastapi import APIRouter, Depends, Query, HTTPException, status
+from fastapi import APIRouter, Depends, Query, HTTPException, Response, status
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import extract, func, select
+from sqlalchemy import select
 from sqlalchemy.orm import selectinload
-from datetime import date, datetime, timedelta
+from datetime import date, datetime
 
 from app.models.account import Account
 from app.models.booking_detail import BookingDetail
-from app.models.booking_timeslot import BookingTimeSlot
-from app.models.invoice import Invoice
 from app.models.partner import Partner
 from app.models.resort import Resort
-from app.models.room import Room
-from app.models.room_type import RoomType
 from app.models.withdraw import Withdraw
-from app.db_async import get_db
-from app.dependencies.auth import get_current_partner_async
+from app.db_async import get_db, statement_timeout
+from app.dependencies.auth import get_current_partner
+from app.services.balance_movements import list_movements
+from app.services.revenue_rollup import get_partner_summary
+from app.services.partner_exports import (
+    FORMATS as EXPORT_FORMATS,
+    resolve_date_range,
+    schedule_query,
+    revenue_query,
+    try_acquire_slot as try_acquire_export_slot,
+    stream_export,
+)
+from app.services.occupancy import ENCODINGS as OCCUPANCY_ENCODINGS, OCCUPANCY_MAX_DAYS, get_occupancy
 
 router = APIRouter(prefix="/api/v1", tags=["Partners"])
 
@@ -43,45 +52,16 @@ async def get_partner_of_resort(
     }
 
 
-@router.get("/partner/bookings/schedule")
+@router.get("/partner/bookings/schedule", dependencies=[Depends(statement_timeout(10000))])
 async def get_partner_booking_schedule(
     start: date | None = Query(None),
     end: date | None = Query(None),
     resort_id: int | None = Query(None),
-    partner: Partner = Depends(get_current_partner_async),
+    partner: Partner = Depends(get_current_partner),
     db: AsyncSession = Depends(get_db)
 ):
-    partner_id = partner.id
-
-    if not start or not end:
-        today = datetime.utcnow().date()
-        start_of_week = today - timedelta(days=today.weekday())
-        end_of_week = start_of_week + timedelta(days=6)
-        start = start_of_week
-        end = end_of_week
-    
-    start_dt = datetime.combine(start, datetime.min.time())
-    end_dt = datetime.combine(end, datetime.max.time())
-
-    query = (
-        select(
-            BookingTimeSlot.room_id,
-            BookingTimeSlot.started_time,
-            BookingTimeSlot.finished_time,
-            Room.number.label("room_number"),
-            RoomType.name.label("room_type_name"),
-            Resort.name.label("resort_name"),
-        )
-        .join(Room, Room.id == BookingTimeSlot.room_id)
-        .join(RoomType, RoomType.id == Room.room_type_id)
-        .join(Resort, Resort.id == RoomType.resort_id)
-        .where(Resort.partner_id == partner_id)
-        .where(BookingTimeSlot.finished_time >= start_dt, BookingTimeSlot.started_time <= end_dt)
-        .order_by(BookingTimeSlot.started_time.asc())
-    )
-
-    if resort_id:
-        query = query.where(Resort.id == resort_id)
+    start_dt, end_dt = resolve_date_range(start, end)
+    query = schedule_query(partner.id, start_dt, end_dt, resort_id)
 
     result = await db.execute(query)
     slots = result.all()
@@ -90,7 +70,7 @@ async def get_partner_booking_schedule(
         {
             "room_id": s.room_id,
             "resort_name": s.resort_name,
-            "room_type": s.room_type_name,
+            "room_type": s.room_type,
             "room_number": s.room_number,
             "started_time": s.started_time,
             "finished_time": s.finished_time
@@ -99,77 +79,133 @@ async def get_partner_booking_schedule(
     ]
 
 
-@router.get("/partner/statistics")
+# Số khoản thu / rút mới nhất trả kèm statistics (balance_movements, giữ cho client cũ)
+STATISTICS_RECENT_MOVEMENTS = 20
+
+
+@router.get("/partner/statistics", dependencies=[Depends(statement_timeout(10000))])
 async def get_partner_statistics(
-    partner: Partner = Depends(get_current_partner_async),
+    resort_id: int | None = Query(None, description="Chỉ thống kê một resort của partner"),
+    partner: Partner = Depends(get_current_partner),
     db: AsyncSession = Depends(get_db)
 ):
     partner_id = partner.id
 
-    today = date.today()
-    result_new = await db.execute(
-        select(func.count(Invoice.id)).where(
-            Invoice.partner_id == partner_id,
-            func.date(Invoice.finished_time) == today
-        )
-    )
-    new_bookings_today = result_new.scalar() or 0
-
-    now = datetime.utcnow()
-    result_month = await db.execute(
-        select(func.sum(Invoice.cost)).where(
-            Invoice.partner_id == partner_id,
-            extract('month', Invoice.finished_time) == now.month,
-            extract('year', Invoice.finished_time) == now.year
-        )
-    )
-    monthly_revenue = result_month.scalar() or 0
+    # Lượt đặt hôm nay, doanh thu tháng này và tổng lượt đặt đọc từ bảng tổng hợp theo ngày / tháng
+    summary = await get_partner_summary(db, partner_id, date.today(), resort_id=resort_id)
 
-    result_total = await db.execute(
-        select(func.count(Invoice.id)).where(Invoice.partner_id == partner_id)
-    )
-    total_bookings = result_total.scalar() or 0
-
-    current_balance = float(partner.balance or 0)
-
-    revenue_result = await db.execute(
-        select(
-            Invoice.id.label("invoice_id"),
-            Invoice.booking_detail_id,
-            Invoice.cost.label("amount"),
-            Invoice.finished_time.label("time")
-        ).where(Invoice.partner_id == partner_id)
-        .order_by(Invoice.finished_time.desc())
-    )
-    revenues = [
-        {"invoice_id": row.invoice_id, "booking_detail_id": row.booking_detail_id, "amount": float(row.amount), "time": row.time, "type": "REVENUE"}
-        for row in revenue_result.all()
-    ]
+    balance_result = await db.execute(select(Partner.balance).where(Partner.id == partner_id))
+    current_balance = float(balance_result.scalar() or 0)
 
-    withdrawal_result = await db.execute(
-        select(Withdraw.id, Withdraw.transaction_amount.label("amount"), Withdraw.created_at, Withdraw.status)
-        .where(Withdraw.partner_id == partner_id)
-        .order_by(Withdraw.created_at.desc())
-    )
-    withdrawals = [
-        {"id": row.id, "amount": float(row.amount), "time": row.created_at, "status": row.status, "type": "WITHDRAW"}
-        for row in withdrawal_result.all()
-    ]
+    # Lịch sử đầy đủ xem qua /partner/balance-movements (phân trang)
+    revenues, _ = await list_movements(db, partner_id, STATISTICS_RECENT_MOVEMENTS, movement_type="REVENUE")
+    withdrawals, _ = await list_movements(db, partner_id, STATISTICS_RECENT_MOVEMENTS, movement_type="WITHDRAW")
 
     return {
-        "new_bookings_today": new_bookings_today,
-        "monthly_revenue": float(monthly_revenue),
-        "total_bookings": total_bookings,
+        **summary,
         "current_balance": current_balance,
         "balance_movements": {"revenues": revenues, "withdrawals": withdrawals}
     }
 
+
+@router.get("/partner/balance-movements")
+async def get_balance_movements(
+    type: str | None = Query(None, description="Lọc theo loại: REVENUE hoặc WITHDRAW"),
+    cursor: str | None = Query(None, description="next_cursor của trang trước"),
+    limit: int = Query(50, ge=1, le=200),
+    partner: Partner = Depends(get_current_partner),
+    db: AsyncSession = Depends(get_db)
+):
+    """Biến động số dư (khoản thu từ booking và rút tiền), mới nhất trước"""
+    items, next_cursor = await list_movements(
+        db, partner.id, limit, movement_type=type.upper() if type else None, cursor=cursor
+    )
+    return {"items": items, "next_cursor": next_cursor}
+
+@router.get("/partner/occupancy", dependencies=[Depends(statement_timeout(10000))])
+async def get_partner_occupancy(
+    resort_id: int = Query(...),
+    start: date | None = Query(None),
+    end: date | None = Query(None),
+    encoding: str = Query("bitmap", description="bitmap hoặc rle"),
+    partner: Partner = Depends(get_current_partner),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Ma trận lấp đầy phòng x đêm của một resort. start, end cùng ý nghĩa với /partner/bookings/schedule
+    (mặc định tuần hiện tại), tính theo đêm: đêm `d` là từ ngày d tới sáng hôm sau.
+    """
+    if encoding not in OCCUPANCY_ENCODINGS:
+        raise HTTPException(status_code=400, detail="encoding phải là bitmap hoặc rle")
+
+    start_dt, end_dt = resolve_date_range(start, end)
+    days = (end_dt.date() - start_dt.date()).days + 1
+    if days < 1:
+        raise HTTPException(status_code=400, detail="end phải sau hoặc bằng start")
+    if days > OCCUPANCY_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Tối đa {OCCUPANCY_MAX_DAYS} ngày mỗi lần")
+
+    owned = (await db.execute(
+        select(Resort.id).where(Resort.id == resort_id, Resort.partner_id == partner.id)
+    )).scalar_one_or_none()
+    if owned is None:
+        raise HTTPException(status_code=404, detail="Resort không tồn tại hoặc không thuộc partner")
+
+    body = await get_occupancy(db, resort_id, start_dt.date(), end_dt.date(), encoding)
+    return Response(content=body, media_type="application/json")
+
+
+@router.get("/partner/exports/{dataset}")
+async def export_partner_data(
+    dataset: str,
+    format: str = Query("csv", description="csv hoặc ndjson"),
+    start: date | None = Query(None),
+    end: date | None = Query(None),
+    resort_id: int | None = Query(None),
+    partner: Partner = Depends(get_current_partner)
+):
+    """
+    Export doanh thu (dataset=revenue) hoặc lịch đặt phòng (dataset=schedule) dạng stream.
+    start, end, resort_id cùng ý nghĩa với /partner/bookings/schedule.
+    """
+    queries = {"revenue": revenue_query, "schedule": schedule_query}
+    if dataset not in queries:
+        raise HTTPException(status_code=404, detail="Export không tồn tại, dùng revenue hoặc schedule")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="format phải là csv hoặc ndjson")
+
+    start_dt, end_dt = resolve_date_range(start, end)
+    query = queries[dataset](partner.id, start_dt, end_dt, resort_id)
+    filename = f"{dataset}_{start_dt.date()}_{end_dt.date()}.{format}"
+
+    slot = try_acquire_export_slot()
+    if slot is None:
+        raise HTTPException(status_code=429, detail="Đang có quá nhiều export, vui lòng thử lại sau")
+
+    return StreamingResponse(
+        stream_export(query, format, slot),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        # Trả slot cả khi body chưa từng được đọc (client ngắt trước khi stream bắt đầu)
+        background=BackgroundTask(slot.release)
+    )
+
+
 @router.post("/partner/withdraw")
 async def create_withdraw_request(
     amount: float = Query(..., gt=0),
-    partner: Partner = Depends(get_current_partner_async),
+    partner: Partner = Depends(get_current_partner),
     db: AsyncSession = Depends(get_db)
 ):
+    # Đọc lại số dư và khóa dòng partner để tránh 2 yêu cầu rút tiền đồng thời
+    partner_result = await db.execute(
+        select(Partner)
+        .where(Partner.id == partner.id)
+        .with_for_update()
+        .execution_options(populate_existing=True)
+    )
+    partner = partner_result.scalar_one()
+
     balance = partner.balance or 0
     if Decimal(balance) < Decimal(amount):
         raise HTTPException(status_code=400, detail="Số dư không đủ để rút tiền")
@@ -1,36 +1,32 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, update, delete
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import selectinload
 from typing import List
 
 from app.models.partner import Partner
 from app.models.resort import Resort
+from app.models.room import Room
 from app.models.room_type import RoomType
 from app.models.room_images import RoomImage
 from app.models.offer import Offer
 from app.models.service import Service
 from app.db_async import get_db
 from app.dependencies.auth import get_current_partner
+from app.services import catalog_cache, ownership
 from app.schemas.room_type import (
     RoomTypeCreate, RoomTypeUpdate, RoomTypeOut, RoomImageOut,
-    OfferCreate, OfferUpdate, OfferOut, OfferWithDetails, ServiceOut
+    OfferCreate, OfferUpdate, OfferOut, OfferWithDetails, ServiceOut,
+    BULK_MAX_ROWS, BulkRoomsCreate, BulkRoomsOut, RoomOut,
+    BulkImagesUpsert, RoomImageUpsertOut, BulkOffersUpsert, BulkOffersOut
 )
 
 router = APIRouter(prefix="/api/v1/partner", tags=["Partner - Room Management"])
 
 
-async def verify_resort_ownership(db: AsyncSession, partner_id: int, resort_id: int) -> Resort:
-    result = await db.execute(
-        select(Resort).where(Resort.id == resort_id, Resort.partner_id == partner_id)
-    )
-    resort = result.scalars().first()
-    if not resort:
-        raise HTTPException(status_code=404, detail="Resort không tồn tại hoặc không thuộc quyền quản lý của bạn")
-    return resort
-
-
 async def verify_room_type_ownership(db: AsyncSession, partner_id: int, room_type_id: int) -> RoomType:
+    """Loại phòng kèm ảnh và offers, chỉ dùng khi response cần các quan hệ này; chỉ kiểm tra quyền thì dùng ownership"""
     result = await db.execute(
         select(RoomType)
         .join(Resort, Resort.id == RoomType.resort_id)
@@ -40,6 +36,7 @@ async def verify_room_type_ownership(db: AsyncSession, partner_id: int, room_typ
     room_type = result.scalars().first()
     if not room_type:
         raise HTTPException(status_code=404, detail="Loại phòng không tồn tại hoặc không thuộc quyền quản lý của bạn")
+    ownership.remember_room_types(db, partner_id, {room_type.id: room_type.resort_id})
     return room_type
 
 
@@ -61,7 +58,7 @@ async def get_resort_services(
     partner: Partner = Depends(get_current_partner),
     db: AsyncSession = Depends(get_db)
 ):
-    await verify_resort_ownership(db, partner.id, resort_id)
+    await ownership.verify_resorts(db, partner.id, [resort_id])
     result = await db.execute(select(Service).where(Service.resort_id == resort_id))
     return result.scalars().all()
 
@@ -120,7 +117,7 @@ async def create_room_type(
     db: AsyncSession = Depends(get_db)
 ):
     """Tạo loại phòng mới kèm ảnh và 1 gói đặt phòng"""
-    await verify_resort_ownership(db, partner.id, data.resort_id)
+    await ownership.verify_resorts(db, partner.id, [data.resort_id])
     
     # Tạo room type
     room_type = RoomType(
@@ -133,7 +130,7 @@ async def create_room_type(
     
     # Thêm ảnh
     images = []
-    for url in data.image_urls:
+    for url in dict.fromkeys(data.image_urls):
         img = RoomImage(room_type_id=room_type.id, url=url, is_deleted=False)
         db.add(img)
         images.append(img)
@@ -143,7 +140,7 @@ async def create_room_type(
     db.add(offer)
     
     await db.commit()
-    await db.refresh(offer)
+    await catalog_cache.invalidate_resorts([room_type.resort_id])
     
     return RoomTypeOut(
         id=room_type.id, resort_id=room_type.resort_id, name=room_type.name, area=room_type.area,
@@ -164,8 +161,10 @@ async def update_room_type(
     rt = await verify_room_type_ownership(db, partner.id, room_type_id)
     for field, value in data.model_dump(exclude_unset=True).items():
         setattr(rt, field, value)
+    # expire_on_commit=False: rt giữ giá trị vừa gán, không cần refresh
     await db.commit()
-    await db.refresh(rt)
+    await catalog_cache.invalidate_room_types([rt.id])
+    await catalog_cache.invalidate_resorts([rt.resort_id])
     return RoomTypeOut(
         id=rt.id, resort_id=rt.resort_id, name=rt.name, area=rt.area,
         quantity_standard=rt.quantity_standard, quality_standard=rt.quality_standard,
@@ -181,12 +180,60 @@ async def delete_room_type(
     partner: Partner = Depends(get_current_partner),
     db: AsyncSession = Depends(get_db)
 ):
-    rt = await verify_room_type_ownership(db, partner.id, room_type_id)
-    await db.delete(rt)
+    resort_id = (await ownership.room_type_resorts(db, partner.id, [room_type_id]))[room_type_id]
+    # Tương đương db.delete(rt) của ORM (gỡ room_type_id khỏi phòng, ảnh, offers rồi xóa)
+    # nhưng bằng các lệnh theo tập, không nạp các quan hệ về Python
+    for model in (Room, RoomImage, Offer):
+        await db.execute(update(model).where(model.room_type_id == room_type_id).values(room_type_id=None))
+    await db.execute(delete(RoomType).where(RoomType.id == room_type_id))
     await db.commit()
+    await catalog_cache.invalidate_room_types([room_type_id])
+    await catalog_cache.invalidate_resorts([resort_id])
     return {"message": "Đã xóa loại phòng thành công"}
 
 
+# ============ Room (bulk) ============
+
+@router.post("/rooms/bulk", response_model=BulkRoomsOut, status_code=201)
+async def bulk_create_rooms(
+    data: BulkRoomsCreate,
+    partner: Partner = Depends(get_current_partner),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Tạo hàng loạt phòng đánh số liên tiếp trong một transaction.
+    Số phòng đã tồn tại trong loại phòng được bỏ qua nên gửi lại cùng request là an toàn.
+    """
+    if sum(block.count for block in data.rooms) > BULK_MAX_ROWS:
+        raise HTTPException(status_code=400, detail=f"Tối đa {BULK_MAX_ROWS} phòng mỗi request")
+
+    await ownership.room_type_resorts(db, partner.id, (block.room_type_id for block in data.rooms))
+
+    # Khử trùng lặp giữa các block, sắp theo khóa để các request đồng thời khóa dòng cùng thứ tự
+    rows = {}
+    for block in data.rooms:
+        for number in range(block.start_number, block.start_number + block.count):
+            rows[(block.room_type_id, number)] = block.status
+    values = [
+        {"room_type_id": room_type_id, "number": number, "status": room_status}
+        for (room_type_id, number), room_status in sorted(rows.items())
+    ]
+
+    result = await db.execute(
+        pg_insert(Room).values(values)
+        .on_conflict_do_nothing(index_elements=[Room.room_type_id, Room.number])
+        .returning(Room.id, Room.room_type_id, Room.number)
+    )
+    created = result.all()
+    await db.commit()
+
+    return BulkRoomsOut(
+        created=len(created),
+        skipped=len(values) - len(created),
+        rooms=[RoomOut(id=r.id, room_type_id=r.room_type_id, number=r.number) for r in created]
+    )
+
+
 # ============ Room Images ============
 
 @router.post("/room-types/{room_type_id}/images")
@@ -196,13 +243,24 @@ async def add_room_images(
     partner: Partner = Depends(get_current_partner),
     db: AsyncSession = Depends(get_db)
 ):
-    await verify_room_type_ownership(db, partner.id, room_type_id)
-    images = []
-    for url in image_urls:
-        img = RoomImage(room_type_id=room_type_id, url=url, is_deleted=False)
-        db.add(img)
-        images.append(img)
+    await ownership.room_type_resorts(db, partner.id, [room_type_id])
+    if not image_urls:
+        return {"message": "Đã thêm 0 ảnh", "images": []}
+    # Ảnh trùng url với ảnh đã có (kể cả đã xóa) được khôi phục thay vì thêm dòng mới
+    stmt = pg_insert(RoomImage).values([
+        {"room_type_id": room_type_id, "url": url, "is_deleted": False}
+        for url in dict.fromkeys(image_urls)
+    ])
+    result = await db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[RoomImage.room_type_id, RoomImage.url],
+            set_={"is_deleted": False}
+        )
+        .returning(RoomImage.id, RoomImage.url)
+    )
+    images = result.all()
     await db.commit()
+    await catalog_cache.invalidate_room_types([room_type_id])
     return {"message": f"Đã thêm {len(images)} ảnh", "images": [{"id": img.id, "url": img.url} for img in images]}
 
 
@@ -213,16 +271,54 @@ async def delete_room_image(
     partner: Partner = Depends(get_current_partner),
     db: AsyncSession = Depends(get_db)
 ):
-    await verify_room_type_ownership(db, partner.id, room_type_id)
+    await ownership.room_type_resorts(db, partner.id, [room_type_id])
     result = await db.execute(select(RoomImage).where(RoomImage.id == image_id, RoomImage.room_type_id == room_type_id))
     image = result.scalars().first()
     if not image:
         raise HTTPException(status_code=404, detail="Ảnh không tồn tại")
     image.is_deleted = True
     await db.commit()
+    await catalog_cache.invalidate_room_types([room_type_id])
     return {"message": "Đã xóa ảnh"}
 
 
+@router.put("/room-images/bulk", response_model=List[RoomImageUpsertOut])
+async def bulk_upsert_room_images(
+    data: BulkImagesUpsert,
+    partner: Partner = Depends(get_current_partner),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Thêm hoặc cập nhật hàng loạt ảnh theo (room_type_id, url): ảnh chưa có được thêm,
+    ảnh đã có được cập nhật is_deleted (dùng để ẩn hoặc khôi phục ảnh)
+    """
+    await ownership.room_type_resorts(db, partner.id, (img.room_type_id for img in data.images))
+
+    # ON CONFLICT DO UPDATE không cho một dòng bị cập nhật hai lần trong cùng lệnh: giữ giá trị cuối
+    rows = {(img.room_type_id, img.url): img.is_deleted for img in data.images}
+    values = [
+        {"room_type_id": room_type_id, "url": url, "is_deleted": is_deleted}
+        for (room_type_id, url), is_deleted in sorted(rows.items())
+    ]
+
+    stmt = pg_insert(RoomImage).values(values)
+    result = await db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[RoomImage.room_type_id, RoomImage.url],
+            set_={"is_deleted": stmt.excluded.is_deleted}
+        )
+        .returning(RoomImage.id, RoomImage.room_type_id, RoomImage.url, RoomImage.is_deleted)
+    )
+    images = result.all()
+    await db.commit()
+    await catalog_cache.invalidate_room_types(room_type_id for room_type_id, _ in rows)
+
+    return [
+        RoomImageUpsertOut(id=img.id, room_type_id=img.room_type_id, url=img.url, is_deleted=img.is_deleted)
+        for img in images
+    ]
+
+
 # ============ Offer CRUD ============
 
 @router.get("/offers", response_model=List[OfferWithDetails])
@@ -253,23 +349,80 @@ async def create_offer(
     db: AsyncSession = Depends(get_db)
 ):
     """Tạo thêm gói đặt phòng cho loại phòng đã có"""
-    rt = await verify_room_type_ownership(db, partner.id, data.room_type_id)
-    
+    # Kiểm tra quyền và lấy tên cho response trong cùng một truy vấn
+    result = await db.execute(
+        select(RoomType.name.label("rt_name"), Resort.id.label("resort_id"), Resort.name.label("rs_name"))
+        .join(Resort, Resort.id == RoomType.resort_id)
+        .where(RoomType.id == data.room_type_id, Resort.partner_id == partner.id)
+    )
+    names = result.first()
+    if not names:
+        raise HTTPException(status_code=404, detail="Loại phòng không tồn tại hoặc không thuộc quyền quản lý của bạn")
+    ownership.remember_room_types(db, partner.id, {data.room_type_id: names.resort_id})
+
     offer = Offer(room_type_id=data.room_type_id, cost=data.cost)
     db.add(offer)
     await db.commit()
-    await db.refresh(offer)
-    
-    rs_result = await db.execute(select(Resort).where(Resort.id == rt.resort_id))
-    resort = rs_result.scalars().first()
-    
+    await catalog_cache.invalidate_room_types([offer.room_type_id])
+
     return OfferWithDetails(
         id=offer.id, room_type_id=offer.room_type_id, cost=offer.cost,
-        room_type_name=rt.name, resort_name=resort.name if resort else None,
+        room_type_name=names.rt_name, resort_name=names.rs_name,
         services=[]
     )
 
 
+@router.put("/offers/bulk", response_model=BulkOffersOut)
+async def bulk_upsert_offers(
+    data: BulkOffersUpsert,
+    partner: Partner = Depends(get_current_partner),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Tạo và cập nhật giá hàng loạt gói đặt phòng trong một transaction.
+    Gói có id phải thuộc đúng room_type_id gửi kèm, nếu không cả request bị từ chối.
+    """
+    await ownership.room_type_resorts(db, partner.id, (o.room_type_id for o in data.offers))
+
+    updates = {o.id: o for o in data.offers if o.id is not None}
+    inserts = [o for o in data.offers if o.id is None]
+
+    if updates:
+        result = await db.execute(
+            select(Offer.id, Offer.room_type_id).where(Offer.id.in_(updates))
+        )
+        current = {row.id: row.room_type_id for row in result.all()}
+        invalid = sorted(i for i, o in updates.items() if current.get(i) != o.room_type_id)
+        if invalid:
+            raise HTTPException(status_code=404, detail=f"Gói đặt phòng {invalid} không tồn tại")
+
+        # Bulk UPDATE theo primary key: một lệnh executemany, sắp theo id để thứ tự khóa ổn định
+        await db.execute(
+            update(Offer),
+            [{"id": offer_id, "cost": updates[offer_id].cost} for offer_id in sorted(updates)]
+        )
+
+    created = []
+    if inserts:
+        result = await db.execute(
+            pg_insert(Offer).values([{"room_type_id": o.room_type_id, "cost": o.cost} for o in inserts])
+            .returning(Offer.id, Offer.room_type_id, Offer.cost)
+        )
+        created = result.all()
+
+    await db.commit()
+    await catalog_cache.invalidate_room_types(o.room_type_id for o in data.offers)
+
+    return BulkOffersOut(
+        created=len(created),
+        updated=len(updates),
+        offers=[OfferOut(id=o.id, room_type_id=o.room_type_id, cost=o.cost) for o in created] + [
+            OfferOut(id=offer_id, room_type_id=o.room_type_id, cost=o.cost)
+            for offer_id, o in sorted(updates.items())
+        ]
+    )
+
+
 @router.put("/offers/{offer_id}", response_model=OfferWithDetails)
 async def update_offer(
     offer_id: int,
@@ -277,30 +430,25 @@ async def update_offer(
     partner: Partner = Depends(get_current_partner),
     db: AsyncSession = Depends(get_db)
 ):
+    # Kiểm tra quyền và lấy tên cho response trong cùng một truy vấn, session giữ giá trị
+    # sau commit (expire_on_commit=False) nên không cần đọc lại
     result = await db.execute(
-        select(Offer)
+        select(Offer, RoomType.name.label("rt_name"), Resort.name.label("rs_name"))
         .select_from(Offer)
         .join(RoomType, RoomType.id == Offer.room_type_id)
         .join(Resort, Resort.id == RoomType.resort_id)
         .where(Offer.id == offer_id, Resort.partner_id == partner.id)
     )
-    offer = result.scalars().first()
-    if not offer:
+    r = result.first()
+    if not r:
         raise HTTPException(status_code=404, detail="Gói đặt phòng không tồn tại")
-    
+
     if data.cost is not None:
-        offer.cost = data.cost
-    
+        r.Offer.cost = data.cost
+
     await db.commit()
-    
-    result = await db.execute(
-        select(Offer, RoomType.name.label("rt_name"), Resort.name.label("rs_name"))
-        .select_from(Offer)
-        .join(RoomType, RoomType.id == Offer.room_type_id)
-        .join(Resort, Resort.id == RoomType.resort_id)
-        .where(Offer.id == offer_id)
-    )
-    r = result.first()
+    await catalog_cache.invalidate_room_types([r.Offer.room_type_id])
+
     return OfferWithDetails(
         id=r.Offer.id, room_type_id=r.Offer.room_type_id, cost=r.Offer.cost,
         room_type_name=r.rt_name, resort_name=r.rs_name,
@@ -326,4 +474,5 @@ async def delete_offer(
         raise HTTPException(status_code=404, detail="Gói đặt phòng không tồn tại")
     await db.delete(offer)
     await db.commit()
+    await catalog_cache.invalidate_room_types([offer.room_type_id])
     return {"message": "Đã xóa gói đặt phòng thành công"}
@@ -1,8 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database import get_db
+from app.db_async import get_db
+from app.models.account import Account
+from app.services import token_cache, token_revocation
 from app.schemas.auth import (
     RegisterRequest, RegisterResponse, 
     LoginRequest, TokenResponse,
@@ -10,8 +12,8 @@ from app.schemas.auth import (
     PartnerRegisterRequest, PartnerRegisterResponse, PartnerResponse
 )
 from app.services.auth_service import (
-    get_account_by_username, register_account,
-    login_account, logout_account, validate_token,
+    username_exists, register_account, get_account_by_id,
+    login_account, logout_account, validate_token_async,
     get_account_roles, register_partner_account, LoginError
 )
 
@@ -19,19 +21,37 @@ router = APIRouter(prefix="/api/v1/auth", tags=["Authentication"])
 security = HTTPBearer()
 
 
+async def _load_current_account(db: AsyncSession, token: str) -> Account:
+    """
+    Xác thực token và trả về account thuộc session hiện tại.
+    Account lấy từ cache hoặc JWT claims là bản detached (không có password, balance),
+    nên các endpoint đọc/sửa profile load lại account từ database.
+    """
+    account = await validate_token_async(db, token)
+    if account and account not in db:
+        account = await get_account_by_id(db, account.account_id)
+
+    if not account:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired token",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    return account
+
+
 @router.post("/register", response_model=RegisterResponse, status_code=status.HTTP_201_CREATED)
-def register(request: RegisterRequest, db: Session = Depends(get_db)):
+async def register(request: RegisterRequest, db: AsyncSession = Depends(get_db)):
     """Đăng ký tài khoản mới"""
     # Kiểm tra username đã tồn tại
-    existing_account = get_account_by_username(db, request.username)
-    if existing_account:
+    if await username_exists(db, request.username):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username already exists"
         )
     
     try:
-        account = register_account(
+        account = await register_account(
             db=db,
             username=request.username,
             password=request.password,
@@ -51,7 +71,7 @@ def register(request: RegisterRequest, db: Session = Depends(get_db)):
             )
         )
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Registration failed: {str(e)}"
@@ -59,9 +79,9 @@ def register(request: RegisterRequest, db: Session = Depends(get_db)):
 
 
 @router.post("/login", response_model=TokenResponse)
-def login(request: LoginRequest, db: Session = Depends(get_db)):
+async def login(request: LoginRequest, db: AsyncSession = Depends(get_db)):
     """Đăng nhập"""
-    result = login_account(db, request.username, request.password)
+    result = await login_account(db, request.username, request.password)
     
     # Kiểm tra nếu là lỗi
     if isinstance(result, LoginError):
@@ -95,38 +115,32 @@ def login(request: LoginRequest, db: Session = Depends(get_db)):
 
 
 @router.post("/logout", response_model=LogoutResponse)
-def logout(
+async def logout(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Đăng xuất - revoke token hiện tại"""
     token = credentials.credentials
     
-    success = logout_account(db, token)
-    if not success:
+    revoked_token = await logout_account(db, token)
+    if not revoked_token:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid or already revoked token"
         )
+    await token_cache.invalidate_token(token, revoked_token.account_id)
+    await token_revocation.revoke_tokens([(revoked_token.token_id, revoked_token.expires_at)])
     
     return LogoutResponse(message="Logout successful")
 
 
 @router.get("/me")
-def get_current_user(
+async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Lấy thông tin user hiện tại"""
-    token = credentials.credentials
-    account = validate_token(db, token)
-    
-    if not account:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid or expired token",
-            headers={"WWW-Authenticate": "Bearer"}
-        )
+    account = await _load_current_account(db, credentials.credentials)
     
     roles = get_account_roles(account)
     
@@ -163,39 +177,18 @@ def get_current_user(
     return response
 
 
-# Dependency để sử dụng trong các router khác
-def get_current_account(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-):
-    """Dependency để xác thực user trong các endpoint khác"""
-    token = credentials.credentials
-    account = validate_token(db, token)
-    
-    if not account:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid or expired token",
-            headers={"WWW-Authenticate": "Bearer"}
-        )
-    
-    return account
-
-
-
 @router.post("/register/partner", response_model=PartnerRegisterResponse, status_code=status.HTTP_201_CREATED)
-def register_partner(request: PartnerRegisterRequest, db: Session = Depends(get_db)):
+async def register_partner(request: PartnerRegisterRequest, db: AsyncSession = Depends(get_db)):
     """Đăng ký tài khoản đối tác - cần admin duyệt mới được hoạt động"""
     # Kiểm tra username đã tồn tại
-    existing_account = get_account_by_username(db, request.username)
-    if existing_account:
+    if await username_exists(db, request.username):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username already exists"
         )
     
     try:
-        account, partner = register_partner_account(
+        account, partner = await register_partner_account(
             db=db,
             username=request.username,
             password=request.password,
@@ -220,7 +213,7 @@ def register_partner(request: PartnerRegisterRequest, db: Session = Depends(get_
             )
         )
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Registration failed: {str(e)}"
@@ -228,24 +221,17 @@ def register_partner(request: PartnerRegisterRequest, db: Session = Depends(get_
 
 
 from app.schemas.auth import UpdateCustomerRequest, UpdatePartnerRequest, ChangePasswordRequest
-from app.services.auth_service import verify_password, hash_password
+from app.services import password_hasher
 
 
 @router.put("/me/customer")
-def update_customer_profile(
+async def update_customer_profile(
     request: UpdateCustomerRequest,
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Cập nhật thông tin customer"""
-    token = credentials.credentials
-    account = validate_token(db, token)
-    
-    if not account:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid or expired token"
-        )
+    account = await _load_current_account(db, credentials.credentials)
     
     if not account.customer:
         raise HTTPException(
@@ -265,8 +251,8 @@ def update_customer_profile(
     if request.id_number is not None:
         customer.id_number = request.id_number
     
-    db.commit()
-    db.refresh(customer)
+    await db.commit()
+    await token_cache.invalidate_account(account.account_id)
     
     return {
         "message": "Cập nhật thông tin thành công",
@@ -281,20 +267,13 @@ def update_customer_profile(
 
 
 @router.put("/me/partner")
-def update_partner_profile(
+async def update_partner_profile(
     request: UpdatePartnerRequest,
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Cập nhật thông tin partner"""
-    token = credentials.credentials
-    account = validate_token(db, token)
-    
-    if not account:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid or expired token"
-        )
+    account = await _load_current_account(db, credentials.credentials)
     
     if not account.partner:
         raise HTTPException(
@@ -316,8 +295,8 @@ def update_partner_profile(
     if request.bank is not None:
         partner.bank = request.bank
     
-    db.commit()
-    db.refresh(partner)
+    await db.commit()
+    await token_cache.invalidate_account(account.account_id)
     
     return {
         "message": "Cập nhật thông tin thành công",
@@ -333,30 +312,24 @@ def update_partner_profile(
 
 
 @router.put("/me/password")
-def change_password(
+async def change_password(
     request: ChangePasswordRequest,
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Đổi mật khẩu"""
-    token = credentials.credentials
-    account = validate_token(db, token)
-    
-    if not account:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid or expired token"
-        )
+    account = await _load_current_account(db, credentials.credentials)
     
     # Kiểm tra mật khẩu cũ
-    if not verify_password(request.old_password, account.password):
+    if not await password_hasher.verify_password(request.old_password, account.password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Mật khẩu cũ không đúng"
         )
     
     # Cập nhật mật khẩu mới
-    account.password = hash_password(request.new_password)
-    db.commit()
+    account.password = await password_hasher.hash_password(request.new_password)
+    await db.commit()
+    await token_cache.invalidate_account(account.account_id)
     
     return {"message": "Đổi mật khẩu thành công"}
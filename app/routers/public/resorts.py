@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, Query, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_
+from sqlalchemy import select
 from sqlalchemy.orm import selectinload
 from datetime import datetime, timedelta
 from typing import Optional
@@ -9,14 +9,12 @@ from app.db_async import get_db
 from app.models.account import Account
 from app.models.customer import Customer
 from app.models.feedback import Feedback
-from app.models.resort import Resort
-from app.models.resort_images import ResortImage
 from app.models.room_type import RoomType
-from app.models.room import Room
 from app.models.offer import Offer
 from app.models.booking_detail import BookingDetail
-from app.models.booking_timeslot import BookingTimeSlot
 from app.schemas.feedback import FeedbackCreate, FeedbackResponse
+from app.services import catalog_cache
+from app.services.availability_service import get_available_rooms
 from app.dependencies.auth import get_current_account
 
 router = APIRouter(prefix="/api/v1", tags=["Resorts"])
@@ -45,73 +43,27 @@ async def get_resort_detail(
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid date format for checkout, use YYYY-MM-DD")
 
-    resort_result = await db.execute(select(Resort).where(Resort.id == id))
-    resort = resort_result.scalar_one_or_none()
+    # Thông tin resort và loại phòng lấy từ cache, chỉ số phòng trống được tính theo ngày
+    resort = await catalog_cache.get_resort(db, id)
 
     if not resort:
         raise HTTPException(status_code=404, detail="Resort not found")
 
-    img_result = await db.execute(
-        select(ResortImage.url).where(ResortImage.resort_id == id)
+    available_by_type = await get_available_rooms(
+        db, [r["id"] for r in resort["room_types"]], checkin_date, checkout_date
     )
-    images = [row[0] for row in img_result.all()]
 
-    roomtype_result = await db.execute(
-        select(
-            RoomType.id,
-            RoomType.name,
-            RoomType.area,
-            RoomType.bed_amount,
-            RoomType.people_amount,
-            RoomType.price
-        ).where(RoomType.resort_id == id)
-    )
-    room_types_data = roomtype_result.all()
-
-    room_types = []
-    for r in room_types_data:
-        # Count total rooms for this room type
-        total_rooms_result = await db.execute(
-            select(func.count(Room.id)).where(Room.room_type_id == r.id)
-        )
-        total_rooms = total_rooms_result.scalar() or 0
-
-        # Count booked rooms in the date range
-        booked_rooms_subq = (
-            select(BookingTimeSlot.room_id)
-            .join(Room, Room.id == BookingTimeSlot.room_id)
-            .where(
-                and_(
-                    Room.room_type_id == r.id,
-                    BookingTimeSlot.started_time < checkout_date,
-                    BookingTimeSlot.finished_time > checkin_date
-                )
-            )
-            .distinct()
-        )
-        booked_rooms_result = await db.execute(
-            select(func.count()).select_from(booked_rooms_subq.subquery())
-        )
-        booked_rooms = booked_rooms_result.scalar() or 0
-
-        available_rooms = total_rooms - booked_rooms
-
-        room_types.append({
-            "id": r.id,
-            "name": r.name,
-            "area": float(r.area),
-            "bed_amount": r.bed_amount,
-            "people_amount": r.people_amount,
-            "price": float(r.price),
-            "available_rooms": available_rooms
-        })
+    room_types = [
+        {**r, "available_rooms": available_by_type.get(r["id"], 0)}
+        for r in resort["room_types"]
+    ]
 
     return {
-        "id": resort.id,
-        "name": resort.name,
-        "address": resort.address,
-        "rating": resort.rating,
-        "images": images,
+        "id": resort["id"],
+        "name": resort["name"],
+        "address": resort["address"],
+        "rating": resort["rating"],
+        "images": resort["images"],
         "room_types": room_types
     }
 
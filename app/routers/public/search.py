@@ -1,20 +1,20 @@
 from fastapi import APIRouter, Depends, Query, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_, or_
+from sqlalchemy import select, func
 from datetime import datetime, timedelta
 from typing import Optional
 
-from app.db_async import get_db
+from app.db_async import get_db, statement_timeout
 from app.models.resort import Resort
 from app.models.room_type import RoomType
 from app.models.room import Room
 from app.models.booking_timeslot import BookingTimeSlot
-from app.models.resort_images import ResortImage
-from app.models.service import Service
+from app.services import catalog_cache, text_search
+from app.services.availability_service import AVAILABILITY_USE_DAILY_COUNTERS, daily_available_room_types
 
 router = APIRouter(prefix="/api/v1", tags=["Search"])
 
-@router.get("/search")
+@router.get("/search", dependencies=[Depends(statement_timeout(3000))])
 async def search_resorts(
     checkin: Optional[str] = Query(None),
     checkout: Optional[str] = Query(None),
@@ -22,7 +22,6 @@ async def search_resorts(
     name: Optional[str] = Query(None, description="Search resort by name or address"),
     db: AsyncSession = Depends(get_db)
 ):
-    print('here')
     if number is None:
         number = 1  # Mặc định là 1 người
     if checkin is None:
@@ -49,70 +48,64 @@ async def search_resorts(
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid date format for checkout, use YYYY-MM-DD")
 
-    # 1️⃣ Subquery lấy các room bị trùng lịch
-    subq = (
-        select(BookingTimeSlot.room_id)
-        .where(
-            and_(
-                BookingTimeSlot.started_time < checkout_date,
-                BookingTimeSlot.finished_time > checkin_date
+    if checkout_date <= checkin_date:
+        raise HTTPException(status_code=400, detail="checkout must be after checkin")
+
+    if AVAILABILITY_USE_DAILY_COUNTERS:
+        # 1️⃣➕2️⃣ Loại phòng còn phòng trống theo bộ đếm từng đêm
+        available = daily_available_room_types(checkin_date, checkout_date)
+        stmt = (
+            select(
+                Resort.id,
+                func.min(RoomType.price).label("min_price")
             )
+            .join(RoomType, RoomType.resort_id == Resort.id)
+            .join(available, available.c.room_type_id == RoomType.id)
+            .where((available.c.available_rooms > 0) & (RoomType.people_amount >= number))
         )
-    )
-
-    # 2️⃣ Resort có ít nhất 1 room trống
-    stmt = (
-        select(
-            Resort.id,
-            Resort.name,
-            Resort.address,
-            Resort.rating,
-            func.min(RoomType.price).label("min_price")
+    else:
+        # 1️⃣ Subquery lấy các room bị trùng lịch
+        subq = (
+            select(BookingTimeSlot.room_id)
+            .where(BookingTimeSlot.overlaps(checkin_date, checkout_date))
         )
-        .join(RoomType, RoomType.resort_id == Resort.id)
-        .join(Room, Room.room_type_id == RoomType.id)
-        .where(~Room.id.in_(subq) & (RoomType.people_amount >= number))
-    )
 
-    # 3️⃣ Filter theo name HOẶC address nếu có
-    if name:
-        stmt = stmt.where(
-            or_(
-                Resort.name.ilike(f"%{name}%"),
-                Resort.address.ilike(f"%{name}%")
+        # 2️⃣ Resort có ít nhất 1 room trống, giá thấp nhất tính theo lịch nên luôn đọc từ database
+        stmt = (
+            select(
+                Resort.id,
+                func.min(RoomType.price).label("min_price")
             )
+            .join(RoomType, RoomType.resort_id == Resort.id)
+            .join(Room, Room.room_type_id == RoomType.id)
+            .where(~Room.id.in_(subq) & (RoomType.people_amount >= number))
         )
 
     stmt = stmt.group_by(Resort.id)
 
-    result = await db.execute(stmt)
-    resorts = result.all()
-
-    # 4️⃣ Gắn thêm images và services
-    output = []
-    for r in resorts:
-        # Lấy 4 ảnh đầu
-        img_result = await db.execute(
-            select(ResortImage.url)
-            .where(ResortImage.resort_id == r.id)
-            .limit(4)
+    # 3️⃣ Filter theo name HOẶC address nếu có: không dấu, chấp nhận sai chính tả,
+    # resort giống từ khóa nhất đứng đầu
+    if name and name.strip():
+        stmt = (
+            stmt.where(text_search.matches(name, Resort.name, Resort.address))
+            .order_by(text_search.rank(name, Resort.name, Resort.address).desc(), Resort.id)
         )
-        images = [row[0] for row in img_result.all()]
 
-        # Lấy danh sách dịch vụ
-        sv_result = await db.execute(
-            select(Service.name).where(Service.resort_id == r.id)
-        )
-        services = [row[0] for row in sv_result.all()]
+    matched = (await db.execute(stmt)).all()
+
+    # 4️⃣ Thông tin resort, images (4 ảnh đầu) và services lấy từ catalog cache
+    resorts = await catalog_cache.get_resorts(db, [r.id for r in matched])
 
-        output.append({
+    return [
+        {
             "id": r.id,
-            "name": r.name,
-            "address": r.address,
-            "rating": r.rating,
+            "name": resorts[r.id]["name"],
+            "address": resorts[r.id]["address"],
+            "rating": resorts[r.id]["rating"],
             "min_price": float(r.min_price),
-            "images": images,
-            "services": services
-        })
-
-    return output
\ No newline at end of file
+            "images": resorts[r.id]["images"][:4],
+            "services": resorts[r.id]["services"]
+        }
+        for r in matched
+        if r.id in resorts
+    ]
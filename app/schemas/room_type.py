@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
 from decimal import Decimal
 
@@ -82,3 +82,65 @@ class OfferWithDetails(OfferOut):
     room_type_name: Optional[str] = None
     resort_name: Optional[str] = None
     services: List[ServiceOut] = []
+
+
+# ============ Bulk ============
+
+# Giới hạn số dòng mỗi request bulk
+BULK_MAX_ROWS = 2000
+
+
+class RoomBlock(BaseModel):
+    """count phòng đánh số liên tiếp start_number, start_number + 1, ... cho một loại phòng"""
+    room_type_id: int
+    start_number: int = Field(..., ge=0)
+    count: int = Field(..., ge=1, le=BULK_MAX_ROWS)
+    status: str = Field("available", max_length=255)
+
+
+class BulkRoomsCreate(BaseModel):
+    rooms: List[RoomBlock] = Field(..., min_length=1)
+
+
+class RoomOut(BaseModel):
+    id: int
+    room_type_id: int
+    number: int
+
+
+class BulkRoomsOut(BaseModel):
+    created: int
+    skipped: int
+    rooms: List[RoomOut] = []
+
+
+class RoomImageUpsert(BaseModel):
+    room_type_id: int
+    url: str = Field(..., min_length=1, max_length=255)
+    is_deleted: bool = False
+
+
+class BulkImagesUpsert(BaseModel):
+    images: List[RoomImageUpsert] = Field(..., min_length=1, max_length=BULK_MAX_ROWS)
+
+
+class RoomImageUpsertOut(RoomImageOut):
+    room_type_id: int
+    is_deleted: bool
+
+
+class OfferUpsert(BaseModel):
+    """Không có id: tạo gói mới. Có id: cập nhật giá gói đó (phải thuộc room_type_id)"""
+    id: Optional[int] = None
+    room_type_id: int
+    cost: Decimal = Field(..., ge=0)
+
+
+class BulkOffersUpsert(BaseModel):
+    offers: List[OfferUpsert] = Field(..., min_length=1, max_length=BULK_MAX_ROWS)
+
+
+class BulkOffersOut(BaseModel):
+    created: int
+    updated: int
+    offers: List[OfferOut] = []
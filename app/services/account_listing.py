@@ -0,0 +1,203 @@
+import asyncio
+import base64
+import hashlib
+import json
+import os
+from typing import NamedTuple, Optional
+
+from fastapi import HTTPException, status
+from redis.exceptions import RedisError
+from sqlalchemy import select, union_all, literal, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import async_redis_client
+from app.db_async import AsyncSessionLocal
+from app.models.account import Account
+from app.models.customer import Customer
+from app.models.partner import Partner
+from app.services import text_search
+
+# Config
+ACCOUNT_COUNT_CACHE_TTL_SECONDS = int(os.getenv("ACCOUNT_COUNT_CACHE_TTL_SECONDS", "60"))
+
+COUNT_VERSION_KEY = "accounts:count:ver"
+ACCOUNT_TYPES = ("CUSTOMER", "PARTNER")
+
+# Task đếm chính xác đang chạy nền, giữ tham chiếu để không bị garbage collect
+_count_tasks: set[asyncio.Task] = set()
+
+
+class AccountFilter(NamedTuple):
+    account_type: Optional[str] = None
+    status: Optional[str] = None
+    search: Optional[str] = None
+
+
+def encode_cursor(account_id: int, account_type: str) -> str:
+    raw = json.dumps([account_id, account_type], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[int, str]:
+    try:
+        account_id, account_type = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(account_id, int) or account_type not in ACCOUNT_TYPES:
+            raise ValueError
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor không hợp lệ")
+    return account_id, account_type
+
+
+def _branch(account_type: str, flt: AccountFilter, after: Optional[tuple[int, str]]):
+    """SELECT tài khoản của một loại (customer hoặc partner) theo bộ lọc, sau cursor nếu có"""
+    profile, name_column = (Customer, Customer.fullname) if account_type == "CUSTOMER" else (Partner, Partner.name)
+
+    query = (
+        select(
+            Account.account_id,
+            Account.username,
+            Account.status,
+            literal(account_type).label("account_type"),
+            name_column.label("name"),
+            profile.phone_number
+        )
+        .join(profile, Account.account_id == profile.account_id)
+        .where(Account.is_deleted == False)
+    )
+
+    if flt.status:
+        query = query.where(Account.status == flt.status)
+
+    if flt.search:
+        query = query.where(text_search.matches(flt.search, Account.username, name_column))
+
+    if after is not None:
+        # Thứ tự là (account_id, account_type), account_type là hằng số trong mỗi nhánh
+        # nên điều kiện keyset chỉ còn so sánh account_id, dùng được primary key
+        after_id, after_type = after
+        query = query.where(Account.account_id > after_id if account_type <= after_type else Account.account_id >= after_id)
+
+    return query
+
+
+def _branches(flt: AccountFilter, after: Optional[tuple[int, str]] = None) -> list:
+    return [
+        _branch(account_type, flt, after)
+        for account_type in ACCOUNT_TYPES
+        if flt.account_type is None or flt.account_type == account_type
+    ]
+
+
+async def list_accounts(
+    db: AsyncSession,
+    flt: AccountFilter,
+    limit: int,
+    cursor: Optional[str] = None,
+    offset: int = 0
+) -> tuple[list, Optional[str]]:
+    """
+    Một trang tài khoản sắp theo (account_id, account_type) và cursor cho trang sau (None nếu hết).
+    Mỗi nhánh của UNION ALL tự ORDER BY + LIMIT nên chỉ đọc tối đa offset + limit + 1 dòng
+    qua primary key, không phụ thuộc kích thước bảng (trừ khi dùng offset lớn).
+    """
+    branches = _branches(flt, decode_cursor(cursor) if cursor else None)
+    if not branches:
+        return [], None
+
+    fetch = offset + limit + 1
+    accounts = union_all(*[
+        select(branch.order_by(Account.account_id).limit(fetch).subquery())
+        for branch in branches
+    ]).subquery("accounts")
+
+    rows = (await db.execute(
+        select(accounts)
+        .order_by(accounts.c.account_id, accounts.c.account_type)
+        .offset(offset)
+        .limit(limit + 1)
+    )).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].account_id, rows[-1].account_type)
+    return rows, next_cursor
+
+
+def _count_stmt(flt: AccountFilter):
+    return select(func.count()).select_from(union_all(*_branches(flt)).subquery("accounts"))
+
+
+async def _estimate_count(db: AsyncSession, flt: AccountFilter) -> int:
+    """Số dòng planner ước lượng cho truy vấn (EXPLAIN), không đọc bảng"""
+    branches = _branches(flt)
+    if not branches:
+        return 0
+    connection = await db.connection()
+    compiled = union_all(*branches).compile(
+        dialect=connection.dialect, compile_kwargs={"render_postcompile": True}
+    )
+    result = await connection.exec_driver_sql(
+        f"EXPLAIN (FORMAT JSON) {compiled}",
+        tuple(compiled.params[name] for name in compiled.positiontup)
+    )
+    raw = result.scalar()
+    plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]["Plan"]
+    return int(plan["Plan Rows"])
+
+
+async def _refresh_exact_count(flt: AccountFilter, key: str):
+    """Đếm chính xác bằng session riêng rồi cache, khóa SET NX để mỗi bộ lọc chỉ có một lần đếm"""
+    lock_key = f"{key}:lock"
+    try:
+        if not await async_redis_client.set(lock_key, "1", nx=True, ex=30):
+            return
+    except RedisError:
+        return
+
+    try:
+        async with AsyncSessionLocal() as db:
+            count = (await db.execute(_count_stmt(flt))).scalar()
+        await async_redis_client.set(key, count, ex=ACCOUNT_COUNT_CACHE_TTL_SECONDS)
+    except Exception as e:
+        print(f"[ACCOUNTS] Failed to refresh account count: {e}")
+    finally:
+        try:
+            await async_redis_client.delete(lock_key)
+        except RedisError:
+            pass
+
+
+async def total_count(db: AsyncSession, flt: AccountFilter) -> tuple[int, bool]:
+    """
+    (tổng số tài khoản khớp bộ lọc, có phải số chính xác không).
+    Trả số đếm chính xác đã cache nếu có; nếu chưa thì trả ước lượng của planner
+    và đếm chính xác ở background cho các request sau.
+    """
+    if not _branches(flt):
+        return 0, True
+
+    try:
+        version = await async_redis_client.get(COUNT_VERSION_KEY) or "0"
+        digest = hashlib.sha256(json.dumps(flt).encode()).hexdigest()[:32]
+        key = f"accounts:count:{version}:{digest}"
+        cached = await async_redis_client.get(key)
+    except RedisError as e:
+        print(f"[ACCOUNTS] Redis error on count cache: {e}")
+        return await _estimate_count(db, flt), False
+
+    if cached is not None:
+        return int(cached), True
+
+    task = asyncio.create_task(_refresh_exact_count(flt, key))
+    _count_tasks.add(task)
+    task.add_done_callback(_count_tasks.discard)
+    return await _estimate_count(db, flt), False
+
+
+async def invalidate_counts():
+    """Gọi sau khi commit thay đổi làm số tài khoản theo bộ lọc thay đổi (ban, unban, ...)"""
+    try:
+        await async_redis_client.incr(COUNT_VERSION_KEY)
+    except RedisError as e:
+        print(f"[ACCOUNTS] Redis error on invalidate counts: {e}")
@@ -1,7 +1,8 @@
 from datetime import datetime, timedelta
 from typing import Optional
-from sqlalchemy.orm import Session
-from passlib.context import CryptContext
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update
+from sqlalchemy.orm import joinedload
 from jose import JWTError, jwt
 import os
 
@@ -9,21 +10,16 @@ from app.models.account import Account
 from app.models.account_token import AccountToken
 from app.models.account_assign_role import AccountAssignRole
 from app.models.role import Role
+from app.models.customer import Customer
+from app.models.partner import Partner
+from app.services import token_cache, token_revocation, password_hasher
 
 # Config
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 24 hours
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
-
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+# Stateless mode: tin claims đã ký trong JWT, chỉ kiểm tra danh sách token bị revoke
+AUTH_STATELESS = os.getenv("AUTH_STATELESS", "false").lower() in ("1", "true", "yes")
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> tuple[str, datetime]:
@@ -42,22 +38,58 @@ def decode_token(token: str) -> Optional[dict]:
         return None
 
 
-def get_account_by_username(db: Session, username: str) -> Optional[Account]:
-    return db.query(Account).filter(
-        Account.username == username,
-        Account.is_deleted == False
-    ).first()
+async def get_account_by_username(db: AsyncSession, username: str) -> Optional[Account]:
+    """Lấy account kèm roles, customer, partner theo username"""
+    result = await db.execute(
+        select(Account)
+        .options(
+            joinedload(Account.roles),
+            joinedload(Account.customer),
+            joinedload(Account.partner)
+        )
+        .where(
+            Account.username == username,
+            Account.is_deleted == False
+        )
+    )
+    return result.unique().scalar_one_or_none()
 
 
-def get_account_by_id(db: Session, account_id: int) -> Optional[Account]:
-    return db.query(Account).filter(
-        Account.account_id == account_id,
-        Account.is_deleted == False
-    ).first()
+async def get_account_by_id(db: AsyncSession, account_id: int) -> Optional[Account]:
+    """Lấy account kèm roles, customer, partner theo account_id"""
+    result = await db.execute(
+        select(Account)
+        .options(
+            joinedload(Account.roles),
+            joinedload(Account.customer),
+            joinedload(Account.partner)
+        )
+        .where(
+            Account.account_id == account_id,
+            Account.is_deleted == False
+        )
+    )
+    return result.unique().scalar_one_or_none()
+
+
+async def username_exists(db: AsyncSession, username: str) -> bool:
+    result = await db.execute(
+        select(Account.account_id).where(
+            Account.username == username,
+            Account.is_deleted == False
+        )
+    )
+    return result.first() is not None
 
 
-def register_account(
-    db: Session, 
+async def _assign_role(db: AsyncSession, account_id: int, role_title: str):
+    role_id = (await db.execute(select(Role.id).where(Role.title == role_title))).scalar()
+    if role_id:
+        db.add(AccountAssignRole(account_id=account_id, role_id=role_id))
+
+
+async def register_account(
+    db: AsyncSession, 
     username: str, 
     password: str, 
     role_title: str = "CUSTOMER",
@@ -67,10 +99,8 @@ def register_account(
     id_number: str = None
 ) -> Account:
     """Đăng ký tài khoản mới"""
-    from app.models.customer import Customer
-    
     # Hash password
-    hashed_password = hash_password(password)
+    hashed_password = await password_hasher.hash_password(password)
     
     # Tạo account
     new_account = Account(
@@ -80,16 +110,10 @@ def register_account(
         is_deleted=False
     )
     db.add(new_account)
-    db.flush()  # Để lấy account_id
+    await db.flush()  # Để lấy account_id
     
     # Gán role mặc định
-    role = db.query(Role).filter(Role.title == role_title).first()
-    if role:
-        account_role = AccountAssignRole(
-            account_id=new_account.account_id,
-            role_id=role.id
-        )
-        db.add(account_role)
+    await _assign_role(db, new_account.account_id, role_title)
     
     # Tạo Customer profile nếu role là CUSTOMER
     if role_title == "CUSTOMER":
@@ -103,8 +127,8 @@ def register_account(
         )
         db.add(new_customer)
     
-    db.commit()
-    db.refresh(new_account)
+    await db.commit()
+    await db.refresh(new_account, ["roles"])
     return new_account
 
 
@@ -115,14 +139,15 @@ class LoginError:
         self.message = message
 
 
-def login_account(db: Session, username: str, password: str) -> tuple[Account, str, datetime] | LoginError:
+async def login_account(db: AsyncSession, username: str, password: str) -> tuple[Account, str, datetime] | LoginError:
     """Đăng nhập và tạo token"""
-    account = get_account_by_username(db, username)
+    account = await get_account_by_username(db, username)
     
     if not account:
         return LoginError("invalid_credentials", "Invalid username or password")
     
-    if not verify_password(password, account.password):
+    valid, new_hash = await password_hasher.verify_and_update(password, account.password)
+    if not valid:
         return LoginError("invalid_credentials", "Invalid username or password")
     
     if account.status == "PENDING":
@@ -137,63 +162,52 @@ def login_account(db: Session, username: str, password: str) -> tuple[Account, s
     if account.status != "ACTIVE":
         return LoginError("inactive", "Account is not active.")
     
-    # Tạo access token
-    token_data = {
-        "sub": str(account.account_id),
-        "username": account.username
-    }
-    access_token, expires_at = create_access_token(token_data)
-    
-    # Lưu token vào database
+    # Lưu token vào database trước để lấy token_id làm claim "jti"
     account_token = AccountToken(
         account_id=account.account_id,
-        token_value=access_token,
-        expires_at=expires_at,
+        token_value="",
         is_revoked=False
     )
     db.add(account_token)
-    db.commit()
-    
-    return account, access_token, expires_at
+    await db.flush()
 
+    # Tạo access token - kèm roles, customer_id, partner_id để xác thực không cần database
+    token_data = {
+        "sub": str(account.account_id),
+        "username": account.username,
+        "jti": str(account_token.token_id),
+        "roles": get_account_roles(account),
+        "customer_id": account.customer.id if account.customer else None,
+        "partner_id": account.partner.id if account.partner else None
+    }
+    access_token, expires_at = create_access_token(token_data)
 
-def logout_account(db: Session, token: str) -> bool:
-    """Đăng xuất - revoke token"""
-    account_token = db.query(AccountToken).filter(
-        AccountToken.token_value == token,
-        AccountToken.is_revoked == False
-    ).first()
-    
-    if not account_token:
-        return False
+    account_token.token_value = access_token
+    account_token.expires_at = expires_at
+    if new_hash:
+        # Hash lại theo BCRYPT_ROUNDS hiện tại, lưu cùng transaction tạo token
+        account.password = new_hash
+    await db.commit()
     
-    account_token.is_revoked = True
-    db.commit()
-    return True
+    return account, access_token, expires_at
 
 
-def validate_token(db: Session, token: str) -> Optional[Account]:
-    """Kiểm tra token hợp lệ và trả về account"""
-    # Decode token
-    payload = decode_token(token)
-    if not payload:
-        return None
-    
-    account_id = payload.get("sub")
-    if not account_id:
-        return None
-    
-    # Kiểm tra token trong database
-    account_token = db.query(AccountToken).filter(
-        AccountToken.token_value == token,
-        AccountToken.is_revoked == False,
-        AccountToken.expires_at > datetime.utcnow()
-    ).first()
+async def logout_account(db: AsyncSession, token: str) -> Optional[AccountToken]:
+    """Đăng xuất - revoke token, trả về token đã revoke"""
+    result = await db.execute(
+        select(AccountToken).where(
+            AccountToken.token_value == token,
+            AccountToken.is_revoked == False
+        )
+    )
+    account_token = result.scalars().first()
     
     if not account_token:
         return None
     
-    return get_account_by_id(db, int(account_id))
+    account_token.is_revoked = True
+    await db.commit()
+    return account_token
 
 
 def get_account_roles(account: Account) -> list[str]:
@@ -201,11 +215,8 @@ def get_account_roles(account: Account) -> list[str]:
     return [role.title for role in account.roles]
 
 
-from app.models.partner import Partner
-
-
-def register_partner_account(
-    db: Session, 
+async def register_partner_account(
+    db: AsyncSession, 
     username: str, 
     password: str,
     name: str,
@@ -215,7 +226,7 @@ def register_partner_account(
     bank: str
 ) -> tuple[Account, Partner]:
     """Đăng ký tài khoản đối tác - trạng thái PENDING chờ admin duyệt"""
-    hashed_password = hash_password(password)
+    hashed_password = await password_hasher.hash_password(password)
     
     # Tạo account với status PENDING
     new_account = Account(
@@ -225,16 +236,10 @@ def register_partner_account(
         is_deleted=False
     )
     db.add(new_account)
-    db.flush()
+    await db.flush()
     
     # Gán role PARTNER
-    role = db.query(Role).filter(Role.title == "PARTNER").first()
-    if role:
-        account_role = AccountAssignRole(
-            account_id=new_account.account_id,
-            role_id=role.id
-        )
-        db.add(account_role)
+    await _assign_role(db, new_account.account_id, "PARTNER")
     
     # Tạo partner profile
     new_partner = Partner(
@@ -248,51 +253,13 @@ def register_partner_account(
     )
     db.add(new_partner)
     
-    db.commit()
-    db.refresh(new_account)
-    db.refresh(new_partner)
+    await db.commit()
     
     return new_account, new_partner
 
 
-def get_pending_partners(db: Session) -> list:
-    """Lấy danh sách đối tác đang chờ duyệt (sync version)"""
-    return db.query(Partner, Account).join(
-        Account, Partner.account_id == Account.account_id
-    ).filter(
-        Account.status == "PENDING",
-        Account.is_deleted == False
-    ).all()
-
-
-def approve_partner(db: Session, account_id: int, approved: bool) -> Optional[Account]:
-    """Admin duyệt hoặc từ chối đối tác (sync version)"""
-    account = db.query(Account).filter(
-        Account.account_id == account_id,
-        Account.status == "PENDING",
-        Account.is_deleted == False
-    ).first()
-    
-    if not account:
-        return None
-    
-    if approved:
-        account.status = "ACTIVE"
-    else:
-        account.status = "REJECTED"
-    
-    db.commit()
-    db.refresh(account)
-    return account
-
-
-# Async versions for async routers
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-
-
 async def get_pending_partners_async(db: AsyncSession) -> list:
-    """Lấy danh sách đối tác đang chờ duyệt (async version)"""
+    """Lấy danh sách đối tác đang chờ duyệt"""
     query = select(Partner, Account).join(
         Account, Partner.account_id == Account.account_id
     ).where(
@@ -304,7 +271,7 @@ async def get_pending_partners_async(db: AsyncSession) -> list:
 
 
 async def approve_partner_async(db: AsyncSession, account_id: int, approved: bool) -> Optional[Account]:
-    """Admin duyệt hoặc từ chối đối tác (async version)"""
+    """Admin duyệt hoặc từ chối đối tác"""
     query = select(Account).where(
         Account.account_id == account_id,
         Account.status == "PENDING",
@@ -324,3 +291,81 @@ async def approve_partner_async(db: AsyncSession, account_id: int, approved: boo
     await db.commit()
     await db.refresh(account)
     return account
+
+
+async def validate_token_async(db: AsyncSession, token: str) -> Optional[Account]:
+    """
+    Kiểm tra token hợp lệ và trả về account.
+    Token đã có trong cache (LRU local / Redis) không tốn truy vấn database nào;
+    nếu chưa có, token, account, roles, customer và partner được lấy trong một câu truy vấn.
+    """
+    payload = decode_token(token)
+    if not payload:
+        return None
+
+    account_id = payload.get("sub")
+    if not account_id:
+        return None
+
+    if AUTH_STATELESS and "jti" in payload and "roles" in payload and token_revocation.is_fresh():
+        if token_revocation.is_revoked(int(payload["jti"])):
+            return None
+        return account_from_claims(payload)
+
+    cached = await token_cache.get_cached_account(token, int(account_id))
+    if cached.account and cached.account.account_id == int(account_id):
+        return cached.account
+
+    result = await db.execute(
+        select(Account, AccountToken.expires_at)
+        .join(AccountToken, AccountToken.account_id == Account.account_id)
+        .options(
+            joinedload(Account.roles),
+            joinedload(Account.customer),
+            joinedload(Account.partner)
+        )
+        .where(
+            AccountToken.token_value == token,
+            AccountToken.is_revoked == False,
+            AccountToken.expires_at > datetime.utcnow(),
+            Account.account_id == int(account_id),
+            Account.is_deleted == False
+        )
+    )
+    row = result.unique().first()
+    if not row:
+        return None
+
+    account, expires_at = row
+    await token_cache.cache_account(token, account, expires_at, cached.generation)
+    return account
+
+
+def account_from_claims(payload: dict) -> Account:
+    """Dựng Account (detached) từ claims của JWT, dùng cho stateless mode"""
+    account_id = int(payload["sub"])
+    return token_cache.account_from_snapshot({
+        "account_id": account_id,
+        "username": payload.get("username"),
+        "status": "ACTIVE",
+        "created_at": None,
+        "roles": [{"id": None, "title": title} for title in payload["roles"]],
+        "customer": {"id": payload["customer_id"], "account_id": account_id} if payload.get("customer_id") else None,
+        "partner": {"id": payload["partner_id"], "account_id": account_id} if payload.get("partner_id") else None,
+    })
+
+
+async def revoke_account_tokens_async(db: AsyncSession, account_id: int) -> list[tuple[int, datetime]]:
+    """
+    Revoke toàn bộ token còn hiệu lực của account (dùng khi ban tài khoản).
+    Không commit, trả về (token_id, expires_at) của các token vừa revoke: caller commit rồi mới
+    gọi token_revocation.revoke_tokens, để worker không thấy token bị revoke khi transaction
+    còn có thể rollback.
+    """
+    result = await db.execute(
+        update(AccountToken)
+        .where(AccountToken.account_id == account_id, AccountToken.is_revoked == False)
+        .values(is_revoked=True)
+        .returning(AccountToken.token_id, AccountToken.expires_at)
+    )
+    return result.all()
@@ -0,0 +1,289 @@
+import asyncio
+import os
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from typing import Optional
+
+import asyncpg
+
+from app.db_async import DATABASE_URL
+
+# Config
+AVAILABILITY_INDEX_ENABLED = os.getenv("AVAILABILITY_INDEX_ENABLED", "false").lower() in ("1", "true", "yes")
+# LISTEN cần kết nối thẳng tới Postgres, không qua pgbouncer transaction mode
+AVAILABILITY_INDEX_LISTEN_URL = os.getenv("AVAILABILITY_INDEX_LISTEN_URL", DATABASE_URL)
+# Giới hạn số timeslot giữ trong bộ nhớ, vượt quá thì index tắt và mọi truy vấn dùng SQL
+AVAILABILITY_INDEX_MAX_SLOTS = int(os.getenv("AVAILABILITY_INDEX_MAX_SLOTS", "2000000"))
+# Timeslot kết thúc trước now - HISTORY_DAYS không được nạp; truy vấn trước mốc này dùng SQL
+AVAILABILITY_INDEX_HISTORY_DAYS = int(os.getenv("AVAILABILITY_INDEX_HISTORY_DAYS", "1"))
+# Không nhận được heartbeat của chính mình qua NOTIFY quá số giây này thì coi index là cũ
+AVAILABILITY_INDEX_STALE_SECONDS = float(os.getenv("AVAILABILITY_INDEX_STALE_SECONDS", "15"))
+AVAILABILITY_INDEX_HEARTBEAT_SECONDS = float(os.getenv("AVAILABILITY_INDEX_HEARTBEAT_SECONDS", "5"))
+
+CHANNEL = "availability_index"
+
+# Trigger gửi NOTIFY chỉ được cài khi bật index (python -m app.commands.availability index-enable),
+# vì mỗi lần ghi booking_timeslot / room sẽ phải trả thêm một NOTIFY. Hàm notify_availability_index()
+# do migration 9d4b1e6a2c38 tạo.
+TRIGGERS = {
+    "trg_booking_timeslot_notify_availability": (
+        "booking_timeslot", "AFTER INSERT OR UPDATE OR DELETE ON booking_timeslot"
+    ),
+    "trg_room_notify_availability": (
+        "room", "AFTER INSERT OR UPDATE OF room_type_id OR DELETE ON room"
+    ),
+}
+
+
+def install_triggers_sql() -> list[str]:
+    statements = []
+    for name, (table, timing) in TRIGGERS.items():
+        statements.append(f"DROP TRIGGER IF EXISTS {name} ON {table}")
+        statements.append(f"CREATE TRIGGER {name} {timing} FOR EACH ROW EXECUTE FUNCTION notify_availability_index()")
+    return statements
+
+
+def uninstall_triggers_sql() -> list[str]:
+    return [f"DROP TRIGGER IF EXISTS {name} ON {table}" for name, (table, _) in TRIGGERS.items()]
+
+
+class TriggersMissing(Exception):
+    """Trigger NOTIFY chưa được cài: index không nhận được thay đổi nên không được dùng"""
+
+
+EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def to_micros(value: datetime) -> int:
+    """Timestamp không timezone -> epoch microsecond, cùng cách tính với trigger trong database"""
+    return (value - EPOCH) // _MICROSECOND
+
+
+class RoomSlots:
+    """
+    Các khoảng [start, end) đã được giữ của một phòng, lưu trong hai array('q') sắp theo start.
+    Exclusion constraint đảm bảo các khoảng của một phòng không trùng nhau nên `ends` cũng tăng dần,
+    kiểm tra trùng lịch chỉ cần một lần bisect.
+    """
+
+    __slots__ = ("starts", "ends")
+
+    def __init__(self):
+        self.starts = array("q")
+        self.ends = array("q")
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def add(self, start: int, end: int) -> bool:
+        i = bisect_left(self.starts, start)
+        if i < len(self.starts) and self.starts[i] == start:
+            return False
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+        return True
+
+    def remove(self, start: int) -> bool:
+        i = bisect_left(self.starts, start)
+        if i == len(self.starts) or self.starts[i] != start:
+            return False
+        del self.starts[i]
+        del self.ends[i]
+        return True
+
+    def overlaps(self, start: int, end: int) -> bool:
+        i = bisect_right(self.ends, start)
+        return i < len(self.starts) and self.starts[i] < end
+
+
+class AvailabilityIndex:
+    def __init__(self):
+        self.rooms: dict[int, RoomSlots] = {}
+        self.room_types: dict[int, int] = {}  # room_id -> room_type_id
+        self.type_rooms: dict[int, set[int]] = {}  # room_type_id -> room_ids
+        self.slot_count = 0
+        self.horizon = 0  # epoch microsecond, truy vấn bắt đầu trước mốc này không trả lời được
+        self.ready = False
+        self.last_heartbeat = 0.0
+
+    @property
+    def fresh(self) -> bool:
+        return self.ready and time.monotonic() - self.last_heartbeat <= AVAILABILITY_INDEX_STALE_SECONDS
+
+    def set_room(self, room_id: int, room_type_id: Optional[int]):
+        old_type = self.room_types.pop(room_id, None)
+        if old_type is not None:
+            self.type_rooms.get(old_type, set()).discard(room_id)
+        if room_type_id is not None:
+            self.room_types[room_id] = room_type_id
+            self.type_rooms.setdefault(room_type_id, set()).add(room_id)
+
+    def remove_room(self, room_id: int):
+        self.set_room(room_id, None)
+        slots = self.rooms.pop(room_id, None)
+        if slots is not None:
+            self.slot_count -= len(slots)
+
+    def add_slot(self, room_id: int, start: int, end: int):
+        if end <= self.horizon:
+            return
+        slots = self.rooms.get(room_id)
+        if slots is None:
+            slots = self.rooms[room_id] = RoomSlots()
+        if slots.add(start, end):
+            self.slot_count += 1
+
+    def remove_slot(self, room_id: int, start: int):
+        slots = self.rooms.get(room_id)
+        if slots is not None and slots.remove(start):
+            self.slot_count -= 1
+
+    def apply(self, payload: str):
+        kind, *fields = payload.split(",")
+        if kind == "H":
+            self.last_heartbeat = time.monotonic()
+        elif kind == "I":
+            self.add_slot(int(fields[0]), int(fields[1]), int(fields[2]))
+        elif kind == "D":
+            self.remove_slot(int(fields[0]), int(fields[1]))
+        elif kind == "R":
+            self.set_room(int(fields[0]), int(fields[1]) if fields[1] else None)
+        elif kind == "X":
+            self.remove_room(int(fields[0]))
+
+    def counts(self, room_type_id: int, started_at: datetime, finished_at: datetime) -> Optional[dict]:
+        """Số phòng trống như get_availability_counts, None nếu index không trả lời được"""
+        if not self.fresh:
+            return None
+        start, end = to_micros(started_at), to_micros(finished_at)
+        if start < self.horizon:
+            return None
+
+        room_ids = self.type_rooms.get(room_type_id, ())
+        if start >= end:
+            return {"total_rooms": 0, "booked_rooms": 0, "available_rooms": 0}
+
+        booked = 0
+        for room_id in room_ids:
+            slots = self.rooms.get(room_id)
+            if slots is not None and slots.overlaps(start, end):
+                booked += 1
+        return {
+            "total_rooms": len(room_ids),
+            "booked_rooms": booked,
+            "available_rooms": len(room_ids) - booked
+        }
+
+    def stats(self) -> dict:
+        # Mỗi timeslot tốn 16 byte (hai int64), mỗi phòng thêm khoảng 500 byte cho array, object và dict
+        return {
+            "enabled": AVAILABILITY_INDEX_ENABLED,
+            "ready": self.ready,
+            "fresh": self.fresh,
+            "rooms": len(self.room_types),
+            "slots": self.slot_count,
+            "slot_bytes": self.slot_count * 16,
+            "horizon": (EPOCH + self.horizon * _MICROSECOND).isoformat() if self.horizon else None,
+            "seconds_since_heartbeat": round(time.monotonic() - self.last_heartbeat, 3) if self.last_heartbeat else None,
+        }
+
+
+index = AvailabilityIndex()
+
+
+def get_counts(room_type_id: int, started_at: datetime, finished_at: datetime) -> Optional[dict]:
+    if not AVAILABILITY_INDEX_ENABLED:
+        return None
+    return index.counts(room_type_id, started_at, finished_at)
+
+
+async def _load(connection: asyncpg.Connection, target: AvailabilityIndex):
+    horizon = datetime.now() - timedelta(days=AVAILABILITY_INDEX_HISTORY_DAYS)
+    target.horizon = to_micros(horizon)
+
+    async with connection.transaction(isolation="repeatable_read", readonly=True):
+        installed = {
+            record["tgname"]
+            for record in await connection.fetch(
+                "SELECT tgname FROM pg_trigger WHERE tgname = ANY($1::text[]) AND tgenabled <> 'D'",
+                list(TRIGGERS)
+            )
+        }
+        missing = sorted(set(TRIGGERS) - installed)
+        if missing:
+            raise TriggersMissing(f"triggers {missing} not installed")
+
+        for record in await connection.fetch("SELECT id, room_type_id FROM room"):
+            target.set_room(record["id"], record["room_type_id"])
+
+        cursor = connection.cursor(
+            "SELECT room_id, started_time, finished_time FROM booking_timeslot "
+            "WHERE finished_time > $1 ORDER BY room_id, started_time",
+            horizon,
+            prefetch=10000
+        )
+        async for record in cursor:
+            target.add_slot(record["room_id"], to_micros(record["started_time"]), to_micros(record["finished_time"]))
+            if target.slot_count > AVAILABILITY_INDEX_MAX_SLOTS:
+                raise OverflowError(f"more than {AVAILABILITY_INDEX_MAX_SLOTS} timeslots")
+
+
+async def run():
+    """
+    Background task của mỗi worker: LISTEN trước, nạp snapshot sau rồi áp các thông báo nhận được
+    trong lúc nạp (thêm/xóa đều idempotent), sau đó cập nhật index theo NOTIFY.
+    Mất kết nối thì index bị đánh dấu cũ (truy vấn dùng SQL) và được nạp lại từ đầu.
+    """
+    global index
+    dsn = AVAILABILITY_INDEX_LISTEN_URL.replace("postgresql+asyncpg://", "postgresql://")
+
+    while True:
+        connection = None
+        try:
+            connection = await asyncpg.connect(dsn)
+            pending: list[str] = []
+            fresh_index = AvailabilityIndex()
+
+            def on_notify(_connection, _pid, _channel, payload):
+                # Thông báo tới trong lúc nạp snapshot được giữ lại, áp sau khi nạp xong
+                if fresh_index.ready:
+                    fresh_index.apply(payload)
+                else:
+                    pending.append(payload)
+
+            await connection.add_listener(CHANNEL, on_notify)
+            started = time.perf_counter()
+            await _load(connection, fresh_index)
+            for payload in pending:
+                fresh_index.apply(payload)
+            fresh_index.ready = True
+            fresh_index.last_heartbeat = time.monotonic()
+            index = fresh_index
+            print(f"[AVAILABILITY_INDEX] Loaded {fresh_index.slot_count} slots for "
+                  f"{len(fresh_index.room_types)} rooms in {time.perf_counter() - started:.2f}s")
+
+            while not connection.is_closed():
+                await connection.execute(f"NOTIFY {CHANNEL}, 'H'")
+                if index.slot_count > AVAILABILITY_INDEX_MAX_SLOTS:
+                    raise OverflowError(f"more than {AVAILABILITY_INDEX_MAX_SLOTS} timeslots")
+                await asyncio.sleep(AVAILABILITY_INDEX_HEARTBEAT_SECONDS)
+        except asyncio.CancelledError:
+            raise
+        except TriggersMissing as e:
+            index.ready = False
+            print(f"[AVAILABILITY_INDEX] Disabled, {e}. Run: python -m app.commands.availability index-enable")
+            return
+        except OverflowError as e:
+            index.ready = False
+            print(f"[AVAILABILITY_INDEX] Disabled, {e}. Raise AVAILABILITY_INDEX_MAX_SLOTS or lower HISTORY_DAYS")
+            return
+        except Exception as e:
+            index.ready = False
+            print(f"[AVAILABILITY_INDEX] Listener error, falling back to SQL: {e}")
+            await asyncio.sleep(5)
+        finally:
+            if connection is not None and not connection.is_closed():
+                await connection.close()
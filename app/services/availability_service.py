@@ -0,0 +1,211 @@
+import os
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Iterable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func, and_, values, column, Integer, Date, DateTime
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.models.booking_timeslot import BookingTimeSlot
+from app.models.room import Room
+from app.models.room_type_day_availability import RoomTypeDayAvailability
+
+# Config - true: cập nhật bảng room_type_day_availability và dùng nó để ước lượng phòng trống khi
+# tìm kiếm / xem resort thay vì quét booking_timeslot. Bảng không được cập nhật khi tắt, nên sau khi
+# bật phải chạy `python -m app.commands.availability rebuild` (xem docs/availability.md)
+AVAILABILITY_USE_DAILY_COUNTERS = os.getenv("AVAILABILITY_USE_DAILY_COUNTERS", "false").lower() in ("1", "true", "yes")
+
+
+AvailabilityKey = tuple[int, datetime, datetime]
+TimeslotSpan = tuple[int, datetime, datetime]  # (room_type_id, started_time, finished_time)
+
+
+def night_range(started: datetime, finished: datetime) -> tuple[date, date]:
+    """
+    Đêm đầu và đêm cuối (tính cả hai đầu) mà khoảng [started, finished) chiếm.
+    Khoảng ngắn trong cùng một ngày vẫn tính là chiếm đêm của ngày đó.
+    """
+    first = started.date()
+    return first, max(finished.date() - timedelta(days=1), first)
+
+
+async def apply_timeslot_delta(db: AsyncSession, spans: Iterable[TimeslotSpan], sign: int):
+    """
+    Cộng (sign=1) hoặc trừ (sign=-1) số phòng đã giữ theo từng đêm cho các timeslot,
+    trong cùng transaction với thao tác trên booking_timeslot. Mọi đêm được cập nhật
+    bằng một câu INSERT ... ON CONFLICT, các dòng sắp xếp theo khóa để hai transaction
+    cập nhật cùng loại phòng luôn khóa dòng theo cùng thứ tự (không deadlock).
+    Không làm gì khi tắt AVAILABILITY_USE_DAILY_COUNTERS: không ai đọc bộ đếm thì không
+    tốn thêm một câu ghi và khóa dòng trên đường thanh toán.
+    """
+    if not AVAILABILITY_USE_DAILY_COUNTERS:
+        return
+
+    deltas = Counter()
+    for room_type_id, started, finished in spans:
+        day, last = night_range(started, finished)
+        while day <= last:
+            deltas[(room_type_id, day)] += sign
+            day += timedelta(days=1)
+
+    rows = [
+        {"room_type_id": room_type_id, "day": day, "booked_rooms": delta}
+        for (room_type_id, day), delta in sorted(deltas.items())
+        if delta
+    ]
+    if not rows:
+        return
+
+    stmt = pg_insert(RoomTypeDayAvailability).values(rows)
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[RoomTypeDayAvailability.room_type_id, RoomTypeDayAvailability.day],
+        set_={"booked_rooms": RoomTypeDayAvailability.booked_rooms + stmt.excluded.booked_rooms}
+    ))
+
+
+def daily_available_room_types(checkin: datetime, checkout: datetime):
+    """
+    Subquery (room_type_id, available_rooms) tính từ bộ đếm theo đêm:
+    số phòng của loại phòng trừ số phòng đã giữ lớn nhất trong các đêm của [checkin, checkout).
+    Chỉ là ước lượng để lọc danh sách (xem docs/availability.md, "Giới hạn"), không dùng để
+    kiểm tra đặt phòng.
+    """
+    first_night, last_night = night_range(checkin, checkout)
+    totals = (
+        select(Room.room_type_id, func.count(Room.id).label("total_rooms"))
+        .group_by(Room.room_type_id)
+        .subquery()
+    )
+    booked = (
+        select(
+            RoomTypeDayAvailability.room_type_id,
+            func.max(RoomTypeDayAvailability.booked_rooms).label("booked_rooms")
+        )
+        .where(RoomTypeDayAvailability.day.between(first_night, last_night))
+        .group_by(RoomTypeDayAvailability.room_type_id)
+        .subquery()
+    )
+    return (
+        select(
+            totals.c.room_type_id,
+            (totals.c.total_rooms - func.coalesce(booked.c.booked_rooms, 0)).label("available_rooms")
+        )
+        .outerjoin(booked, booked.c.room_type_id == totals.c.room_type_id)
+        .subquery("daily_available")
+    )
+
+
+async def _get_daily_counts(db: AsyncSession, keys: list[AvailabilityKey]) -> dict[int, tuple[int, int]]:
+    """(total_rooms, booked_rooms) theo vị trí key, booked_rooms là MAX của các đêm trong khoảng"""
+    requested = values(
+        column("idx", Integer),
+        column("room_type_id", Integer),
+        column("first_night", Date),
+        column("last_night", Date),
+        name="requested"
+    ).data([(idx, key[0], *night_range(key[1], key[2])) for idx, key in enumerate(keys)])
+
+    total_rooms = (
+        select(func.count(Room.id))
+        .where(Room.room_type_id == requested.c.room_type_id)
+        .scalar_subquery()
+    )
+    booked_rooms = (
+        select(func.coalesce(func.max(RoomTypeDayAvailability.booked_rooms), 0))
+        .where(
+            RoomTypeDayAvailability.room_type_id == requested.c.room_type_id,
+            RoomTypeDayAvailability.day.between(requested.c.first_night, requested.c.last_night)
+        )
+        .scalar_subquery()
+    )
+    result = await db.execute(
+        select(requested.c.idx, total_rooms.label("total_rooms"), booked_rooms.label("booked_rooms"))
+    )
+    return {row.idx: (row.total_rooms, row.booked_rooms) for row in result.all()}
+
+
+async def get_availability_counts(
+    db: AsyncSession,
+    keys: Iterable[AvailabilityKey],
+    exact: bool = False
+) -> dict[AvailabilityKey, dict]:
+    """
+    Tính số phòng trống cho nhiều (room_type_id, checkin, checkout) cùng lúc.
+    Toàn bộ các bộ key được gửi dưới dạng VALUES và đếm trong một câu GROUP BY,
+    nên số round trip không phụ thuộc vào số loại phòng.
+    Khi bật AVAILABILITY_USE_DAILY_COUNTERS và exact=False thì đọc MAX số phòng đã giữ
+    của các đêm trong bảng room_type_day_availability thay vì quét booking_timeslot.
+    Kết quả đó chỉ là ước lượng: giỏ hàng và kiểm tra trước khi đặt phải gọi exact=True.
+    """
+    unique_keys = list(dict.fromkeys(keys))
+    if not unique_keys:
+        return {}
+
+    counts = {
+        key: {"total_rooms": 0, "booked_rooms": 0, "available_rooms": 0}
+        for key in unique_keys
+    }
+    # Khoảng checkin >= checkout không có phòng trống, cũng không dựng được tsrange
+    unique_keys = [key for key in unique_keys if key[1] < key[2]]
+    if not unique_keys:
+        return counts
+
+    if AVAILABILITY_USE_DAILY_COUNTERS and not exact:
+        for idx, (total_rooms, booked_rooms) in (await _get_daily_counts(db, unique_keys)).items():
+            booked_rooms = min(max(booked_rooms, 0), total_rooms)
+            counts[unique_keys[idx]] = {
+                "total_rooms": total_rooms,
+                "booked_rooms": booked_rooms,
+                "available_rooms": total_rooms - booked_rooms
+            }
+        return counts
+
+    requested = values(
+        column("idx", Integer),
+        column("room_type_id", Integer),
+        column("checkin", DateTime),
+        column("checkout", DateTime),
+        name="requested"
+    ).data([(idx, *key) for idx, key in enumerate(unique_keys)])
+
+    stmt = (
+        select(
+            requested.c.idx,
+            func.count(Room.id.distinct()).label("total_rooms"),
+            func.count(BookingTimeSlot.room_id.distinct()).label("booked_rooms")
+        )
+        .select_from(requested)
+        .join(Room, Room.room_type_id == requested.c.room_type_id)
+        .outerjoin(
+            BookingTimeSlot,
+            and_(
+                BookingTimeSlot.room_id == Room.id,
+                BookingTimeSlot.overlaps(requested.c.checkin, requested.c.checkout)
+            )
+        )
+        .group_by(requested.c.idx)
+    )
+    result = await db.execute(stmt)
+
+    for row in result.all():
+        counts[unique_keys[row.idx]] = {
+            "total_rooms": row.total_rooms,
+            "booked_rooms": row.booked_rooms,
+            "available_rooms": row.total_rooms - row.booked_rooms
+        }
+
+    return counts
+
+
+async def get_available_rooms(
+    db: AsyncSession,
+    room_type_ids: Iterable[int],
+    checkin: datetime,
+    checkout: datetime
+) -> dict[int, int]:
+    """Số phòng trống theo room_type_id cho cùng một khoảng checkin/checkout"""
+    counts = await get_availability_counts(
+        db, [(room_type_id, checkin, checkout) for room_type_id in room_type_ids]
+    )
+    return {key[0]: value["available_rooms"] for key, value in counts.items()}
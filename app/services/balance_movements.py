@@ -0,0 +1,108 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import select, union_all, literal, null, tuple_, Integer, String
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.invoice import Invoice
+from app.models.withdraw import Withdraw
+
+MOVEMENT_TYPES = ("REVENUE", "WITHDRAW")
+
+
+def encode_cursor(time: datetime, movement_type: str, movement_id: int) -> str:
+    raw = json.dumps([time.isoformat(), movement_type, movement_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, str, int]:
+    try:
+        time, movement_type, movement_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(movement_id, int) or movement_type not in MOVEMENT_TYPES:
+            raise ValueError
+        return datetime.fromisoformat(time), movement_type, movement_id
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor không hợp lệ")
+
+
+def _branch(movement_type: str, partner_id: int, after: Optional[tuple[datetime, str, int]]):
+    """SELECT khoản thu (invoice) hoặc rút tiền (withdraw) của partner, sau cursor nếu có"""
+    if movement_type == "REVENUE":
+        id_column, time_column = Invoice.id, Invoice.finished_time
+        query = select(
+            Invoice.id.label("id"),
+            Invoice.booking_detail_id.label("booking_detail_id"),
+            Invoice.cost.label("amount"),
+            Invoice.finished_time.label("time"),
+            literal(movement_type).label("type"),
+            null().cast(String).label("status")
+        ).where(Invoice.partner_id == partner_id)
+    else:
+        id_column, time_column = Withdraw.id, Withdraw.created_at
+        query = select(
+            Withdraw.id.label("id"),
+            null().cast(Integer).label("booking_detail_id"),
+            Withdraw.transaction_amount.label("amount"),
+            Withdraw.created_at.label("time"),
+            literal(movement_type).label("type"),
+            Withdraw.status.label("status")
+        ).where(Withdraw.partner_id == partner_id)
+
+    # Khoản không có thời điểm (invoice từ POST /payment cũ) không xếp được theo thời gian
+    query = query.where(time_column.isnot(None))
+
+    if after is not None:
+        # Thứ tự là (time, type, id) giảm dần, type là hằng số trong mỗi nhánh.
+        # Điều kiện time <= ... giúp dùng index (partner_id, time) kể cả khi có so sánh tuple
+        after_time, after_type, after_id = after
+        if movement_type < after_type:
+            query = query.where(time_column <= after_time)
+        elif movement_type > after_type:
+            query = query.where(time_column < after_time)
+        else:
+            query = query.where(time_column <= after_time, tuple_(time_column, id_column) < (after_time, after_id))
+
+    return query.order_by(time_column.desc(), id_column.desc())
+
+
+async def list_movements(
+    db: AsyncSession,
+    partner_id: int,
+    limit: int,
+    movement_type: Optional[str] = None,
+    cursor: Optional[str] = None
+) -> tuple[list[dict], Optional[str]]:
+    """Một trang biến động số dư (thu và rút) mới nhất trước, và cursor cho trang sau (None nếu hết)"""
+    after = decode_cursor(cursor) if cursor else None
+    types = [t for t in MOVEMENT_TYPES if movement_type is None or movement_type == t]
+    if not types:
+        return [], None
+
+    movements = union_all(*[
+        select(_branch(t, partner_id, after).limit(limit + 1).subquery())
+        for t in types
+    ]).subquery("movements")
+
+    rows = (await db.execute(
+        select(movements)
+        .order_by(movements.c.time.desc(), movements.c.type.desc(), movements.c.id.desc())
+        .limit(limit + 1)
+    )).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].time, rows[-1].type, rows[-1].id)
+
+    items = []
+    for row in rows:
+        if row.type == "REVENUE":
+            items.append({"invoice_id": row.id, "booking_detail_id": row.booking_detail_id,
+                          "amount": float(row.amount or 0), "time": row.time, "type": row.type})
+        else:
+            items.append({"id": row.id, "amount": float(row.amount or 0), "time": row.time,
+                          "status": row.status, "type": row.type})
+    return items, next_cursor
@@ -1,11 +1,26 @@
+import asyncio
+import os
+from collections import defaultdict
+from datetime import datetime
+from typing import NamedTuple, Optional
+
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, func, delete
+from sqlalchemy import select, delete, insert, exists, values, column, true, DateTime, Integer
+from sqlalchemy.exc import IntegrityError
 from fastapi import HTTPException
 
 from app.models.booking_timeslot import BookingTimeSlot
 from app.models.booking_detail import BookingDetail
 from app.models.room import Room
 from app.models.offer import Offer
+from app.services import availability_index
+from app.services.availability_service import get_availability_counts, apply_timeslot_delta
+
+# Config
+ALLOCATION_MAX_ATTEMPTS = int(os.getenv("ALLOCATION_MAX_ATTEMPTS", "3"))
+ALLOCATION_RETRY_DELAY_SECONDS = float(os.getenv("ALLOCATION_RETRY_DELAY_SECONDS", "0.05"))
+# SQLSTATE exclusion_violation
+EXCLUSION_VIOLATION = "23P01"
 
 
 async def check_room_availability(
@@ -26,36 +41,17 @@ async def check_room_availability(
     if not offer:
         raise HTTPException(status_code=404, detail="Offer không tồn tại")
     
-    room_type_id = offer.room_type_id
-
-    # Đếm tổng số phòng của room_type này
-    total_rooms_result = await db.execute(
-        select(func.count(Room.id)).where(Room.room_type_id == room_type_id)
-    )
-    total_rooms = total_rooms_result.scalar() or 0
-
-    # Đếm số phòng đã bị book trong khoảng thời gian này
-    booked_rooms_result = await db.execute(
-        select(func.count(BookingTimeSlot.room_id.distinct()))
-        .select_from(BookingTimeSlot)
-        .join(Room, Room.id == BookingTimeSlot.room_id)
-        .where(
-            and_(
-                Room.room_type_id == room_type_id,
-                BookingTimeSlot.started_time < finished_at,
-                BookingTimeSlot.finished_time > started_at
-            )
-        )
-    )
-    booked_rooms = booked_rooms_result.scalar() or 0
-
-    available_rooms = total_rooms - booked_rooms
+    # Trả lời từ index trong bộ nhớ nếu được bật và còn mới, ngược lại đếm bằng SQL trên
+    # booking_timeslot (không dùng bộ đếm theo đêm, chỉ là ước lượng)
+    availability = availability_index.get_counts(offer.room_type_id, started_at, finished_at)
+    if availability is None:
+        key = (offer.room_type_id, started_at, finished_at)
+        counts = await get_availability_counts(db, [key], exact=True)
+        availability = counts[key]
 
     return {
-        "total_rooms": total_rooms,
-        "booked_rooms": booked_rooms,
-        "available_rooms": available_rooms,
-        "is_available": available_rooms >= number_of_rooms
+        **availability,
+        "is_available": availability["available_rooms"] >= number_of_rooms
     }
 
 
@@ -82,57 +78,188 @@ async def validate_room_availability(
     return availability
 
 
-async def create_booking_timeslots(db: AsyncSession, booking_detail: BookingDetail, invoice_id: int = None):
+class TimeslotRequest(NamedTuple):
+    """Yêu cầu giữ number_of_rooms phòng của room_type_id trong [started_at, finished_at)"""
+    room_type_id: int
+    number_of_rooms: int
+    started_at: datetime
+    finished_at: datetime
+    invoice_id: Optional[int] = None
+
+
+class RoomAllocationError(HTTPException):
+    """Không giữ được đủ phòng sau ALLOCATION_MAX_ATTEMPTS lần thử"""
+
+
+class _AllocationShortfall(Exception):
+    """Không giữ đủ phòng trong một lần thử, dùng để rollback savepoint"""
+
+    def __init__(self, request: TimeslotRequest, allocated: int):
+        self.request = request
+        self.allocated = allocated
+
+
+def _candidate_rooms_stmt(requests: list[TimeslotRequest]):
     """
-    Tạo BookingTimeSlot cho các phòng được book.
-    Chọn các phòng trống trong khoảng thời gian booking và đánh dấu là bận.
+    Một câu SELECT lấy phòng trống cho mọi yêu cầu: VALUES các yêu cầu JOIN LATERAL phòng trống.
+    Không khóa dòng room: khóa cả phòng làm thanh toán đồng thời khác ngày bỏ qua phòng của nhau
+    và báo thiếu phòng giả. Hai transaction chọn trùng phòng trùng ngày thì exclusion constraint
+    ex_booking_timeslot_room_period chặn bên sau (23P01) và allocate_timeslots thử lại.
+    Mỗi yêu cầu lấy tối đa tổng số phòng cần của room_type đó, đủ để chia khi nhiều yêu cầu
+    trong cùng lần trùng room_type và trùng ngày.
     """
-    room_type_id = booking_detail.offer.room_type_id
-    number_of_rooms = booking_detail.number_of_rooms
-    started_at = booking_detail.started_at
-    finished_at = booking_detail.finished_at
-
-    # Lấy danh sách room_id đã bị book trong khoảng thời gian này
-    booked_rooms_subq = (
-        select(BookingTimeSlot.room_id)
+    wanted_by_type = defaultdict(int)
+    for req in requests:
+        wanted_by_type[req.room_type_id] += req.number_of_rooms
+
+    requested = values(
+        column("idx", Integer),
+        column("room_type_id", Integer),
+        column("checkin", DateTime),
+        column("checkout", DateTime),
+        column("wanted", Integer),
+        name="requested"
+    ).data([
+        (idx, req.room_type_id, req.started_at, req.finished_at, wanted_by_type[req.room_type_id])
+        for idx, req in enumerate(requests)
+    ])
+
+    free_rooms = (
+        select(Room.id)
         .where(
-            and_(
-                BookingTimeSlot.started_time < finished_at,
-                BookingTimeSlot.finished_time > started_at
+            Room.room_type_id == requested.c.room_type_id,
+            ~exists()
+            .where(
+                BookingTimeSlot.room_id == Room.id,
+                BookingTimeSlot.overlaps(requested.c.checkin, requested.c.checkout)
             )
+            .correlate_except(BookingTimeSlot)
         )
+        .order_by(Room.id)
+        .limit(requested.c.wanted)
+        .lateral("free_rooms")
     )
 
-    # Lấy các phòng trống thuộc room_type này
-    available_rooms_result = await db.execute(
-        select(Room)
-        .where(
-            Room.room_type_id == room_type_id,
-            Room.id.notin_(booked_rooms_subq)
-        )
-        .limit(number_of_rooms)
+    return (
+        select(requested.c.idx, free_rooms.c.id)
+        .select_from(requested)
+        .join(free_rooms, true())
     )
-    available_rooms = available_rooms_result.scalars().all()
 
-    if len(available_rooms) < number_of_rooms:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Không đủ phòng trống. Cần {number_of_rooms} phòng, chỉ còn {len(available_rooms)} phòng."
-        )
 
-    # Tạo BookingTimeSlot cho từng phòng
-    created_timeslots = []
-    for room in available_rooms:
-        timeslot = BookingTimeSlot(
-            room_id=room.id,
-            started_time=started_at,
-            finished_time=finished_at,
-            invoice_id=invoice_id
-        )
-        db.add(timeslot)
-        created_timeslots.append(timeslot)
+def _assign_rooms(requests: list[TimeslotRequest], candidates: dict[int, list[int]]) -> list[list[int]]:
+    """Chia phòng ứng viên cho từng yêu cầu, một phòng không được dùng cho hai yêu cầu trùng ngày"""
+    taken = defaultdict(list)  # room_id -> [(started_at, finished_at)]
+    assigned = []
+
+    for idx, req in enumerate(requests):
+        room_ids = []
+        for room_id in candidates.get(idx, []):
+            if any(s < req.finished_at and req.started_at < f for s, f in taken[room_id]):
+                continue
+            room_ids.append(room_id)
+            taken[room_id].append((req.started_at, req.finished_at))
+            if len(room_ids) == req.number_of_rooms:
+                break
 
-    return created_timeslots
+        if len(room_ids) < req.number_of_rooms:
+            raise _AllocationShortfall(req, len(room_ids))
+        assigned.append(room_ids)
+
+    return assigned
+
+
+async def allocate_timeslots(db: AsyncSession, requests: list[TimeslotRequest]) -> list[list[int]]:
+    """
+    Giữ phòng cho nhiều yêu cầu cùng lúc, trả về danh sách room_id theo thứ tự yêu cầu.
+    Số round trip không phụ thuộc số yêu cầu: một SELECT phòng ứng viên, một INSERT nhiều dòng.
+
+    Mỗi lần thử chạy trong một savepoint. Nếu vi phạm ex_booking_timeslot_room_period
+    (transaction khác vừa giữ cùng phòng cùng ngày) thì rollback savepoint và thử lại, câu SELECT
+    lần sau thấy timeslot đã commit nên chọn phòng khác. Hết số lần thử thì raise RoomAllocationError.
+    """
+    requests = [req for req in requests if req.number_of_rooms > 0]
+    if not requests:
+        return []
+    for req in requests:
+        if req.finished_at <= req.started_at:
+            raise HTTPException(status_code=400, detail="Thời gian kết thúc phải sau thời gian bắt đầu")
+
+    stmt = _candidate_rooms_stmt(requests)
+    shortfall = None
+
+    for attempt in range(ALLOCATION_MAX_ATTEMPTS):
+        try:
+            async with db.begin_nested():
+                candidates = defaultdict(list)
+                for idx, room_id in (await db.execute(stmt)).all():
+                    candidates[idx].append(room_id)
+
+                assigned = _assign_rooms(requests, candidates)
+                await db.execute(insert(BookingTimeSlot), [
+                    {
+                        "room_id": room_id,
+                        "started_time": req.started_at,
+                        "finished_time": req.finished_at,
+                        "invoice_id": req.invoice_id
+                    }
+                    for req, room_ids in zip(requests, assigned)
+                    for room_id in room_ids
+                ])
+                await apply_timeslot_delta(db, [
+                    (req.room_type_id, req.started_at, req.finished_at)
+                    for req, room_ids in zip(requests, assigned)
+                    for _ in room_ids
+                ], 1)
+            return assigned
+        except _AllocationShortfall as e:
+            # Câu SELECT không khóa và thấy mọi timeslot đã commit: thiếu phòng là thiếu thật, thử lại vô ích
+            shortfall = e
+            break
+        except IntegrityError as e:
+            if getattr(e.orig, "pgcode", None) != EXCLUSION_VIOLATION:
+                raise
+            print(f"[BOOKING_TIMESLOT] Overlap on attempt {attempt + 1}, retrying")
+
+        await asyncio.sleep(ALLOCATION_RETRY_DELAY_SECONDS * (attempt + 1))
+
+    if shortfall is None:
+        raise RoomAllocationError(status_code=409, detail="Phòng vừa được đặt bởi giao dịch khác, vui lòng thử lại")
+    raise RoomAllocationError(
+        status_code=400,
+        detail=f"Không đủ phòng trống. Cần {shortfall.request.number_of_rooms} phòng, chỉ còn {shortfall.allocated} phòng."
+    )
+
+
+async def create_booking_timeslots(db: AsyncSession, booking_detail: BookingDetail, invoice_id: int = None):
+    """
+    Tạo BookingTimeSlot cho các phòng được book.
+    Chọn các phòng trống trong khoảng thời gian booking và đánh dấu là bận.
+    Trả về danh sách room_id đã được giữ.
+    """
+    assigned = await allocate_timeslots(db, [TimeslotRequest(
+        room_type_id=booking_detail.offer.room_type_id,
+        number_of_rooms=booking_detail.number_of_rooms,
+        started_at=booking_detail.started_at,
+        finished_at=booking_detail.finished_at,
+        invoice_id=invoice_id
+    )])
+    return assigned[0] if assigned else []
+
+
+async def _delete_timeslots(db: AsyncSession, *criteria):
+    """Xóa timeslot theo điều kiện và trừ bộ đếm theo đêm của các phòng vừa được giải phóng"""
+    deleted = (
+        delete(BookingTimeSlot)
+        .where(*criteria)
+        .returning(BookingTimeSlot.room_id, BookingTimeSlot.started_time, BookingTimeSlot.finished_time)
+        .cte("deleted")
+    )
+    result = await db.execute(
+        select(Room.room_type_id, deleted.c.started_time, deleted.c.finished_time)
+        .join(Room, Room.id == deleted.c.room_id)
+    )
+    await apply_timeslot_delta(db, result.all(), -1)
 
 
 async def delete_booking_timeslots_by_invoice(db: AsyncSession, invoice_id: int):
@@ -140,9 +267,7 @@ async def delete_booking_timeslots_by_invoice(db: AsyncSession, invoice_id: int)
     Xóa tất cả BookingTimeSlot theo invoice_id khi hủy booking.
     Giải phóng phòng để người khác có thể đặt.
     """
-    await db.execute(
-        delete(BookingTimeSlot).where(BookingTimeSlot.invoice_id == invoice_id)
-    )
+    await _delete_timeslots(db, BookingTimeSlot.invoice_id == invoice_id)
 
 
 async def delete_booking_timeslots_by_booking_detail(db: AsyncSession, booking_detail_id: int):
@@ -151,14 +276,10 @@ async def delete_booking_timeslots_by_booking_detail(db: AsyncSession, booking_d
     Giải phóng phòng để người khác có thể đặt.
     """
     from app.models.invoice import Invoice
-    
-    # Lấy tất cả invoice_ids của booking_detail này
-    invoice_result = await db.execute(
-        select(Invoice.id).filter(Invoice.booking_detail_id == booking_detail_id)
-    )
-    invoice_ids = [row[0] for row in invoice_result.fetchall()]
-    
-    if invoice_ids:
-        await db.execute(
-            delete(BookingTimeSlot).where(BookingTimeSlot.invoice_id.in_(invoice_ids))
+
+    await _delete_timeslots(
+        db,
+        BookingTimeSlot.invoice_id.in_(
+            select(Invoice.id).where(Invoice.booking_detail_id == booking_detail_id)
         )
+    )
@@ -0,0 +1,285 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+from typing import Awaitable, Callable, Iterable, Optional
+
+from redis.exceptions import RedisError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import async_redis_client
+from app.models.offer import Offer
+from app.models.resort import Resort
+from app.models.resort_images import ResortImage
+from app.models.room_images import RoomImage
+from app.models.room_type import RoomType
+from app.models.service import Service
+
+# Config
+CATALOG_CACHE_TTL_SECONDS = int(os.getenv("CATALOG_CACHE_TTL_SECONDS", "3600"))
+# Thời gian giữ khóa nạp lại một key khi cache miss, và thời gian các request khác chờ khóa đó
+CATALOG_LOCK_TTL_MS = int(os.getenv("CATALOG_LOCK_TTL_MS", "5000"))
+CATALOG_LOCK_WAIT_MS = int(os.getenv("CATALOG_LOCK_WAIT_MS", "300"))
+
+# Đổi khi thay đổi cấu trúc dữ liệu cache để không đọc nhầm dữ liệu cũ sau khi deploy
+CATALOG_SCHEMA = "v1"
+
+# Xóa khóa chỉ khi vẫn là khóa của mình
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+Loader = Callable[[AsyncSession, list[int]], Awaitable[dict[int, dict]]]
+
+# Key đang được nạp trong process này -> future trả về giá trị (None nếu không có trong database)
+_inflight: dict[str, asyncio.Future] = {}
+_MISS = object()
+
+
+def _version_key(kind: str, entity_id: int) -> str:
+    return f"catalog:ver:{kind}:{entity_id}"
+
+
+def _value_key(kind: str, entity_id: int, version: int) -> str:
+    return f"catalog:{CATALOG_SCHEMA}:{kind}:{entity_id}:{version}"
+
+
+async def _load_resorts(db: AsyncSession, ids: list[int]) -> dict[int, dict]:
+    """Thông tin resort, toàn bộ ảnh, services và các loại phòng (không gồm số phòng trống)"""
+    resorts = {
+        r.id: {
+            "id": r.id,
+            "name": r.name,
+            "address": r.address,
+            "rating": r.rating,
+            "images": [],
+            "services": [],
+            "room_types": [],
+        }
+        for r in (await db.execute(
+            select(Resort.id, Resort.name, Resort.address, Resort.rating).where(Resort.id.in_(ids))
+        )).all()
+    }
+    if not resorts:
+        return {}
+
+    for resort_id, url in (await db.execute(
+        select(ResortImage.resort_id, ResortImage.url)
+        .where(ResortImage.resort_id.in_(resorts))
+        .order_by(ResortImage.id)
+    )).all():
+        resorts[resort_id]["images"].append(url)
+
+    for resort_id, name in (await db.execute(
+        select(Service.resort_id, Service.name)
+        .where(Service.resort_id.in_(resorts))
+        .order_by(Service.id)
+    )).all():
+        resorts[resort_id]["services"].append(name)
+
+    for rt in (await db.execute(
+        select(
+            RoomType.id,
+            RoomType.resort_id,
+            RoomType.name,
+            RoomType.area,
+            RoomType.bed_amount,
+            RoomType.people_amount,
+            RoomType.price
+        )
+        .where(RoomType.resort_id.in_(resorts))
+        .order_by(RoomType.id)
+    )).all():
+        resorts[rt.resort_id]["room_types"].append({
+            "id": rt.id,
+            "name": rt.name,
+            "area": float(rt.area),
+            "bed_amount": rt.bed_amount,
+            "people_amount": rt.people_amount,
+            "price": float(rt.price),
+        })
+
+    return resorts
+
+
+async def _load_room_types(db: AsyncSession, ids: list[int]) -> dict[int, dict]:
+    """Thông tin loại phòng kèm offers và ảnh chưa bị xóa"""
+    room_types = {
+        rt.id: {
+            "id": rt.id,
+            "resort_id": rt.resort_id,
+            "name": rt.name,
+            "area": float(rt.area),
+            "people_amount": rt.people_amount,
+            "price": float(rt.price),
+            "offers": [],
+            "images": [],
+        }
+        for rt in (await db.execute(
+            select(
+                RoomType.id,
+                RoomType.resort_id,
+                RoomType.name,
+                RoomType.area,
+                RoomType.people_amount,
+                RoomType.price
+            ).where(RoomType.id.in_(ids))
+        )).all()
+    }
+    if not room_types:
+        return {}
+
+    for offer in (await db.execute(
+        select(Offer.id, Offer.room_type_id, Offer.cost)
+        .where(Offer.room_type_id.in_(room_types))
+        .order_by(Offer.id)
+    )).all():
+        room_types[offer.room_type_id]["offers"].append({"id": offer.id, "cost": float(offer.cost)})
+
+    for room_type_id, url in (await db.execute(
+        select(RoomImage.room_type_id, RoomImage.url)
+        .where(RoomImage.room_type_id.in_(room_types), RoomImage.is_deleted == False)
+        .order_by(RoomImage.id)
+    )).all():
+        room_types[room_type_id]["images"].append(url)
+
+    return room_types
+
+
+async def _wait_for_keys(keys: dict[int, str]) -> dict[int, dict]:
+    """Chờ process khác nạp xong các key đang bị khóa, trả về những key đã có giá trị"""
+    found: dict[int, dict] = {}
+    deadline = time.monotonic() + CATALOG_LOCK_WAIT_MS / 1000
+    pending = dict(keys)
+    while pending and time.monotonic() < deadline:
+        await asyncio.sleep(0.02)
+        ids = list(pending)
+        for entity_id, raw in zip(ids, await async_redis_client.mget([pending[i] for i in ids])):
+            if raw is not None:
+                found[entity_id] = json.loads(raw)
+                pending.pop(entity_id)
+    return found
+
+
+async def _fill(db: AsyncSession, kind: str, loader: Loader, keys: dict[int, str]) -> dict[int, Optional[dict]]:
+    """
+    Nạp các key bị miss. Mỗi key chỉ có một request nạp từ database tại một thời điểm:
+    trong process dùng future chung, giữa các process dùng khóa Redis SET NX.
+    Request không lấy được khóa chờ tối đa CATALOG_LOCK_WAIT_MS rồi tự đọc database (không ghi cache).
+    """
+    loop = asyncio.get_running_loop()
+    waiting: dict[int, asyncio.Future] = {}
+    owned: dict[int, asyncio.Future] = {}
+    for entity_id, key in keys.items():
+        if key in _inflight:
+            waiting[entity_id] = _inflight[key]
+        else:
+            owned[entity_id] = _inflight[key] = loop.create_future()
+
+    values: dict[int, Optional[dict]] = {}
+    try:
+        if owned:
+            token = uuid.uuid4().hex
+            ids = list(owned)
+            async with async_redis_client.pipeline(transaction=False) as pipe:
+                for entity_id in ids:
+                    pipe.set(f"{keys[entity_id]}:lock", token, nx=True, px=CATALOG_LOCK_TTL_MS)
+                acquired = await pipe.execute()
+
+            locked = [entity_id for entity_id, ok in zip(ids, acquired) if ok]
+            contended = [entity_id for entity_id, ok in zip(ids, acquired) if not ok]
+
+            if contended:
+                values.update(await _wait_for_keys({i: keys[i] for i in contended}))
+
+            to_load = locked + [i for i in contended if i not in values]
+            if to_load:
+                loaded = await loader(db, to_load)
+                for entity_id in to_load:
+                    values[entity_id] = loaded.get(entity_id)
+
+            if locked:
+                async with async_redis_client.pipeline(transaction=False) as pipe:
+                    for entity_id in locked:
+                        if values[entity_id] is not None:
+                            pipe.set(keys[entity_id], json.dumps(values[entity_id]), ex=CATALOG_CACHE_TTL_SECONDS)
+                        pipe.eval(_RELEASE_SCRIPT, 1, f"{keys[entity_id]}:lock", token)
+                    await pipe.execute()
+    finally:
+        for entity_id, future in owned.items():
+            _inflight.pop(keys[entity_id], None)
+            if not future.done():
+                # Lỗi giữa chừng: request đang chờ tự đọc database
+                future.set_result(values.get(entity_id, _MISS))
+
+    for entity_id, future in waiting.items():
+        value = await future
+        if value is _MISS:
+            value = (await loader(db, [entity_id])).get(entity_id)
+        values[entity_id] = value
+    return values
+
+
+async def _get_many(db: AsyncSession, kind: str, loader: Loader, ids: Iterable[int]) -> dict[int, dict]:
+    """Đọc nhiều entity theo id qua cache. Id không tồn tại trong database không có trong kết quả."""
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        return {}
+
+    try:
+        versions = await async_redis_client.mget([_version_key(kind, i) for i in ids])
+        keys = {i: _value_key(kind, i, int(v or 0)) for i, v in zip(ids, versions)}
+        cached = await async_redis_client.mget(list(keys.values()))
+
+        values = {i: json.loads(raw) for i, raw in zip(ids, cached) if raw is not None}
+        missing = {i: keys[i] for i in ids if i not in values}
+        if missing:
+            values.update(await _fill(db, kind, loader, missing))
+    except RedisError as e:
+        print(f"[CATALOG_CACHE] Redis error, reading {kind} from database: {e}")
+        values = await loader(db, ids)
+
+    return {i: values[i] for i in ids if values.get(i) is not None}
+
+
+async def get_resort(db: AsyncSession, resort_id: int) -> Optional[dict]:
+    return (await _get_many(db, "resort", _load_resorts, [resort_id])).get(resort_id)
+
+
+async def get_resorts(db: AsyncSession, resort_ids: Iterable[int]) -> dict[int, dict]:
+    return await _get_many(db, "resort", _load_resorts, resort_ids)
+
+
+async def get_room_types(db: AsyncSession, room_type_ids: Iterable[int]) -> dict[int, dict]:
+    return await _get_many(db, "room_type", _load_room_types, room_type_ids)
+
+
+async def _bump(kind: str, ids: Iterable[int]):
+    """
+    Tăng version: request sau đọc key mới, key cũ tự hết hạn theo TTL.
+    Request đang nạp dở với version cũ chỉ ghi vào key cũ nên không ghi đè dữ liệu mới.
+    Gọi SAU khi commit để request đọc version mới chắc chắn thấy dữ liệu đã thay đổi.
+    """
+    ids = set(ids)
+    if not ids:
+        return
+    try:
+        async with async_redis_client.pipeline(transaction=False) as pipe:
+            for entity_id in ids:
+                pipe.incr(_version_key(kind, entity_id))
+            await pipe.execute()
+    except RedisError as e:
+        print(f"[CATALOG_CACHE] Redis error on invalidate {kind} {sorted(ids)}: {e}")
+
+
+async def invalidate_resorts(resort_ids: Iterable[int]):
+    await _bump("resort", resort_ids)
+
+
+async def invalidate_room_types(room_type_ids: Iterable[int]):
+    await _bump("room_type", room_type_ids)
@@ -1,53 +1,41 @@
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail, Email, To, Content
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache
 import os
-import asyncio
-from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Optional
+from typing import Iterable, Optional
+
+from app.services import mail_delivery
 
 # Config từ environment variables
-SENDGRID_API_KEY = os.getenv("SENDGRID_API_KEY", "")
-SENDER_EMAIL = os.getenv("SENDER_EMAIL", "noreply@yourapp.com")
-SENDER_NAME = os.getenv("SENDER_NAME", "Resort Booking")
-
-executor = ThreadPoolExecutor(max_workers=3)
-
-
-def _send_email_sync(to_email: str, subject: str, html_content: str):
-    """Gửi email đồng bộ qua SendGrid (chạy trong thread pool)"""
-    print(f"[EMAIL] Sending email to: {to_email}, subject: {subject}")
-    
-    message = Mail(
-        from_email=Email(SENDER_EMAIL, SENDER_NAME),
-        to_emails=To(to_email),
-        subject=subject,
-        html_content=Content("text/html", html_content)
-    )
-    
-    sg = SendGridAPIClient(SENDGRID_API_KEY)
-    response = sg.send(message)
-    
-    print(f"[EMAIL] SendGrid response: {response.status_code}")
-    
-    if response.status_code not in [200, 201, 202]:
-        raise Exception(f"SendGrid error: {response.status_code} - {response.body}")
-    
-    return response
+# development: template được đọc lại khi file thay đổi; môi trường khác chỉ compile một lần
+APP_ENV = os.getenv("APP_ENV", "production")
+# Thư mục lưu bytecode của template đã compile, mặc định là thư mục tạm của hệ thống
+EMAIL_TEMPLATE_CACHE_DIR = os.getenv("EMAIL_TEMPLATE_CACHE_DIR") or None
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), "..", "templates", "emails")
+INVOICE_TEMPLATE = "booking_invoice.html"
+TIME_FORMAT = "%d/%m/%Y %H:%M"
+
+# Một Environment cho cả process: template compile một lần rồi nằm trong cache của Environment,
+# bytecode được lưu xuống đĩa nên process mới (worker, job) không phải parse lại
+_env = Environment(
+    loader=FileSystemLoader(TEMPLATE_DIR),
+    bytecode_cache=FileSystemBytecodeCache(EMAIL_TEMPLATE_CACHE_DIR),
+    auto_reload=APP_ENV == "development",
+    cache_size=50
+)
+
+
+def load_templates():
+    """Compile sẵn template email, gọi lúc startup để email đầu tiên không phải chờ"""
+    _env.get_template(INVOICE_TEMPLATE)
 
 
 async def send_email(to_email: str, subject: str, html_content: str):
-    """Gửi email bất đồng bộ qua SendGrid"""
-    loop = asyncio.get_event_loop()
-    await loop.run_in_executor(
-        executor, 
-        _send_email_sync, 
-        to_email, subject, html_content
-    )
+    """Gửi email qua mail_delivery (client dùng chung, gom batch, giới hạn tốc độ)"""
+    await mail_delivery.send(to_email, subject, html_content)
 
 
-async def send_booking_confirmation_email(
+def build_invoice_context(
     customer_email: str,
     customer_name: str,
     customer_phone: Optional[str],
@@ -57,33 +45,27 @@ async def send_booking_confirmation_email(
     total_cost: float,
     payment_method: str = "ZALOPAY",
     payment_time: Optional[datetime] = None
-):
-    """
-    Gửi email xác nhận đặt phòng thành công kèm hóa đơn
-    """
-    template_dir = os.path.join(os.path.dirname(__file__), "..", "templates", "emails")
-    env = Environment(loader=FileSystemLoader(template_dir))
-    template = env.get_template("booking_invoice.html")
-    
+) -> dict:
+    """Chuẩn bị dữ liệu cho template hóa đơn từ booking detail (đã load offer.room_type.resort) và invoice"""
     # Chuẩn bị data chi tiết đặt phòng
     details_data = []
     for detail in booking_details:
         nights = (detail.finished_at - detail.started_at).days
         if nights < 1:
             nights = 1
-        
+
         details_data.append({
             "resort_name": detail.offer.room_type.resort.name,
             "resort_address": detail.offer.room_type.resort.address or "",
             "room_type": detail.offer.room_type.name,
             "number_of_rooms": detail.number_of_rooms,
             "nights": nights,
-            "check_in": detail.started_at.strftime("%d/%m/%Y %H:%M"),
-            "check_out": detail.finished_at.strftime("%d/%m/%Y %H:%M"),
+            "check_in": detail.started_at.strftime(TIME_FORMAT),
+            "check_out": detail.finished_at.strftime(TIME_FORMAT),
             "unit_price": float(detail.offer.cost or 0),
             "cost": float(detail.cost or 0)
         })
-    
+
     # Chuẩn bị data hóa đơn
     invoices_data = []
     for inv in invoices:
@@ -91,24 +73,68 @@ async def send_booking_confirmation_email(
             "invoice_id": inv.id,
             "cost": float(inv.cost or 0),
             "payment_method": inv.payment_method,
-            "finished_time": inv.finished_time.strftime("%d/%m/%Y %H:%M") if inv.finished_time else ""
+            "finished_time": inv.finished_time.strftime(TIME_FORMAT) if inv.finished_time else ""
         })
-    
-    html_content = template.render(
-        customer_name=customer_name or "Quý khách",
+
+    return {
+        "customer_name": customer_name or "Quý khách",
+        "customer_email": customer_email,
+        "customer_phone": customer_phone or "",
+        "booking_id": booking_id,
+        "booking_details": details_data,
+        "invoices": invoices_data,
+        "total_cost": total_cost,
+        "payment_method": payment_method,
+        "payment_time": (payment_time or datetime.now()).strftime(TIME_FORMAT),
+    }
+
+
+def render_booking_invoice(context: dict) -> str:
+    return render_booking_invoices([context])[0]
+
+
+def render_booking_invoices(contexts: Iterable[dict]) -> list[str]:
+    """
+    Render nhiều hóa đơn trong một lần, dùng cho job gửi lại email và backfill.
+    Template chỉ được lấy một lần cho cả lô.
+    """
+    template = _env.get_template(INVOICE_TEMPLATE)
+    current_year = datetime.now().year
+    return [template.render(context, current_year=current_year) for context in contexts]
+
+
+def invoice_subject(booking_id: int) -> str:
+    return f"[Hóa đơn] Xác nhận đặt phòng #{booking_id} thành công"
+
+
+async def send_booking_confirmation_email(
+    customer_email: str,
+    customer_name: str,
+    customer_phone: Optional[str],
+    booking_id: int,
+    booking_details: list,
+    invoices: list,
+    total_cost: float,
+    payment_method: str = "ZALOPAY",
+    payment_time: Optional[datetime] = None
+):
+    """
+    Gửi email xác nhận đặt phòng thành công kèm hóa đơn
+    """
+    html_content = render_booking_invoice(build_invoice_context(
         customer_email=customer_email,
-        customer_phone=customer_phone or "",
+        customer_name=customer_name,
+        customer_phone=customer_phone,
         booking_id=booking_id,
-        booking_details=details_data,
-        invoices=invoices_data,
+        booking_details=booking_details,
+        invoices=invoices,
         total_cost=total_cost,
         payment_method=payment_method,
-        payment_time=payment_time.strftime("%d/%m/%Y %H:%M") if payment_time else datetime.now().strftime("%d/%m/%Y %H:%M"),
-        current_year=datetime.now().year
-    )
-    
+        payment_time=payment_time
+    ))
+
     await send_email(
         to_email=customer_email,
-        subject=f"[Hóa đơn] Xác nhận đặt phòng #{booking_id} thành công",
+        subject=invoice_subject(booking_id),
         html_content=html_content
     )
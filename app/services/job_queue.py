@@ -0,0 +1,208 @@
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+from datetime import datetime
+from typing import Awaitable, Callable
+
+from redis.exceptions import RedisError
+
+from app.database import async_redis_client
+
+# Config
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_BACKOFF_BASE_SECONDS = float(os.getenv("JOB_BACKOFF_BASE_SECONDS", "5"))
+JOB_BACKOFF_MAX_SECONDS = float(os.getenv("JOB_BACKOFF_MAX_SECONDS", "600"))
+JOB_WORKER_CONCURRENCY = int(os.getenv("JOB_WORKER_CONCURRENCY", "4"))
+
+READY_KEY = "jobs:ready"            # list - job chờ chạy (LPUSH vào, BLMOVE ra ở đầu còn lại)
+PROCESSING_KEY = "jobs:processing"  # list - job đang được worker xử lý
+DELAYED_KEY = "jobs:delayed"        # sorted set - job chờ retry, score = thời điểm được chạy lại
+DEAD_KEY = "jobs:dead"              # list - job đã hết số lần thử
+
+# Chuyển các job tới hạn từ DELAYED sang READY trong một bước
+_PROMOTE_SCRIPT = """
+local jobs = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, 100)
+for _, job in ipairs(jobs) do
+    redis.call('ZREM', KEYS[1], job)
+    redis.call('LPUSH', KEYS[2], job)
+end
+return #jobs
+"""
+
+# Chuyển một job từ dead-letter về READY (ARGV[2] là bản đã đặt lại số lần thử) trong một bước:
+# không mất job nếu tiến trình chết giữa chừng, hai lệnh requeue đồng thời không đẩy trùng
+_REQUEUE_DEAD_SCRIPT = """
+if redis.call('LREM', KEYS[1], 1, ARGV[1]) == 1 then
+    redis.call('LPUSH', KEYS[2], ARGV[2])
+    return 1
+end
+return 0
+"""
+
+JobHandler = Callable[[dict], Awaitable[None]]
+_handlers: dict[str, JobHandler] = {}
+
+
+def job(name: str):
+    """
+    Đăng ký handler cho một loại job: @job("send_booking_confirmation").
+    Queue là at-least-once: job đã chạy xong vẫn có thể chạy lại (xóa khỏi PROCESSING lỗi,
+    requeue-processing, requeue-dead) nên handler phải idempotent.
+    """
+    def decorator(handler: JobHandler) -> JobHandler:
+        _handlers[name] = handler
+        return handler
+    return decorator
+
+
+def _new_job(name: str, payload: dict) -> str:
+    return json.dumps({
+        "id": uuid.uuid4().hex,
+        "name": name,
+        "payload": payload,
+        "attempts": 0,
+        "enqueued_at": datetime.utcnow().isoformat(),
+    })
+
+
+async def enqueue(name: str, payload: dict):
+    await async_redis_client.lpush(READY_KEY, _new_job(name, payload))
+
+
+async def enqueue_many(jobs: list[tuple[str, dict]]):
+    """Đưa nhiều job vào queue trong một round trip"""
+    if jobs:
+        await async_redis_client.lpush(READY_KEY, *[_new_job(name, payload) for name, payload in jobs])
+
+
+def backoff_seconds(attempts: int) -> float:
+    """Exponential backoff có jitter: base * 2^(attempts-1), tối đa JOB_BACKOFF_MAX_SECONDS"""
+    delay = min(JOB_BACKOFF_MAX_SECONDS, JOB_BACKOFF_BASE_SECONDS * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+async def _fail(raw: str, job_data: dict, error: Exception):
+    job_data["attempts"] += 1
+    job_data["last_error"] = f"{type(error).__name__}: {error}"
+
+    async with async_redis_client.pipeline(transaction=True) as pipe:
+        pipe.lrem(PROCESSING_KEY, 1, raw)
+        if job_data["attempts"] >= JOB_MAX_ATTEMPTS:
+            job_data["failed_at"] = datetime.utcnow().isoformat()
+            pipe.lpush(DEAD_KEY, json.dumps(job_data))
+            print(f"[JOBS] {job_data['name']} {job_data['id']} moved to dead-letter: {job_data['last_error']}")
+        else:
+            delay = backoff_seconds(job_data["attempts"])
+            pipe.zadd(DELAYED_KEY, {json.dumps(job_data): time.time() + delay})
+            print(f"[JOBS] {job_data['name']} {job_data['id']} failed (attempt {job_data['attempts']}), retry in {delay:.0f}s")
+        await pipe.execute()
+
+
+async def run_one(raw: str):
+    """Chạy một job đã được lấy vào PROCESSING, xóa khỏi PROCESSING khi xong"""
+    try:
+        job_data = json.loads(raw)
+    except json.JSONDecodeError:
+        async with async_redis_client.pipeline(transaction=True) as pipe:
+            pipe.lrem(PROCESSING_KEY, 1, raw)
+            pipe.lpush(DEAD_KEY, raw)
+            await pipe.execute()
+        return
+
+    handler = _handlers.get(job_data.get("name"))
+    try:
+        if handler is None:
+            raise LookupError(f"no handler registered for job {job_data.get('name')!r}")
+        await handler(job_data["payload"])
+    except Exception as e:
+        await _fail(raw, job_data, e)
+        return
+
+    # Lệnh này lỗi thì job nằm lại PROCESSING và có thể bị chạy lại bởi requeue-processing
+    await async_redis_client.lrem(PROCESSING_KEY, 1, raw)
+
+
+async def promote_delayed() -> int:
+    return await async_redis_client.eval(_PROMOTE_SCRIPT, 2, DELAYED_KEY, READY_KEY, time.time())
+
+
+async def _consume(stop: asyncio.Event):
+    while not stop.is_set():
+        try:
+            raw = await async_redis_client.blmove(READY_KEY, PROCESSING_KEY, 1, "RIGHT", "LEFT")
+            if raw is not None:
+                await run_one(raw)
+        except RedisError as e:
+            print(f"[JOBS] Redis error: {e}")
+            await asyncio.sleep(1)
+
+
+async def _promote_loop(stop: asyncio.Event):
+    while not stop.is_set():
+        try:
+            await promote_delayed()
+        except RedisError as e:
+            print(f"[JOBS] Redis error on promote: {e}")
+        await asyncio.sleep(1)
+
+
+async def run_worker(concurrency: int = JOB_WORKER_CONCURRENCY, stop: asyncio.Event = None):
+    """Chạy worker tới khi stop được set: `concurrency` consumer cùng một vòng lặp chuyển job retry tới hạn"""
+    stop = stop or asyncio.Event()
+    print(f"[JOBS] Worker started with concurrency={concurrency}, handlers={sorted(_handlers)}")
+    await asyncio.gather(
+        _promote_loop(stop),
+        *(_consume(stop) for _ in range(concurrency))
+    )
+
+
+async def stats() -> dict:
+    async with async_redis_client.pipeline(transaction=False) as pipe:
+        pipe.llen(READY_KEY)
+        pipe.llen(PROCESSING_KEY)
+        pipe.zcard(DELAYED_KEY)
+        pipe.llen(DEAD_KEY)
+        ready, processing, delayed, dead = await pipe.execute()
+    return {"ready": ready, "processing": processing, "delayed": delayed, "dead": dead}
+
+
+async def list_dead(limit: int = 20) -> list[dict]:
+    return [json.loads(raw) for raw in await async_redis_client.lrange(DEAD_KEY, 0, limit - 1)]
+
+
+async def requeue_dead(batch: int = 100) -> int:
+    """
+    Đưa toàn bộ job trong dead-letter về READY, đặt lại số lần thử.
+    Mỗi job được chuyển bằng một script Lua (LREM + LPUSH). Bản ghi không đọc được JSON nằm lại dead-letter.
+    """
+    count = 0
+    while raws := await async_redis_client.lrange(DEAD_KEY, -batch, -1):
+        moved = 0
+        # Cuối list là job cũ nhất
+        for raw in reversed(raws):
+            try:
+                job_data = json.loads(raw)
+            except json.JSONDecodeError:
+                continue
+            job_data["attempts"] = 0
+            moved += await async_redis_client.eval(
+                _REQUEUE_DEAD_SCRIPT, 2, DEAD_KEY, READY_KEY, raw, json.dumps(job_data)
+            )
+        if not moved:
+            break
+        count += moved
+    return count
+
+
+async def requeue_processing() -> int:
+    """
+    Đưa job còn kẹt trong PROCESSING (worker bị kill giữa chừng) về READY.
+    Chỉ chạy khi không có worker nào đang chạy, nếu không job đang xử lý sẽ bị chạy hai lần.
+    """
+    count = 0
+    while await async_redis_client.lmove(PROCESSING_KEY, READY_KEY, "RIGHT", "LEFT") is not None:
+        count += 1
+    return count
@@ -0,0 +1,352 @@
+import asyncio
+import os
+import time
+from dataclasses import dataclass, field
+from functools import partial
+from datetime import datetime
+from typing import Optional
+
+import httpx
+from sendgrid.helpers.mail import Mail, Email, To, Content, Personalization
+
+# Config từ environment variables
+SENDGRID_API_KEY = os.getenv("SENDGRID_API_KEY", "")
+SENDGRID_ENDPOINT = os.getenv("SENDGRID_ENDPOINT", "https://api.sendgrid.com")
+SENDER_EMAIL = os.getenv("SENDER_EMAIL", "noreply@yourapp.com")
+SENDER_NAME = os.getenv("SENDER_NAME", "Resort Booking")
+
+# sendgrid: gửi thật; local: ghi email ra MAIL_LOCAL_DIR, dùng khi dev/test không có mạng
+MAIL_SINK = os.getenv("MAIL_SINK", "sendgrid")
+MAIL_LOCAL_DIR = os.getenv("MAIL_LOCAL_DIR", "tmp/mail")
+# Số lần gọi API SendGrid tối đa mỗi giây (token bucket), 0 = không giới hạn
+MAIL_RATE_PER_SECOND = float(os.getenv("MAIL_RATE_PER_SECOND", "10"))
+MAIL_RATE_BURST = int(os.getenv("MAIL_RATE_BURST", "20"))
+# Số email tối đa lấy khỏi queue mỗi lượt
+MAIL_BATCH_MAX_MESSAGES = int(os.getenv("MAIL_BATCH_MAX_MESSAGES", "500"))
+# Số lần gọi API chạy song song
+MAIL_MAX_IN_FLIGHT = int(os.getenv("MAIL_MAX_IN_FLIGHT", "8"))
+# Queue đầy thì send() chờ (backpressure) thay vì nhận thêm email vào bộ nhớ
+MAIL_QUEUE_MAX = int(os.getenv("MAIL_QUEUE_MAX", "10000"))
+MAIL_TIMEOUT = float(os.getenv("MAIL_TIMEOUT", "15"))
+
+# SendGrid cho tối đa 1000 personalization trong một request
+SENDGRID_MAX_PERSONALIZATIONS = 1000
+
+# Mốc (ms) cho histogram thời gian từ lúc vào queue tới lúc gửi xong
+LATENCY_BUCKETS_MS = (100, 500, 1000, 5000, 10000, 60000)
+
+
+class MailDeliveryError(Exception):
+    pass
+
+
+class SendGridSink:
+    """Gửi qua SendGrid v3 API bằng một AsyncClient giữ kết nối keep-alive"""
+
+    name = "sendgrid"
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=SENDGRID_ENDPOINT,
+                headers={"Authorization": f"Bearer {SENDGRID_API_KEY}"},
+                timeout=MAIL_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=MAIL_MAX_IN_FLIGHT,
+                    max_keepalive_connections=MAIL_MAX_IN_FLIGHT
+                )
+            )
+        return self._client
+
+    async def send(self, subject: str, html_content: str, recipients: list[str]):
+        message = Mail(
+            from_email=Email(SENDER_EMAIL, SENDER_NAME),
+            subject=subject,
+            html_content=Content("text/html", html_content)
+        )
+        # Mỗi người nhận một personalization nên không ai thấy địa chỉ của người khác
+        for recipient in recipients:
+            personalization = Personalization()
+            personalization.add_to(To(recipient))
+            message.add_personalization(personalization)
+
+        response = await self._get_client().post("/v3/mail/send", json=message.get())
+        if response.status_code not in [200, 201, 202]:
+            raise MailDeliveryError(f"SendGrid error: {response.status_code} - {response.text}")
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class LocalSink:
+    """Ghi mỗi email ra một file HTML, không gửi đi đâu"""
+
+    name = "local"
+
+    def __init__(self, directory: str = MAIL_LOCAL_DIR):
+        self.directory = directory
+        self._counter = 0
+
+    def _write(self, subject: str, html_content: str, recipients: list[str]) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        self._counter += 1
+        path = os.path.join(self.directory, f"{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}-{self._counter}.html")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"<!-- To: {', '.join(recipients)} -->\n<!-- Subject: {subject} -->\n{html_content}")
+        return path
+
+    async def send(self, subject: str, html_content: str, recipients: list[str]):
+        path = await asyncio.to_thread(self._write, subject, html_content, recipients)
+        print(f"[EMAIL] Local sink wrote {len(recipients)} recipient(s) to {path}")
+
+    async def close(self):
+        pass
+
+
+SINKS = {"sendgrid": SendGridSink, "local": LocalSink}
+
+
+class TokenBucket:
+    """Giới hạn số lần gọi mỗi giây, cho phép dồn tối đa `burst` lần"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class MailStats:
+    def __init__(self):
+        self.sent = 0
+        self.failed = 0
+        self.api_calls = 0
+        self.send_ms_total = 0.0
+        self.send_ms_max = 0.0
+        self.latency_ms_total = 0.0
+        self.latency_ms_max = 0.0
+        self.latency_buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def record_call(self, send_ms: float, latencies_ms: list[float], ok: bool):
+        self.api_calls += 1
+        self.send_ms_total += send_ms
+        self.send_ms_max = max(self.send_ms_max, send_ms)
+        if ok:
+            self.sent += len(latencies_ms)
+        else:
+            self.failed += len(latencies_ms)
+        for latency_ms in latencies_ms:
+            self.latency_ms_total += latency_ms
+            self.latency_ms_max = max(self.latency_ms_max, latency_ms)
+            for i, bound in enumerate(LATENCY_BUCKETS_MS):
+                if latency_ms <= bound:
+                    self.latency_buckets[i] += 1
+                    break
+            else:
+                self.latency_buckets[-1] += 1
+
+    def as_dict(self) -> dict:
+        messages = self.sent + self.failed
+        buckets = {f"le_{bound}ms": count for bound, count in zip(LATENCY_BUCKETS_MS, self.latency_buckets)}
+        buckets["gt_%dms" % LATENCY_BUCKETS_MS[-1]] = self.latency_buckets[-1]
+        return {
+            "sent": self.sent,
+            "failed": self.failed,
+            "api_calls": self.api_calls,
+            "messages_per_call": round(messages / self.api_calls, 2) if self.api_calls else 0.0,
+            "send_ms_avg": round(self.send_ms_total / self.api_calls, 3) if self.api_calls else 0.0,
+            "send_ms_max": round(self.send_ms_max, 3),
+            "latency_ms_avg": round(self.latency_ms_total / messages, 3) if messages else 0.0,
+            "latency_ms_max": round(self.latency_ms_max, 3),
+            "latency_ms_buckets": buckets,
+        }
+
+
+@dataclass
+class _Outgoing:
+    to_email: str
+    subject: str
+    html_content: str
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+
+class MailDispatcher:
+    """
+    Nhận email qua queue, gửi song song tối đa MAIL_MAX_IN_FLIGHT lần gọi và không vượt MAIL_RATE_PER_SECOND.
+    Không chờ để gom: email hóa đơn có nội dung riêng cho từng booking nên gần như không có hai email
+    cùng nội dung. Các email cùng subject + nội dung đang nằm sẵn trong queue thì vẫn được gửi
+    chung một lần gọi nhiều personalization.
+    """
+
+    def __init__(self, sink):
+        self.sink = sink
+        self.stats = MailStats()
+        self._bucket = TokenBucket(MAIL_RATE_PER_SECOND, MAIL_RATE_BURST)
+        self._queue: asyncio.Queue[_Outgoing] = asyncio.Queue(maxsize=MAIL_QUEUE_MAX)
+        self._in_flight = asyncio.Semaphore(MAIL_MAX_IN_FLIGHT)
+        self._deliveries: set[asyncio.Task] = set()
+        self._task = asyncio.create_task(self._run())
+
+    @property
+    def running(self) -> bool:
+        return not self._task.done()
+
+    async def send(self, to_email: str, subject: str, html_content: str):
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(_Outgoing(to_email, subject, html_content, future))
+        await future
+
+    async def _run(self):
+        # Các nhóm email đã lấy khỏi queue nhưng chưa giao cho _deliver, bị báo lỗi nếu task bị hủy
+        undispatched: list[list[_Outgoing]] = []
+        try:
+            while True:
+                batch = [await self._queue.get()]
+                undispatched = [batch]
+                while len(batch) < MAIL_BATCH_MAX_MESSAGES and not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+
+                groups: dict[tuple[str, str], list[_Outgoing]] = {}
+                for message in batch:
+                    groups.setdefault((message.subject, message.html_content), []).append(message)
+                undispatched = [
+                    messages[i:i + SENDGRID_MAX_PERSONALIZATIONS]
+                    for messages in groups.values()
+                    for i in range(0, len(messages), SENDGRID_MAX_PERSONALIZATIONS)
+                ]
+
+                while undispatched:
+                    await self._in_flight.acquire()
+                    messages = undispatched.pop(0)
+                    task = asyncio.create_task(self._deliver(messages))
+                    self._deliveries.add(task)
+                    task.add_done_callback(partial(self._on_delivered, messages))
+        except asyncio.CancelledError:
+            # Cả email còn nằm trong queue: không còn ai lấy ra gửi
+            leftover = [message for messages in undispatched for message in messages]
+            while not self._queue.empty():
+                leftover.append(self._queue.get_nowait())
+            self._fail(leftover, MailDeliveryError("mail dispatcher stopped before the email was sent"))
+            raise
+
+    async def _deliver(self, messages: list[_Outgoing]):
+        """Một lần gọi API cho các email cùng nội dung, kết quả được báo cho caller trong _on_delivered"""
+        ok = False
+        started = time.perf_counter()
+        try:
+            await self._bucket.acquire()
+            started = time.perf_counter()
+            await self.sink.send(messages[0].subject, messages[0].html_content, [m.to_email for m in messages])
+            ok = True
+        finally:
+            finished = time.perf_counter()
+            self.stats.record_call(
+                (finished - started) * 1000,
+                [(finished - m.enqueued_at) * 1000 for m in messages],
+                ok=ok
+            )
+
+    def _on_delivered(self, messages: list[_Outgoing], task: asyncio.Task):
+        """
+        Done callback của task gửi, chạy cả khi task bị hủy trước khi kịp chạy.
+        Bị hủy (shutdown) thì không biết email đã đi hay chưa: báo MailDeliveryError (không phải
+        CancelledError) để job gửi email coi là lỗi thường và được retry.
+        """
+        self._deliveries.discard(task)
+        self._in_flight.release()
+        if task.cancelled():
+            error = MailDeliveryError("delivery cancelled before the email was confirmed sent")
+        else:
+            error = task.exception()
+        if error is not None:
+            print(f"[EMAIL] Failed to send {len(messages)} message(s): {error}")
+
+        for message in messages:
+            if not message.future.done():
+                if error is None:
+                    message.future.set_result(None)
+                else:
+                    message.future.set_exception(error)
+            self._queue.task_done()
+
+    def _fail(self, messages: list[_Outgoing], error: Exception):
+        """Báo lỗi cho các email chưa được gửi để caller (job gửi email) lỗi và được retry"""
+        for message in messages:
+            if not message.future.done():
+                message.future.set_exception(error)
+            self._queue.task_done()
+
+    async def close(self, timeout: float = 10):
+        """Chờ gửi hết email trong queue (tối đa `timeout` giây) rồi dừng"""
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            print(f"[EMAIL] Closing with {self._queue.qsize()} message(s) still queued")
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        if self._deliveries:
+            await asyncio.gather(*self._deliveries, return_exceptions=True)
+        await self.sink.close()
+
+    def metrics(self) -> dict:
+        return {
+            "sink": self.sink.name,
+            "queue_depth": self._queue.qsize(),
+            "queue_max": MAIL_QUEUE_MAX,
+            "in_flight": len(self._deliveries),
+            "rate_per_second": MAIL_RATE_PER_SECOND,
+            **self.stats.as_dict(),
+        }
+
+
+_dispatcher: Optional[MailDispatcher] = None
+
+
+def get_dispatcher() -> MailDispatcher:
+    """Dispatcher của process, tạo khi gửi email đầu tiên trong event loop đang chạy"""
+    global _dispatcher
+    if _dispatcher is None or not _dispatcher.running:
+        sink_class = SINKS.get(MAIL_SINK)
+        if sink_class is None:
+            raise ValueError(f"Unknown MAIL_SINK {MAIL_SINK!r}, expected one of {sorted(SINKS)}")
+        _dispatcher = MailDispatcher(sink_class())
+    return _dispatcher
+
+
+async def send(to_email: str, subject: str, html_content: str):
+    """Gửi một email qua dispatcher, trả về khi email đã được gửi đi (lỗi thì raise)"""
+    print(f"[EMAIL] Queueing email to: {to_email}, subject: {subject}")
+    await get_dispatcher().send(to_email, subject, html_content)
+
+
+async def close():
+    global _dispatcher
+    if _dispatcher is not None:
+        await _dispatcher.close()
+        _dispatcher = None
+
+
+def metrics() -> dict:
+    if _dispatcher is None:
+        return {"sink": MAIL_SINK, "queue_depth": 0, "running": False}
+    return {"running": _dispatcher.running, **_dispatcher.metrics()}
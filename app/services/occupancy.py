@@ -0,0 +1,120 @@
+import base64
+import json
+import os
+import re
+from datetime import date, datetime, timedelta
+
+from redis.exceptions import RedisError
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import async_redis_client
+
+# Config
+# Lịch đặt phòng thay đổi liên tục nên chỉ cache ngắn, đủ cho nhiều lần tải dashboard liên tiếp
+OCCUPANCY_CACHE_TTL_SECONDS = int(os.getenv("OCCUPANCY_CACHE_TTL_SECONDS", "30"))
+OCCUPANCY_MAX_DAYS = int(os.getenv("OCCUPANCY_MAX_DAYS", "366"))
+
+ENCODINGS = ("bitmap", "rle")
+
+# Mỗi phòng một chuỗi '0'/'1' dài :days, ký tự i là đêm start + i (cùng quy ước với
+# availability_service.night_range). Bitmap dựng trong Postgres bằng bit_or trên các timeslot
+# của phòng, worker chỉ nhận 500 chuỗi ngắn thay vì hàng chục nghìn timeslot.
+ROOM_BITMAPS_SQL = """
+    SELECT r.id AS room_id, r.number AS room_number, rt.name AS room_type,
+           coalesce(
+               bit_or(
+                   (repeat('0', n.lo) || repeat('1', n.hi - n.lo + 1) || repeat('0', CAST(:days AS integer) - n.hi - 1))::varbit
+               ) FILTER (WHERE n.hi >= n.lo)::text,
+               repeat('0', CAST(:days AS integer))
+           ) AS nights
+    FROM room r
+    JOIN room_type rt ON rt.id = r.room_type_id
+    LEFT JOIN booking_timeslot bt
+        ON bt.room_id = r.id
+       AND bt.period && tsrange(CAST(:window_start AS timestamp), CAST(:window_end AS timestamp))
+    LEFT JOIN LATERAL (
+        SELECT greatest(bt.started_time::date - CAST(:start AS date), 0) AS lo,
+               least(greatest(bt.finished_time::date - 1, bt.started_time::date) - CAST(:start AS date),
+                     CAST(:days AS integer) - 1) AS hi
+    ) n ON true
+    WHERE rt.resort_id = :resort_id
+    GROUP BY rt.id, r.id, r.number, rt.name
+    ORDER BY rt.id, r.number, r.id
+"""
+
+# '0'/'1' -> byte 0/1: mỗi phòng thành một số nguyên lớn với mỗi đêm là một "làn" 8 bit,
+# cộng tối đa 255 phòng một lần mà các làn không tràn sang nhau
+_LANES = bytes.maketrans(b"01", b"\x00\x01")
+_LANE_BATCH = 255
+_RUNS = re.compile("(1+)")
+
+
+def day_counts(nights: list[str], days: int) -> list[int]:
+    """Số phòng đã đặt của từng đêm, cộng theo làn thay vì duyệt từng bit"""
+    counts = [0] * days
+    for i in range(0, len(nights), _LANE_BATCH):
+        total = sum(int.from_bytes(s.encode().translate(_LANES), "big") for s in nights[i:i + _LANE_BATCH])
+        for day, count in enumerate(total.to_bytes(days, "big")):
+            counts[day] += count
+    return counts
+
+
+def build_matrix(rooms: list, start: date, days: int, encoding: str) -> dict:
+    """
+    Ma trận phòng x đêm từ các dòng (room_id, room_number, room_type, nights).
+    bitmap: base64, đêm i là bit 7 - i % 8 của byte i // 8 (bit cao trước, giống Postgres bit string
+    và Redis GETBIT). rle: độ dài các đoạn xen kẽ trống / đã đặt, bắt đầu bằng đoạn trống (có thể là 0),
+    tổng bằng days.
+    """
+    size = (days + 7) // 8
+    rows = []
+    for room_id, room_number, room_type, nights in rooms:
+        row = {"room_id": room_id, "room_number": room_number, "room_type": room_type,
+               "booked_nights": nights.count("1")}
+        if encoding == "rle":
+            row["runs"] = list(map(len, _RUNS.split(nights)))
+        else:
+            row["bitmap"] = base64.b64encode(int(nights.ljust(size * 8, "0"), 2).to_bytes(size, "big")).decode()
+        rows.append(row)
+
+    return {
+        "start": start.isoformat(),
+        "days": days,
+        "encoding": encoding,
+        "total_rooms": len(rooms),
+        "occupied": day_counts([room[3] for room in rooms], days),
+        "rooms": rows,
+    }
+
+
+async def get_occupancy(db: AsyncSession, resort_id: int, start: date, end: date, encoding: str) -> str:
+    """
+    JSON ma trận lấp đầy của resort trong các đêm [start, end], cache Redis OCCUPANCY_CACHE_TTL_SECONDS giây.
+    Trả chuỗi JSON đã serialize để route trả thẳng, không qua jsonable_encoder của FastAPI.
+    Caller phải kiểm tra resort thuộc partner và giới hạn số ngày trước khi gọi.
+    """
+    days = (end - start).days + 1
+    key = f"occupancy:{resort_id}:{start.isoformat()}:{days}:{encoding}"
+    try:
+        cached = await async_redis_client.get(key)
+        if cached is not None:
+            return cached
+    except RedisError as e:
+        print(f"[OCCUPANCY] Redis error, computing from database: {e}")
+
+    rooms = (await db.execute(text(ROOM_BITMAPS_SQL), {
+        "resort_id": resort_id,
+        "start": start,
+        "days": days,
+        "window_start": datetime.combine(start, datetime.min.time()),
+        "window_end": datetime.combine(end + timedelta(days=1), datetime.min.time()),
+    })).all()
+
+    body = json.dumps({"resort_id": resort_id, **build_matrix(rooms, start, days, encoding)}, separators=(",", ":"))
+
+    try:
+        await async_redis_client.set(key, body, ex=OCCUPANCY_CACHE_TTL_SECONDS)
+    except RedisError as e:
+        print(f"[OCCUPANCY] Redis error on cache set: {e}")
+    return body
@@ -0,0 +1,65 @@
+from typing import Iterable
+
+from fastapi import HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.resort import Resort
+from app.models.room_type import RoomType
+
+# Kết quả kiểm tra quyền được nhớ trong session.info: mỗi request có session riêng (get_db)
+# nên cache chỉ sống trong một request, không cần invalidate.
+MEMO_KEY = "ownership"
+
+
+def _memo(db: AsyncSession, kind: str, partner_id: int) -> dict[int, int]:
+    return db.info.setdefault(MEMO_KEY, {}).setdefault((kind, partner_id), {})
+
+
+def remember_room_types(db: AsyncSession, partner_id: int, resorts: dict[int, int]):
+    """Ghi nhận {room_type_id: resort_id} đã kiểm tra quyền bằng truy vấn khác (ví dụ truy vấn có selectinload)"""
+    _memo(db, "room_type", partner_id).update(resorts)
+
+
+async def room_type_resorts(db: AsyncSession, partner_id: int, room_type_ids: Iterable[int]) -> dict[int, int]:
+    """
+    {room_type_id: resort_id} nếu partner sở hữu tất cả các loại phòng, nếu không 404.
+    Chỉ đọc id (một truy vấn cho các id chưa kiểm tra trong request), không nạp quan hệ.
+    """
+    ids = set(room_type_ids)
+    memo = _memo(db, "room_type", partner_id)
+    unknown = ids - memo.keys()
+    if unknown:
+        result = await db.execute(
+            select(RoomType.id, RoomType.resort_id)
+            .join(Resort, Resort.id == RoomType.resort_id)
+            .where(RoomType.id.in_(unknown), Resort.partner_id == partner_id)
+        )
+        memo.update({row.id: row.resort_id for row in result.all()})
+
+    missing = ids - memo.keys()
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Loại phòng {sorted(missing)} không tồn tại hoặc không thuộc quyền quản lý của bạn"
+            if len(ids) > 1 else "Loại phòng không tồn tại hoặc không thuộc quyền quản lý của bạn"
+        )
+    return {room_type_id: memo[room_type_id] for room_type_id in ids}
+
+
+async def verify_resorts(db: AsyncSession, partner_id: int, resort_ids: Iterable[int]):
+    """404 nếu partner không sở hữu một trong các resort"""
+    ids = set(resort_ids)
+    memo = _memo(db, "resort", partner_id)
+    unknown = ids - memo.keys()
+    if unknown:
+        result = await db.execute(
+            select(Resort.id).where(Resort.id.in_(unknown), Resort.partner_id == partner_id)
+        )
+        memo.update({resort_id: resort_id for resort_id in result.scalars().all()})
+
+    if not ids <= memo.keys():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Resort không tồn tại hoặc không thuộc quyền quản lý của bạn"
+        )
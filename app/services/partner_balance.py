@@ -0,0 +1,78 @@
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+from typing import Iterable
+
+from sqlalchemy import update, bindparam, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.invoice import Invoice
+from app.models.partner import Partner
+
+_partner = Partner.__table__
+
+# Cộng/trừ số dư của một partner, chạy executemany theo thứ tự partner_id
+_ADJUST_BALANCE = (
+    update(_partner)
+    .where(_partner.c.id == bindparam("partner_id"))
+    .values(balance=func.coalesce(_partner.c.balance, 0) + bindparam("amount"))
+)
+
+
+async def _adjust(db: AsyncSession, rows, sign: int) -> int:
+    """rows: (partner_id, cost) của các invoice vừa được đánh dấu. Trả về số invoice đã áp dụng."""
+    totals = defaultdict(Decimal)
+    count = 0
+    for partner_id, cost in rows:
+        totals[partner_id] += Decimal(cost or 0)
+        count += 1
+    if totals:
+        # Sắp theo partner_id để hai transaction khóa các dòng partner theo cùng thứ tự (không deadlock)
+        connection = await db.connection()
+        await connection.execute(_ADJUST_BALANCE, [
+            {"partner_id": partner_id, "amount": sign * amount}
+            for partner_id, amount in sorted(totals.items())
+        ])
+    return count
+
+
+async def credit_invoices(db: AsyncSession, invoice_ids: Iterable[int]) -> int:
+    """
+    Cộng tiền các invoice vào số dư partner, mỗi invoice đúng một lần.
+    Đánh dấu invoice.credited_at bằng UPDATE có điều kiện credited_at IS NULL rồi cộng số dư
+    của chính các dòng vừa đánh dấu, trong transaction của caller (hàm không commit):
+    transaction rollback thì cả hai cùng mất, gọi lại hoặc gọi đồng thời không cộng trùng.
+    """
+    ids = list(invoice_ids)
+    if not ids:
+        return 0
+    result = await db.execute(
+        update(Invoice)
+        .where(Invoice.id.in_(ids), Invoice.partner_id.isnot(None), Invoice.credited_at.is_(None))
+        .values(credited_at=datetime.now())
+        .returning(Invoice.partner_id, Invoice.cost)
+        .execution_options(synchronize_session=False)
+    )
+    return await _adjust(db, result.all(), 1)
+
+
+async def reverse_booking_details(db: AsyncSession, booking_detail_ids: Iterable[int]) -> int:
+    """
+    Trừ lại tiền đã cộng cho partner khi booking detail bị hủy, mỗi invoice tối đa một lần
+    (đánh dấu invoice.credit_reversed_at). Invoice chưa được cộng thì không bị trừ. Hàm không commit.
+    """
+    ids = list(booking_detail_ids)
+    if not ids:
+        return 0
+    result = await db.execute(
+        update(Invoice)
+        .where(
+            Invoice.booking_detail_id.in_(ids),
+            Invoice.credited_at.isnot(None),
+            Invoice.credit_reversed_at.is_(None)
+        )
+        .values(credit_reversed_at=datetime.now())
+        .returning(Invoice.partner_id, Invoice.cost)
+        .execution_options(synchronize_session=False)
+    )
+    return await _adjust(db, result.all(), -1)
@@ -0,0 +1,178 @@
+import csv
+import io
+import json
+import os
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import AsyncIterator, Optional
+
+from sqlalchemy import select
+
+from app.db_async import AsyncSessionLocal
+from app.models.booking_detail import BookingDetail
+from app.models.booking_timeslot import BookingTimeSlot
+from app.models.invoice import Invoice
+from app.models.offer import Offer
+from app.models.resort import Resort
+from app.models.room import Room
+from app.models.room_type import RoomType
+
+# Config
+# Số dòng mỗi lần FETCH từ server-side cursor, bộ nhớ của một export tỉ lệ với số này
+EXPORT_FETCH_ROWS = int(os.getenv("EXPORT_FETCH_ROWS", "1000"))
+# Gửi cho client mỗi khi buffer đạt số byte này
+EXPORT_CHUNK_BYTES = int(os.getenv("EXPORT_CHUNK_BYTES", "65536"))
+# Mỗi export giữ một kết nối database tới khi gửi xong, giới hạn số export đồng thời mỗi worker
+EXPORT_MAX_CONCURRENT = int(os.getenv("EXPORT_MAX_CONCURRENT", "2"))
+# Timeout cho mỗi lần FETCH (không phải cho cả export)
+EXPORT_STATEMENT_TIMEOUT_MS = int(os.getenv("EXPORT_STATEMENT_TIMEOUT_MS", "30000"))
+
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+# Số export đang chạy trong worker
+_active_exports = 0
+
+
+def resolve_date_range(start: Optional[date], end: Optional[date]) -> tuple[datetime, datetime]:
+    """Khoảng [đầu ngày start, cuối ngày end], thiếu một trong hai thì lấy tuần hiện tại (thứ 2 - chủ nhật)"""
+    if not start or not end:
+        today = datetime.utcnow().date()
+        start = today - timedelta(days=today.weekday())
+        end = start + timedelta(days=6)
+    return datetime.combine(start, datetime.min.time()), datetime.combine(end, datetime.max.time())
+
+
+def schedule_query(partner_id: int, start_dt: datetime, end_dt: datetime, resort_id: Optional[int] = None):
+    """Các timeslot giao với [start_dt, end_dt] của resort thuộc partner, sắp theo thời gian bắt đầu"""
+    query = (
+        select(
+            BookingTimeSlot.room_id,
+            Resort.name.label("resort_name"),
+            RoomType.name.label("room_type"),
+            Room.number.label("room_number"),
+            BookingTimeSlot.started_time,
+            BookingTimeSlot.finished_time,
+        )
+        .join(Room, Room.id == BookingTimeSlot.room_id)
+        .join(RoomType, RoomType.id == Room.room_type_id)
+        .join(Resort, Resort.id == RoomType.resort_id)
+        .where(Resort.partner_id == partner_id)
+        .where(BookingTimeSlot.finished_time >= start_dt, BookingTimeSlot.started_time <= end_dt)
+        .order_by(BookingTimeSlot.started_time.asc())
+    )
+
+    if resort_id:
+        query = query.where(Resort.id == resort_id)
+
+    return query
+
+
+def revenue_query(partner_id: int, start_dt: datetime, end_dt: datetime, resort_id: Optional[int] = None):
+    """Invoice của partner thanh toán trong [start_dt, end_dt], sắp theo thời gian (index partner_id, finished_time)"""
+    query = (
+        select(
+            Invoice.id.label("invoice_id"),
+            Invoice.booking_detail_id,
+            Resort.id.label("resort_id"),
+            Resort.name.label("resort_name"),
+            RoomType.name.label("room_type"),
+            Invoice.cost.label("amount"),
+            Invoice.payment_method,
+            Invoice.finished_time.label("time"),
+        )
+        .join(BookingDetail, BookingDetail.id == Invoice.booking_detail_id)
+        .join(Offer, Offer.id == BookingDetail.offer_id)
+        .join(RoomType, RoomType.id == Offer.room_type_id)
+        .join(Resort, Resort.id == RoomType.resort_id)
+        .where(Invoice.partner_id == partner_id)
+        .where(Invoice.finished_time >= start_dt, Invoice.finished_time <= end_dt)
+        .order_by(Invoice.finished_time.asc(), Invoice.id.asc())
+    )
+
+    if resort_id:
+        query = query.where(Resort.id == resort_id)
+
+    return query
+
+
+class ExportSlot:
+    """Một chỗ export đã giữ, release() gọi nhiều lần cũng chỉ trả chỗ một lần"""
+
+    def __init__(self):
+        self._released = False
+
+    def release(self):
+        global _active_exports
+        if not self._released:
+            self._released = True
+            _active_exports -= 1
+
+
+def try_acquire_slot() -> Optional[ExportSlot]:
+    """
+    Giữ một chỗ export, None nếu worker đã chạy đủ EXPORT_MAX_CONCURRENT export (route trả 429
+    thay vì xếp hàng). Kiểm tra và tăng bộ đếm không có await ở giữa nên các request đồng thời
+    không thể cùng lọt qua.
+    """
+    global _active_exports
+    if _active_exports >= EXPORT_MAX_CONCURRENT:
+        return None
+    _active_exports += 1
+    return ExportSlot()
+
+
+def _csv_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return "" if value is None else value
+
+
+def _json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+async def stream_export(query, fmt: str, slot: ExportSlot) -> AsyncIterator[bytes]:
+    """
+    Chạy query bằng server-side cursor (yield_per) và trả từng chunk CSV / NDJSON.
+    Bộ nhớ chỉ gồm một lần FETCH và một buffer, không phụ thuộc số dòng export.
+    Session riêng mở và đóng trong generator nên kết nối được trả lại pool ngay khi
+    gửi xong hoặc client ngắt kết nối. slot được trả khi generator kết thúc; caller vẫn phải
+    release() sau response vì generator chưa từng chạy (client ngắt sớm) thì không vào finally.
+    """
+    try:
+        async with AsyncSessionLocal() as db:
+            db.info["statement_timeout_ms"] = EXPORT_STATEMENT_TIMEOUT_MS
+            result = await db.stream(query.execution_options(yield_per=EXPORT_FETCH_ROWS))
+            columns = list(result.keys())
+
+            buffer = io.StringIO()
+            writer = csv.writer(buffer) if fmt == "csv" else None
+            if writer:
+                # BOM để Excel nhận đúng UTF-8 (tên resort tiếng Việt)
+                buffer.write("\ufeff")
+                writer.writerow(columns)
+
+            async for partition in result.partitions():
+                for row in partition:
+                    if writer:
+                        writer.writerow([_csv_value(value) for value in row])
+                    else:
+                        buffer.write(json.dumps(dict(zip(columns, row)), default=_json_value, ensure_ascii=False))
+                        buffer.write("\n")
+
+                if buffer.tell() >= EXPORT_CHUNK_BYTES:
+                    yield buffer.getvalue().encode()
+                    buffer.seek(0)
+                    buffer.truncate()
+
+            if buffer.tell():
+                yield buffer.getvalue().encode()
+    finally:
+        slot.release()
@@ -0,0 +1,87 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+# Config
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(os.cpu_count() or 1, 4))))
+# Số yêu cầu hash/verify tối đa đang chạy hoặc chờ trong mỗi worker app, vượt quá thì trả 429
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", str(PASSWORD_HASH_WORKERS * 4)))
+# Cost factor của bcrypt. Hash cũ có cost khác sẽ được hash lại khi người dùng đăng nhập
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+# Module này chạy cả trong process con nên không import gì từ app
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS
+)
+
+_executor: Optional[ProcessPoolExecutor] = None
+_pending = 0
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify_and_update(plain_password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn: process con không thừa kế event loop, kết nối DB/Redis của worker app
+        _executor = ProcessPoolExecutor(
+            max_workers=PASSWORD_HASH_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+
+async def _submit(fn, *args):
+    """Chạy fn trong process pool; trả 429 ngay nếu đã có quá nhiều yêu cầu đang chờ"""
+    global _pending
+    if _pending >= PASSWORD_HASH_MAX_PENDING:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Hệ thống đang bận, vui lòng thử lại sau",
+            headers={"Retry-After": "1"}
+        )
+
+    _pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_get_executor(), fn, *args)
+    finally:
+        _pending -= 1
+
+
+async def hash_password(password: str) -> str:
+    return await _submit(_hash, password)
+
+
+async def verify_and_update(plain_password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+    """
+    Kiểm tra mật khẩu. Nếu đúng và hash dùng cost khác BCRYPT_ROUNDS
+    thì trả về thêm hash mới để lưu lại, ngược lại phần tử thứ hai là None.
+    """
+    return await _submit(_verify_and_update, plain_password, hashed_password)
+
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    valid, _ = await verify_and_update(plain_password, hashed_password)
+    return valid
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
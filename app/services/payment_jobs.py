@@ -0,0 +1,135 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+
+from app.db_async import AsyncSessionLocal
+from app.models.booking import Booking
+from app.models.booking_detail import BookingDetail
+from app.models.invoice import Invoice
+from app.models.offer import Offer
+from app.models.room_type import RoomType
+from app.services.email_service import send_booking_confirmation_email
+from app.services.job_queue import job, enqueue, enqueue_many
+from app.services.partner_balance import credit_invoices
+
+
+async def enqueue_settlement_jobs(settlement):
+    """
+    Đưa các việc sau thanh toán (email xác nhận) vào queue sau khi đã commit.
+    Lỗi enqueue không mất email: booking vẫn có confirmation_sent_at IS NULL và được đưa lại vào
+    queue bởi enqueue_pending_confirmation hoặc `python -m app.commands.jobs enqueue-confirmations`.
+    """
+    try:
+        await enqueue("send_booking_confirmation", {"booking_id": settlement.booking.id})
+    except Exception as e:
+        print(f"[JOBS] Failed to enqueue settlement jobs for booking {settlement.booking.id}: {e}")
+
+
+def _pending_confirmations():
+    return select(Booking.id).where(Booking.status == "paid", Booking.confirmation_sent_at.is_(None))
+
+
+async def enqueue_pending_confirmation(
+    db: AsyncSession,
+    booking_id: Optional[int] = None,
+    zp_trans_id: Optional[str] = None
+):
+    """
+    Callback / query gặp booking đã thanh toán (settle_booking trả về None): nếu email xác nhận
+    chưa được gửi thì đưa lại vào queue, phòng khi lần enqueue sau commit trước đó bị lỗi.
+    """
+    query = _pending_confirmations()
+    if booking_id is not None:
+        query = query.where(Booking.id == booking_id)
+    else:
+        query = query.where(Booking.zp_trans_id == zp_trans_id)
+
+    pending_id = (await db.execute(query)).scalar_one_or_none()
+    if pending_id is None:
+        return
+    try:
+        await enqueue("send_booking_confirmation", {"booking_id": pending_id})
+    except Exception as e:
+        print(f"[JOBS] Failed to re-enqueue confirmation for booking {pending_id}: {e}")
+
+
+async def enqueue_all_pending_confirmations() -> int:
+    """
+    Đưa mọi booking đã thanh toán mà chưa gửi email vào queue. Booking có job đang chờ sẽ có
+    thêm một job trùng, job chạy sau không gửi lại vì đã có confirmation_sent_at.
+    """
+    async with AsyncSessionLocal() as db:
+        booking_ids = (await db.scalars(_pending_confirmations())).all()
+    await enqueue_many([("send_booking_confirmation", {"booking_id": booking_id}) for booking_id in booking_ids])
+    return len(booking_ids)
+
+
+@job("send_booking_confirmation")
+async def send_booking_confirmation(payload: dict):
+    """
+    Gửi email xác nhận kèm hóa đơn cho booking đã thanh toán, đúng một lần với mỗi booking
+    trừ khi worker chết giữa lúc gửi và lúc commit.
+
+    Booking được khóa (FOR UPDATE SKIP LOCKED) trong lúc gửi và confirmation_sent_at được ghi
+    trong cùng transaction: job trùng chạy đồng thời bỏ qua booking đang được gửi, job chạy sau
+    thấy confirmation_sent_at đã có. Gửi lỗi thì transaction rollback và job được retry.
+    Payload cũ (invoice_ids, payment_time, payment_method) không còn được dùng.
+    """
+    async with AsyncSessionLocal() as db:
+        booking = (await db.execute(
+            select(Booking)
+            .options(
+                joinedload(Booking.customer),
+                joinedload(Booking.booking_details)
+                .joinedload(BookingDetail.offer)
+                .joinedload(Offer.room_type)
+                .joinedload(RoomType.resort)
+            )
+            .where(
+                Booking.id == payload["booking_id"],
+                Booking.status == "paid",
+                Booking.confirmation_sent_at.is_(None)
+            )
+            .with_for_update(of=Booking, skip_locked=True)
+        )).unique().scalar_one_or_none()
+        if not booking:
+            return
+
+        invoices = (await db.scalars(
+            select(Invoice)
+            .join(BookingDetail, BookingDetail.id == Invoice.booking_detail_id)
+            .where(BookingDetail.booking_id == booking.id)
+            .order_by(Invoice.id)
+        )).all()
+
+        customer = booking.customer
+        if invoices and customer and customer.email:
+            await send_booking_confirmation_email(
+                customer_email=customer.email,
+                customer_name=customer.fullname,
+                customer_phone=customer.phone_number,
+                booking_id=booking.id,
+                booking_details=booking.booking_details,
+                invoices=invoices,
+                total_cost=float(booking.cost or 0),
+                payment_method=invoices[0].payment_method,
+                payment_time=invoices[0].finished_time
+            )
+
+        # Không có email / invoice thì cũng đánh dấu để enqueue-confirmations không đưa lại vào queue
+        booking.confirmation_sent_at = datetime.now()
+        await db.commit()
+
+
+@job("credit_partner_balance")
+async def credit_partner_balance(payload: dict):
+    """
+    Job cũ: số dư partner nay được cộng trong transaction của settle_booking. Giữ handler để
+    job đã nằm trong queue trước khi deploy vẫn chạy được; credit_invoices bỏ qua invoice đã cộng.
+    """
+    async with AsyncSessionLocal() as db:
+        await credit_invoices(db, payload["invoice_ids"])
+        await db.commit()
@@ -0,0 +1,109 @@
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Iterable, NamedTuple, Optional
+
+from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.partner_revenue import PartnerRevenueDaily, PartnerRevenueMonthly
+
+
+class InvoiceRevenue(NamedTuple):
+    """Một invoice vừa tạo: partner và resort nhận tiền, thời điểm thanh toán, số tiền"""
+    partner_id: int
+    resort_id: int
+    finished_time: datetime
+    cost: Decimal
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+async def _upsert(db: AsyncSession, model, period_column, totals: dict):
+    rows = [
+        {"partner_id": partner_id, period_column.key: period, "resort_id": resort_id,
+         "bookings": bookings, "revenue": revenue}
+        for (partner_id, period, resort_id), (bookings, revenue) in sorted(totals.items())
+    ]
+    if not rows:
+        return
+
+    stmt = pg_insert(model).values(rows)
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[model.partner_id, period_column, model.resort_id],
+        set_={
+            "bookings": model.bookings + stmt.excluded.bookings,
+            "revenue": model.revenue + stmt.excluded.revenue,
+        }
+    ))
+
+
+async def record_invoices(db: AsyncSession, invoices: Iterable[InvoiceRevenue]):
+    """
+    Cộng các invoice vào bảng doanh thu theo ngày và theo tháng, gọi trong cùng transaction
+    tạo invoice. Mỗi bảng một câu INSERT ... ON CONFLICT, các dòng sắp theo khóa để hai
+    transaction cùng partner khóa dòng theo cùng thứ tự (không deadlock).
+    """
+    daily = defaultdict(lambda: [0, Decimal(0)])
+    monthly = defaultdict(lambda: [0, Decimal(0)])
+    for invoice in invoices:
+        if invoice.partner_id is None or invoice.finished_time is None:
+            continue
+        day = invoice.finished_time.date()
+        cost = Decimal(invoice.cost or 0)
+        for totals, period in ((daily, day), (monthly, month_start(day))):
+            entry = totals[(invoice.partner_id, period, invoice.resort_id)]
+            entry[0] += 1
+            entry[1] += cost
+
+    await _upsert(db, PartnerRevenueDaily, PartnerRevenueDaily.day, daily)
+    await _upsert(db, PartnerRevenueMonthly, PartnerRevenueMonthly.month, monthly)
+
+
+async def get_partner_summary(
+    db: AsyncSession,
+    partner_id: int,
+    today: date,
+    resort_id: Optional[int] = None
+) -> dict:
+    """
+    Số lượt đặt hôm nay, doanh thu tháng này và tổng số lượt đặt của partner (hoặc một resort),
+    đọc từ bảng tổng hợp: một truy vấn, số dòng đọc tỉ lệ với số resort và số tháng
+    chứ không với số invoice.
+    """
+    def scoped(model, *criteria):
+        criteria = [model.partner_id == partner_id, *criteria]
+        if resort_id is not None:
+            criteria.append(model.resort_id == resort_id)
+        return criteria
+
+    today_bookings = (
+        select(func.coalesce(func.sum(PartnerRevenueDaily.bookings), 0))
+        .where(*scoped(PartnerRevenueDaily, PartnerRevenueDaily.day == today))
+        .scalar_subquery()
+    )
+    monthly_revenue = (
+        select(func.coalesce(func.sum(PartnerRevenueMonthly.revenue), 0))
+        .where(*scoped(PartnerRevenueMonthly, PartnerRevenueMonthly.month == month_start(today)))
+        .scalar_subquery()
+    )
+    total_bookings = (
+        select(func.coalesce(func.sum(PartnerRevenueMonthly.bookings), 0))
+        .where(*scoped(PartnerRevenueMonthly))
+        .scalar_subquery()
+    )
+
+    row = (await db.execute(select(
+        today_bookings.label("new_bookings_today"),
+        monthly_revenue.label("monthly_revenue"),
+        total_bookings.label("total_bookings"),
+    ))).one()
+
+    return {
+        "new_bookings_today": int(row.new_bookings_today),
+        "monthly_revenue": float(row.monthly_revenue),
+        "total_bookings": int(row.total_bookings),
+    }
@@ -0,0 +1,167 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, insert
+from sqlalchemy.orm import joinedload
+
+from app.models.booking import Booking
+from app.models.booking_detail import BookingDetail
+from app.models.invoice import Invoice
+from app.models.offer import Offer
+from app.models.room_type import RoomType
+from app.services.booking_timeslot_service import allocate_timeslots, TimeslotRequest, RoomAllocationError
+from app.services.revenue_rollup import record_invoices, InvoiceRevenue
+from app.services.partner_balance import credit_invoices
+
+
+@dataclass
+class Settlement:
+    booking: Booking
+    invoices: list[Invoice]
+    payment_time: datetime
+    payment_method: str
+    # Đã nhận tiền nhưng không giữ được phòng: booking ở trạng thái REFUND_REQUIRED, không có invoice
+    refund_required: bool = False
+
+
+# Booking đã thanh toán nhưng không còn phòng, chờ hoàn tiền
+REFUND_REQUIRED = "refund_required"
+
+
+async def _record_payment(
+    db: AsyncSession,
+    booking: Booking,
+    details: list[BookingDetail],
+    payment_time: datetime,
+    payment_method: str
+) -> list[Invoice]:
+    """Đánh dấu detail PAID, tạo invoice, giữ phòng, cộng doanh thu và số dư partner"""
+    await db.execute(
+        update(BookingDetail)
+        .where(BookingDetail.booking_id == booking.id)
+        .values(status="PAID")
+    )
+
+    invoices = []
+    if details:
+        invoices = list(await db.scalars(
+            insert(Invoice).returning(Invoice, sort_by_parameter_order=True),
+            [
+                {
+                    "customer_id": booking.customer_id,
+                    "partner_id": detail.offer.room_type.resort.partner_id,
+                    "booking_detail_id": detail.id,
+                    "cost": detail.cost,
+                    "finished_time": payment_time,
+                    "payment_method": payment_method
+                }
+                for detail in details
+            ]
+        ))
+
+        # Giữ phòng cho mọi detail bằng một lần chọn phòng và một INSERT nhiều dòng
+        await allocate_timeslots(db, [
+            TimeslotRequest(
+                room_type_id=detail.offer.room_type_id,
+                number_of_rooms=detail.number_of_rooms,
+                started_at=detail.started_at,
+                finished_at=detail.finished_at,
+                invoice_id=invoice.id
+            )
+            for detail, invoice in zip(details, invoices)
+        ])
+
+        # Doanh thu theo ngày / tháng của partner, cùng transaction với invoice
+        await record_invoices(db, [
+            InvoiceRevenue(
+                partner_id=invoice.partner_id,
+                resort_id=detail.offer.room_type.resort_id,
+                finished_time=invoice.finished_time,
+                cost=invoice.cost
+            )
+            for detail, invoice in zip(details, invoices)
+        ])
+
+        # Số dư partner, cùng transaction với invoice nên được cộng đúng một lần
+        await credit_invoices(db, [invoice.id for invoice in invoices])
+
+    return invoices
+
+
+async def settle_booking(
+    db: AsyncSession,
+    booking_id: Optional[int] = None,
+    zp_trans_id: Optional[str] = None,
+    payment_method: str = "ZALOPAY"
+) -> Optional[Settlement]:
+    """
+    Chuyển booking "pending" sang "paid": đánh dấu các detail PAID, tạo invoice, giữ phòng,
+    cộng doanh thu vào bảng tổng hợp và cộng tiền vào số dư của partner.
+    Dùng chung cho callback và query của ZaloPay.
+
+    Booking được khóa FOR UPDATE nên callback và query chạy đồng thời trên cùng giao dịch
+    sẽ xếp hàng; bên tới sau thấy status đã là "paid" và trả về None (idempotent).
+    Số round trip cố định, không phụ thuộc số detail trong booking.
+    Hàm không commit - caller commit để booking, invoice, timeslot nằm trong một transaction.
+
+    Tiền đã được trả nên thiếu phòng không làm hàm lỗi: phần thanh toán được rollback về savepoint,
+    booking chuyển sang REFUND_REQUIRED và Settlement trả về có refund_required=True.
+    """
+    query = (
+        select(Booking)
+        .options(
+            joinedload(Booking.customer),
+            joinedload(Booking.booking_details)
+            .joinedload(BookingDetail.offer)
+            .joinedload(Offer.room_type)
+            .joinedload(RoomType.resort)
+        )
+        .with_for_update(of=Booking)
+        .execution_options(populate_existing=True)
+    )
+    if booking_id is not None:
+        query = query.where(Booking.id == booking_id)
+    elif zp_trans_id is not None:
+        query = query.where(Booking.zp_trans_id == zp_trans_id)
+    else:
+        raise ValueError("booking_id or zp_trans_id is required")
+
+    booking = (await db.execute(query)).unique().scalar_one_or_none()
+    if not booking or booking.status != "pending":
+        return None
+
+    payment_time = datetime.now()
+    details = booking.booking_details
+
+    try:
+        async with db.begin_nested():
+            invoices = await _record_payment(db, booking, details, payment_time, payment_method)
+    except RoomAllocationError as e:
+        booking.status = REFUND_REQUIRED
+        await db.execute(
+            update(BookingDetail)
+            .where(BookingDetail.booking_id == booking.id)
+            .values(status="REFUND_REQUIRED")
+        )
+        print(f"[SETTLEMENT] Booking {booking.id} paid but rooms could not be allocated, "
+              f"marked {REFUND_REQUIRED}: {e.detail}")
+        return Settlement(
+            booking=booking,
+            invoices=[],
+            payment_time=payment_time,
+            payment_method=payment_method,
+            refund_required=True
+        )
+
+    # Gán sau savepoint: rollback savepoint không làm booking bị expire
+    booking.status = "paid"
+
+    return Settlement(
+        booking=booking,
+        invoices=invoices,
+        payment_time=payment_time,
+        payment_method=payment_method
+    )
+
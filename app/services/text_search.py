@@ -0,0 +1,51 @@
+import os
+
+from sqlalchemy import func, literal, or_
+
+# Từ khóa ngắn hơn số ký tự này chỉ tìm theo chuỗi con, không tìm gần đúng
+# (1-2 ký tự có quá ít trigram để so độ giống có ý nghĩa)
+TEXT_SEARCH_FUZZY_MIN_LENGTH = int(os.getenv("TEXT_SEARCH_FUZZY_MIN_LENGTH", "3"))
+
+# Ký tự escape cho LIKE, tránh "\\" vì cách viết literal phụ thuộc standard_conforming_strings
+LIKE_ESCAPE = "!"
+
+
+def normalize(expr):
+    """
+    search_normalize() trong database: bỏ dấu tiếng Việt và viết thường ("Đà Nẵng" -> "da nang").
+    Cột phải được bọc đúng biểu thức này thì mới dùng được GIN trigram index (migration c4a8e2f7b913).
+    """
+    return func.search_normalize(expr)
+
+
+def _escape_like(term: str) -> str:
+    return term.replace("!", "!!").replace("%", "!%").replace("_", "!_")
+
+
+def _needle(term: str):
+    return normalize(literal(term.strip()))
+
+
+def matches(term: str, *columns):
+    """
+    Điều kiện term khớp ít nhất một cột, không phân biệt hoa thường và dấu:
+    chứa term như chuỗi con (giống ILIKE '%term%' trước đây), hoặc gần giống theo
+    word_similarity (gõ sai chính tả) nếu term đủ dài. Mọi nhánh đều dùng GIN trigram index.
+    """
+    pattern = literal("%") + normalize(literal(_escape_like(term.strip()))) + literal("%")
+    fuzzy = len(term.strip()) >= TEXT_SEARCH_FUZZY_MIN_LENGTH
+
+    conditions = []
+    for column in columns:
+        normalized = normalize(column)
+        conditions.append(normalized.like(pattern, escape=LIKE_ESCAPE))
+        if fuzzy:
+            # <% : word_similarity(term, cột) >= pg_trgm.word_similarity_threshold (mặc định 0.6)
+            conditions.append(_needle(term).op("<%", is_comparison=True)(normalized))
+    return or_(*conditions)
+
+
+def rank(term: str, *columns):
+    """Độ giống (0..1) giữa term và cột khớp nhất, dùng để sắp kết quả giảm dần"""
+    needle = _needle(term)
+    return func.greatest(*[func.word_similarity(needle, normalize(column)) for column in columns])
@@ -0,0 +1,293 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from redis.exceptions import RedisError
+from sqlalchemy.orm import make_transient_to_detached
+
+from app.database import async_redis_client
+from app.models.account import Account
+from app.models.customer import Customer
+from app.models.partner import Partner
+from app.models.role import Role
+
+# Config
+TOKEN_CACHE_TTL_SECONDS = int(os.getenv("TOKEN_CACHE_TTL_SECONDS", "900"))
+TOKEN_CACHE_LOCAL_SIZE = int(os.getenv("TOKEN_CACHE_LOCAL_SIZE", "2048"))
+TOKEN_CACHE_LOCAL_TTL_SECONDS = int(os.getenv("TOKEN_CACHE_LOCAL_TTL_SECONDS", "10"))
+INVALIDATION_CHANNEL = "auth:token-cache:invalidate"
+
+CUSTOMER_FIELDS = ("id", "account_id", "fullname", "email", "phone_number", "id_number")
+# balance không được cache - các endpoint cần số dư phải đọc lại từ database
+PARTNER_FIELDS = ("id", "account_id", "name", "phone_number", "address", "banking_number", "bank")
+
+
+def token_hash(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _token_key(hashed: str) -> str:
+    return f"auth:token:{hashed}"
+
+
+def _account_key(account_id: int) -> str:
+    return f"auth:account:{account_id}:tokens"
+
+
+def _generation_key(account_id: int) -> str:
+    return f"auth:account:{account_id}:gen"
+
+
+# Ghi snapshot chỉ khi generation của account chưa đổi kể từ lúc đọc database (ARGV[1]):
+# logout / ban / đổi mật khẩu INCR generation, nên request đọc account trước lúc đó không ghi
+# đè snapshot cũ lên cache sau khi đã invalidate. Generation sống ít nhất bằng snapshot.
+_CACHE_ACCOUNT_SCRIPT = """
+if (redis.call('GET', KEYS[3]) or '0') ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+redis.call('SADD', KEYS[2], ARGV[4])
+redis.call('EXPIRE', KEYS[2], ARGV[5])
+redis.call('EXPIRE', KEYS[3], ARGV[5])
+return 1
+"""
+
+
+class CacheLookup(NamedTuple):
+    """Kết quả đọc cache: account (None nếu chưa có) và generation để truyền lại cho cache_account"""
+    account: Optional[Account]
+    generation: Optional[str]
+
+
+class _LocalLRU:
+    """LRU nhỏ trong process, đứng trước Redis để token nóng không tốn cả round trip Redis"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+
+    def get(self, hashed: str) -> Optional[dict]:
+        entry = self._entries.get(hashed)
+        if entry is None:
+            return None
+        expires, snapshot = entry
+        if expires <= time.monotonic():
+            self._entries.pop(hashed, None)
+            return None
+        self._entries.move_to_end(hashed)
+        return snapshot
+
+    def set(self, hashed: str, snapshot: dict, ttl: float):
+        self._entries[hashed] = (time.monotonic() + ttl, snapshot)
+        self._entries.move_to_end(hashed)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def pop(self, hashed: str):
+        self._entries.pop(hashed, None)
+
+    def pop_account(self, account_id: int):
+        for hashed in [h for h, (_, s) in self._entries.items() if s["account_id"] == account_id]:
+            self._entries.pop(hashed, None)
+
+
+_local_cache = _LocalLRU(TOKEN_CACHE_LOCAL_SIZE)
+
+# account_id -> thời điểm (monotonic) hết hạn. Đặt khi invalidate lỗi Redis: worker này không đọc
+# cũng không ghi cache của account cho tới khi INCR generation thành công hoặc mọi snapshot cũ
+# đã hết TTL (TOKEN_CACHE_TTL_SECONDS)
+_tombstones: dict[int, float] = {}
+
+
+def _tombstone(account_id: int):
+    _local_cache.pop_account(account_id)
+    _tombstones[account_id] = time.monotonic() + TOKEN_CACHE_TTL_SECONDS
+
+
+def _is_tombstoned(account_id: int) -> bool:
+    expires = _tombstones.get(account_id)
+    if expires is None:
+        return False
+    if expires <= time.monotonic():
+        _tombstones.pop(account_id, None)
+        return False
+    return True
+
+
+def snapshot_account(account: Account) -> dict:
+    """Chuyển account (đã load roles, customer, partner) thành dict để cache"""
+    return {
+        "account_id": account.account_id,
+        "username": account.username,
+        "status": account.status,
+        "created_at": account.created_at.isoformat() if account.created_at else None,
+        "roles": [{"id": role.id, "title": role.title} for role in account.roles],
+        "customer": {f: getattr(account.customer, f) for f in CUSTOMER_FIELDS} if account.customer else None,
+        "partner": {f: getattr(account.partner, f) for f in PARTNER_FIELDS} if account.partner else None,
+    }
+
+
+def account_from_snapshot(snapshot: dict) -> Account:
+    """
+    Dựng lại Account ở trạng thái detached từ snapshot.
+    Các thuộc tính không có trong snapshot (password, partner.balance, ...) không được load,
+    truy cập vào chúng sẽ báo lỗi thay vì trả về giá trị cũ.
+    """
+    customer = Customer(**snapshot["customer"]) if snapshot["customer"] else None
+    partner = Partner(**snapshot["partner"]) if snapshot["partner"] else None
+    roles = [Role(**role) for role in snapshot["roles"]]
+
+    account = Account(
+        account_id=snapshot["account_id"],
+        username=snapshot["username"],
+        status=snapshot["status"],
+        created_at=datetime.fromisoformat(snapshot["created_at"]) if snapshot["created_at"] else None,
+        roles=roles,
+        customer=customer,
+        partner=partner
+    )
+    for instance in [account, customer, partner, *roles]:
+        if instance is not None:
+            make_transient_to_detached(instance)
+    return account
+
+
+async def get_cached_account(token: str, account_id: int) -> CacheLookup:
+    """
+    Lấy account từ LRU local rồi tới Redis. Snapshot trên Redis chỉ được dùng khi generation
+    lúc ghi bằng generation hiện tại của account (đọc cùng trong một MGET).
+    """
+    if _is_tombstoned(account_id) and not await _flush_tombstone(account_id):
+        return CacheLookup(None, None)
+
+    hashed = token_hash(token)
+    snapshot = _local_cache.get(hashed)
+    if snapshot is not None:
+        return CacheLookup(account_from_snapshot(snapshot), None)
+
+    try:
+        raw, generation = await async_redis_client.mget(_token_key(hashed), _generation_key(account_id))
+    except RedisError as e:
+        print(f"[TOKEN_CACHE] Redis error on get: {e}")
+        return CacheLookup(None, None)
+
+    generation = generation or "0"
+    if raw is None:
+        return CacheLookup(None, generation)
+    snapshot = json.loads(raw)
+    if snapshot.get("generation") != generation:
+        return CacheLookup(None, generation)
+
+    _local_cache.set(hashed, snapshot, TOKEN_CACHE_LOCAL_TTL_SECONDS)
+    return CacheLookup(account_from_snapshot(snapshot), generation)
+
+
+async def cache_account(token: str, account: Account, expires_at: datetime, generation: Optional[str]):
+    """
+    Cache account theo hash của token, TTL không vượt quá expires_at của token.
+    generation là giá trị get_cached_account trả về trước khi đọc database; None (không đọc
+    được Redis) thì không cache. Nếu account đã bị invalidate trong lúc đó thì không ghi gì.
+    """
+    ttl = min(TOKEN_CACHE_TTL_SECONDS, int((expires_at - datetime.utcnow()).total_seconds()))
+    if ttl <= 0 or generation is None or _is_tombstoned(account.account_id):
+        return
+
+    hashed = token_hash(token)
+    snapshot = {**snapshot_account(account), "generation": generation}
+
+    try:
+        stored = await async_redis_client.eval(
+            _CACHE_ACCOUNT_SCRIPT, 3,
+            _token_key(hashed), _account_key(account.account_id), _generation_key(account.account_id),
+            generation, json.dumps(snapshot), ttl, hashed, TOKEN_CACHE_TTL_SECONDS
+        )
+    except RedisError as e:
+        print(f"[TOKEN_CACHE] Redis error on set: {e}")
+        return
+
+    if stored:
+        _local_cache.set(hashed, snapshot, min(ttl, TOKEN_CACHE_LOCAL_TTL_SECONDS))
+
+
+async def _bump_generation(account_id: int, hashes: list[str], message: str):
+    async with async_redis_client.pipeline(transaction=True) as pipe:
+        pipe.incr(_generation_key(account_id))
+        pipe.expire(_generation_key(account_id), TOKEN_CACHE_TTL_SECONDS)
+        for hashed in hashes:
+            pipe.delete(_token_key(hashed))
+        if hashes:
+            pipe.srem(_account_key(account_id), *hashes)
+        pipe.publish(INVALIDATION_CHANNEL, message)
+        await pipe.execute()
+
+
+async def invalidate_token(token: str, account_id: int):
+    """Xóa cache của một token (logout) trên Redis và LRU của mọi worker"""
+    hashed = token_hash(token)
+    _local_cache.pop(hashed)
+
+    try:
+        await _bump_generation(account_id, [hashed], f"token:{hashed}")
+    except RedisError as e:
+        print(f"[TOKEN_CACHE] Redis error on invalidate token, tombstoning account {account_id}: {e}")
+        _tombstone(account_id)
+
+
+async def invalidate_account(account_id: int):
+    """Xóa cache của mọi token thuộc account (ban, đổi mật khẩu, cập nhật profile)"""
+    _local_cache.pop_account(account_id)
+
+    try:
+        hashes = await async_redis_client.smembers(_account_key(account_id))
+        await _bump_generation(account_id, [*hashes], f"account:{account_id}")
+    except RedisError as e:
+        print(f"[TOKEN_CACHE] Redis error on invalidate account, tombstoning account {account_id}: {e}")
+        _tombstone(account_id)
+
+
+async def _flush_tombstone(account_id: int) -> bool:
+    """Thử lại INCR generation cho account bị tombstone khi Redis lỗi, True nếu đã xóa tombstone"""
+    try:
+        await _bump_generation(account_id, [], f"account:{account_id}")
+    except RedisError as e:
+        print(f"[TOKEN_CACHE] Redis error on flushing tombstone for account {account_id}: {e}")
+        return False
+    _tombstones.pop(account_id, None)
+    return True
+
+
+async def _flush_tombstones():
+    for account_id in list(_tombstones):
+        if _is_tombstoned(account_id) and not await _flush_tombstone(account_id):
+            return
+
+
+async def listen_for_invalidations():
+    """
+    Background task: nhận thông báo invalidate từ các worker khác qua Redis pub/sub
+    và xóa entry tương ứng trong LRU local.
+    """
+    while True:
+        try:
+            async with async_redis_client.pubsub() as pubsub:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                # Redis đã kết nối lại: invalidate những account lỗi trước đó cho mọi worker
+                await _flush_tombstones()
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    kind, _, value = message["data"].partition(":")
+                    if kind == "token":
+                        _local_cache.pop(value)
+                    elif kind == "account":
+                        _local_cache.pop_account(int(value))
+        except asyncio.CancelledError:
+            raise
+        except RedisError as e:
+            print(f"[TOKEN_CACHE] Invalidation listener error: {e}")
+            await asyncio.sleep(TOKEN_CACHE_LOCAL_TTL_SECONDS)
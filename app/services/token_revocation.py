@@ -0,0 +1,74 @@
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import Iterable
+
+from redis.exceptions import RedisError
+
+from app.database import async_redis_client
+
+# Config
+REVOCATION_REFRESH_SECONDS = int(os.getenv("REVOCATION_REFRESH_SECONDS", "5"))
+# Quá thời gian này chưa refresh được thì coi như danh sách revoke không còn tin cậy
+REVOCATION_MAX_STALENESS_SECONDS = int(os.getenv("REVOCATION_MAX_STALENESS_SECONDS", "60"))
+REVOKED_TOKENS_KEY = "auth:revoked-tokens"
+
+# token_id đã bị revoke và chưa hết hạn, bản sao trong process của sorted set trên Redis
+_revoked_token_ids: set[int] = set()
+_last_refreshed_at: float = 0.0
+
+
+def is_fresh() -> bool:
+    """Danh sách revoke trong process có đủ mới để xác thực token không cần database hay không"""
+    return time.monotonic() - _last_refreshed_at <= REVOCATION_MAX_STALENESS_SECONDS
+
+
+def is_revoked(token_id: int) -> bool:
+    return token_id in _revoked_token_ids
+
+
+async def revoke_tokens(tokens: Iterable[tuple[int, datetime]]):
+    """
+    Thêm (token_id, expires_at) vào danh sách revoke.
+    Mỗi token chỉ nằm trong danh sách tới khi hết hạn nên danh sách luôn nhỏ.
+    """
+    mapping = {
+        str(token_id): expires_at.timestamp()
+        for token_id, expires_at in tokens
+        if expires_at and expires_at > datetime.utcnow()
+    }
+    if not mapping:
+        return
+
+    _revoked_token_ids.update(int(token_id) for token_id in mapping)
+    try:
+        await async_redis_client.zadd(REVOKED_TOKENS_KEY, mapping)
+    except RedisError as e:
+        print(f"[TOKEN_REVOCATION] Redis error on revoke: {e}")
+
+
+async def refresh_revoked_tokens():
+    """Đọc lại danh sách revoke từ Redis, bỏ các token đã hết hạn"""
+    global _revoked_token_ids, _last_refreshed_at
+
+    now = datetime.utcnow().timestamp()
+    async with async_redis_client.pipeline(transaction=True) as pipe:
+        pipe.zremrangebyscore(REVOKED_TOKENS_KEY, "-inf", now)
+        pipe.zrange(REVOKED_TOKENS_KEY, 0, -1)
+        _, members = await pipe.execute()
+
+    _revoked_token_ids = {int(member) for member in members}
+    _last_refreshed_at = time.monotonic()
+
+
+async def refresh_periodically():
+    """Background task: refresh danh sách revoke mỗi REVOCATION_REFRESH_SECONDS giây"""
+    while True:
+        try:
+            await refresh_revoked_tokens()
+        except asyncio.CancelledError:
+            raise
+        except RedisError as e:
+            print(f"[TOKEN_REVOCATION] Refresh error: {e}")
+        await asyncio.sleep(REVOCATION_REFRESH_SECONDS)
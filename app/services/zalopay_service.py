@@ -1,10 +1,14 @@
+import asyncio
 import hashlib
 import hmac
 import json
+import random
 import time
 import os
-import requests
 from datetime import datetime
+from typing import Optional
+
+import httpx
 
 # ZaloPay Sandbox Config
 ZALOPAY_APP_ID = os.getenv("ZALOPAY_APP_ID", "2554")
@@ -13,8 +17,127 @@ ZALOPAY_KEY2 = os.getenv("ZALOPAY_KEY2", "trMrHtvjo6myautxDUiAcYsVtaeQ8nhf")
 ZALOPAY_ENDPOINT = os.getenv("ZALOPAY_ENDPOINT", "https://sb-openapi.zalopay.vn/v2")
 ZALOPAY_CALLBACK_URL = os.getenv("ZALOPAY_CALLBACK_URL", "http://localhost:8000/api/v1/zalopay/callback")
 
+# HTTP client config
+ZALOPAY_CONNECT_TIMEOUT = float(os.getenv("ZALOPAY_CONNECT_TIMEOUT", "2"))
+ZALOPAY_READ_TIMEOUT = float(os.getenv("ZALOPAY_READ_TIMEOUT", "5"))
+ZALOPAY_MAX_CONNECTIONS = int(os.getenv("ZALOPAY_MAX_CONNECTIONS", "50"))
+# Số lần thử lại query_order (query không làm thay đổi trạng thái nên thử lại an toàn)
+ZALOPAY_QUERY_RETRIES = int(os.getenv("ZALOPAY_QUERY_RETRIES", "2"))
+ZALOPAY_RETRY_BASE_DELAY = float(os.getenv("ZALOPAY_RETRY_BASE_DELAY", "0.2"))
+# Circuit breaker: mở sau N lỗi liên tiếp, thử lại sau RESET giây
+ZALOPAY_BREAKER_THRESHOLD = int(os.getenv("ZALOPAY_BREAKER_THRESHOLD", "5"))
+ZALOPAY_BREAKER_RESET_SECONDS = float(os.getenv("ZALOPAY_BREAKER_RESET_SECONDS", "30"))
+
+
+class CircuitBreaker:
+    """
+    Sau `threshold` lỗi liên tiếp thì mở mạch: các request bị từ chối ngay trong
+    `reset_seconds` giây thay vì chờ timeout. Hết thời gian đó cho đúng một request đi thử
+    (half-open): thành công thì đóng mạch, lỗi thì mở lại thêm `reset_seconds` giây.
+    """
+
+    def __init__(self, threshold: int, reset_seconds: float):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "half-open":
+            # Đặt lại mốc để các request khác vẫn bị từ chối trong lúc request thử đang chạy
+            self.opened_at = time.monotonic()
+            return True
+        return state == "closed"
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+
+breaker = CircuitBreaker(ZALOPAY_BREAKER_THRESHOLD, ZALOPAY_BREAKER_RESET_SECONDS)
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """AsyncClient dùng chung, giữ kết nối keep-alive tới ZaloPay"""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            base_url=ZALOPAY_ENDPOINT,
+            timeout=httpx.Timeout(
+                ZALOPAY_READ_TIMEOUT,
+                connect=ZALOPAY_CONNECT_TIMEOUT,
+                pool=ZALOPAY_CONNECT_TIMEOUT
+            ),
+            limits=httpx.Limits(
+                max_connections=ZALOPAY_MAX_CONNECTIONS,
+                max_keepalive_connections=ZALOPAY_MAX_CONNECTIONS
+            )
+        )
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+class _GatewayError(Exception):
+    """Lỗi phía ZaloPay (5xx) - tính vào circuit breaker như lỗi kết nối"""
+
+
+async def _post(path: str, data: dict, retries: int, retry_on: tuple) -> dict:
+    """
+    POST form tới ZaloPay qua circuit breaker.
+    Thử lại tối đa `retries` lần với các lỗi thuộc `retry_on`, chờ theo exponential backoff có jitter.
+    Lỗi cuối cùng được trả về dạng {"return_code": -1, ...} như trước.
+    """
+    if not breaker.allow():
+        return {"return_code": -1, "return_message": "ZaloPay is temporarily unavailable"}
+
+    attempt = 0
+    while True:
+        try:
+            response = await get_client().post(path, data=data)
+            if response.status_code >= 500:
+                raise _GatewayError(f"HTTP {response.status_code}")
+            result = response.json()
+            breaker.record_success()
+            return result
+        except (httpx.TransportError, _GatewayError) as e:
+            if attempt < retries and isinstance(e, retry_on):
+                attempt += 1
+                delay = random.uniform(0, ZALOPAY_RETRY_BASE_DELAY * 2 ** attempt)
+                print(f"[ZaloPay] {path} failed ({type(e).__name__}: {e}), retry {attempt} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                continue
+            breaker.record_failure()
+            print(f"[ZaloPay] Error: {type(e).__name__}: {e}")
+            return {"return_code": -1, "return_message": str(e) or type(e).__name__}
+        except ValueError as e:
+            # Response không phải JSON
+            breaker.record_success()
+            print(f"[ZaloPay] Invalid response: {e}")
+            return {"return_code": -1, "return_message": "invalid response from ZaloPay"}
+
 
-def create_order(
+async def create_order(
     booking_id: int,
     amount: int,
     description: str,
@@ -49,15 +172,11 @@ def create_order(
         "mac": mac
     }
 
-    try:
-        response = requests.post(f"{ZALOPAY_ENDPOINT}/create", data=order, timeout=30)
-        result = response.json()
-        result["app_trans_id"] = app_trans_id
-        print(f"[ZaloPay] Response: {result}")
-        return result
-    except Exception as e:
-        print(f"[ZaloPay] Error: {str(e)}")
-        return {"return_code": -1, "return_message": str(e)}
+    # Tạo đơn không idempotent: chỉ thử lại khi chưa kết nối được (request chưa được gửi đi)
+    result = await _post("/create", order, retries=1, retry_on=(httpx.ConnectError, httpx.ConnectTimeout))
+    result["app_trans_id"] = app_trans_id
+    print(f"[ZaloPay] Response: {result}")
+    return result
 
 
 def verify_callback(data: str, mac: str) -> bool:
@@ -66,7 +185,7 @@ def verify_callback(data: str, mac: str) -> bool:
     return computed_mac == mac
 
 
-def query_order(app_trans_id: str) -> dict:
+async def query_order(app_trans_id: str) -> dict:
     """Query trạng thái đơn hàng từ ZaloPay"""
     raw_data = f"{ZALOPAY_APP_ID}|{app_trans_id}|{ZALOPAY_KEY1}"
     mac = hmac.new(ZALOPAY_KEY1.encode(), raw_data.encode(), hashlib.sha256).hexdigest()
@@ -77,8 +196,8 @@ def query_order(app_trans_id: str) -> dict:
         "mac": mac
     }
 
-    try:
-        response = requests.post(f"{ZALOPAY_ENDPOINT}/query", data=params, timeout=30)
-        return response.json()
-    except Exception as e:
-        return {"return_code": -1, "return_message": str(e)}
+    return await _post(
+        "/query", params,
+        retries=ZALOPAY_QUERY_RETRIES,
+        retry_on=(httpx.TransportError, _GatewayError)
+    )
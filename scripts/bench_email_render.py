@@ -0,0 +1,119 @@
+"""
+Benchmark render email hóa đơn: Environment tạo mới mỗi email (cách cũ) so với Environment
+dùng chung, và render hàng loạt qua render_booking_invoices.
+
+Không cần database hay SendGrid, dữ liệu booking được sinh giả:
+
+    python scripts/bench_email_render.py --emails 2000 --details 3 --processes 4
+
+--processes N chạy N process song song (mỗi process một core) để đo throughput theo core.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def fake_booking(booking_id: int, details: int):
+    now = datetime(2025, 1, 1, 14, 0)
+    booking_details = []
+    invoices = []
+    for i in range(details):
+        resort = SimpleNamespace(name=f"Resort {i}", address=f"{i} Trần Phú, Nha Trang")
+        room_type = SimpleNamespace(name=f"Deluxe {i}", resort=resort)
+        offer = SimpleNamespace(cost=1500000, room_type=room_type)
+        booking_details.append(SimpleNamespace(
+            offer=offer,
+            number_of_rooms=2,
+            started_at=now,
+            finished_at=now + timedelta(days=3),
+            cost=9000000
+        ))
+        invoices.append(SimpleNamespace(
+            id=booking_id * 10 + i, cost=9000000, payment_method="ZALOPAY", finished_time=now
+        ))
+    return booking_details, invoices
+
+
+def build_contexts(emails: int, details: int) -> list[dict]:
+    from app.services.email_service import build_invoice_context
+
+    contexts = []
+    for booking_id in range(1, emails + 1):
+        booking_details, invoices = fake_booking(booking_id, details)
+        contexts.append(build_invoice_context(
+            customer_email=f"customer{booking_id}@example.com",
+            customer_name=f"Khách hàng {booking_id}",
+            customer_phone="0900000000",
+            booking_id=booking_id,
+            booking_details=booking_details,
+            invoices=invoices,
+            total_cost=9000000 * details,
+            payment_time=datetime(2025, 1, 1, 15, 0)
+        ))
+    return contexts
+
+
+def render_uncached(contexts: list[dict]):
+    from jinja2 import Environment, FileSystemLoader
+    from app.services.email_service import TEMPLATE_DIR, INVOICE_TEMPLATE
+
+    for context in contexts:
+        env = Environment(loader=FileSystemLoader(TEMPLATE_DIR))
+        env.get_template(INVOICE_TEMPLATE).render(context, current_year=2025)
+
+
+def render_cached(contexts: list[dict]):
+    from app.services.email_service import render_booking_invoice
+
+    for context in contexts:
+        render_booking_invoice(context)
+
+
+def render_bulk(contexts: list[dict]):
+    from app.services.email_service import render_booking_invoices
+
+    render_booking_invoices(contexts)
+
+
+MODES = {"uncached": render_uncached, "cached": render_cached, "bulk": render_bulk}
+
+
+def run(mode: str, emails: int, details: int) -> float:
+    """Chạy trong process con, trả về số email render được mỗi giây"""
+    from app.services.email_service import load_templates
+
+    contexts = build_contexts(emails, details)
+    load_templates()
+    started = time.perf_counter()
+    MODES[mode](contexts)
+    return emails / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emails", type=int, default=1000, help="Số email mỗi process render")
+    parser.add_argument("--details", type=int, default=3, help="Số booking detail mỗi email")
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with ProcessPoolExecutor(max_workers=args.processes) as pool:
+        for mode in MODES:
+            rates = []
+            for _ in range(args.repeat):
+                futures = [pool.submit(run, mode, args.emails, args.details) for _ in range(args.processes)]
+                rates.extend(f.result() for f in futures)
+            print(f"{mode:>9}: {statistics.median(rates):8.0f} emails/s per core "
+                  f"(min {min(rates):.0f}, max {max(rates):.0f}), "
+                  f"~{statistics.median(rates) * args.processes:.0f} emails/s with {args.processes} process(es)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Benchmark phần chạy trong worker của /partner/occupancy khi cache miss
+(app.services.occupancy.build_matrix + json.dumps) trên dữ liệu giả, không cần database hay Redis:
+
+    python scripts/bench_occupancy.py --rooms 500 --days 365 --occupancy 0.7
+
+Chuỗi đêm của mỗi phòng được dựng sẵn bằng Python, giống kết quả của ROOM_BITMAPS_SQL.
+In thời gian và kích thước response của hai encoding.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app.models  # noqa: F401 - nạp models trước app.database để tránh import vòng
+from app.services.occupancy import build_matrix
+
+
+def fake_rooms(rooms: int, days: int, occupancy: float) -> tuple[list, int]:
+    """Mỗi phòng là chuỗi kỳ nghỉ 1-6 đêm xen kẽ khoảng trống, tỉ lệ lấp đầy xấp xỉ occupancy"""
+    rng = random.Random(42)
+    result = []
+    stays = 0
+    for room_id in range(1, rooms + 1):
+        nights = ["0"] * days
+        day = rng.randint(0, 3)
+        while day < days:
+            length = rng.randint(1, 6)
+            nights[day:min(day + length, days)] = "1" * (min(day + length, days) - day)
+            stays += 1
+            gap = max(1, round(length * (1 - occupancy) / occupancy))
+            day += length + rng.randint(0, gap * 2)
+        result.append((room_id, str(100 + room_id), f"Type {room_id % 5}", "".join(nights)))
+    return result, stays
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rooms", type=int, default=500)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--occupancy", type=float, default=0.7)
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    start = date.today()
+    rooms, stays = fake_rooms(args.rooms, args.days, args.occupancy)
+    print(f"{len(rooms)} rooms, {stays} timeslots, {args.days} days")
+
+    for encoding in ("bitmap", "rle"):
+        timings = []
+        for _ in range(args.iterations):
+            t0 = time.perf_counter()
+            body = json.dumps(build_matrix(rooms, start, args.days, encoding), separators=(",", ":"))
+            timings.append((time.perf_counter() - t0) * 1000)
+        timings.sort()
+        print(f"{encoding:>6}: median={statistics.median(timings):6.2f}ms "
+              f"p95={timings[int(len(timings) * 0.95) - 1]:6.2f}ms size={len(body) / 1024:7.1f}KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Benchmark /api/v1/search: bản cũ (2N+1 truy vấn) so với bản hiện tại
+(một câu truy vấn + thông tin resort từ catalog cache, cần Redis).
+
+Chạy trên database đã có dữ liệu mẫu (sql/init.sql + sql/insert_data.sql):
+
+    python scripts/bench_search.py --scale 100 --iterations 30
+
+--scale N nhân bản resort, room_type, room, resort_images, service, booking_timeslot
+thành N lần dữ liệu gốc trước khi đo. Lệnh này GHI vào database, chỉ chạy trên database
+dùng để test. Bỏ --scale nếu dữ liệu đã được nhân bản từ lần chạy trước.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select, func, and_, text
+
+from app.db_async import AsyncSessionLocal
+from app.models.resort import Resort
+from app.models.room_type import RoomType
+from app.models.room import Room
+from app.models.booking_timeslot import BookingTimeSlot
+from app.models.resort_images import ResortImage
+from app.models.service import Service
+from app.routers.public.search import search_resorts
+
+
+SCALE_UP_SQL = [
+    """
+    INSERT INTO resort (id, partner_id, name, address, ward_id, img_360_url, rating)
+    SELECT r.id + k * :resort_off, r.partner_id, r.name || ' #' || k, r.address, r.ward_id, r.img_360_url, r.rating
+    FROM resort r, generate_series(1, :copies) k
+    WHERE r.id <= :resort_off
+    """,
+    """
+    INSERT INTO room_type (id, resort_id, name, area, quantity_standard, quality_standard, bed_amount, people_amount, price)
+    SELECT t.id + k * :room_type_off, t.resort_id + k * :resort_off, t.name, t.area, t.quantity_standard,
+           t.quality_standard, t.bed_amount, t.people_amount, t.price
+    FROM room_type t, generate_series(1, :copies) k
+    WHERE t.id <= :room_type_off
+    """,
+    """
+    INSERT INTO room (id, room_type_id, number, status)
+    SELECT r.id + k * :room_off, r.room_type_id + k * :room_type_off, r.number, r.status
+    FROM room r, generate_series(1, :copies) k
+    WHERE r.id <= :room_off
+    """,
+    """
+    INSERT INTO resort_images (resort_id, url)
+    SELECT i.resort_id + k * :resort_off, i.url
+    FROM resort_images i, generate_series(1, :copies) k
+    WHERE i.resort_id <= :resort_off
+    """,
+    """
+    INSERT INTO service (name, resort_id)
+    SELECT s.name, s.resort_id + k * :resort_off
+    FROM service s, generate_series(1, :copies) k
+    WHERE s.resort_id <= :resort_off
+    """,
+    """
+    INSERT INTO booking_timeslot (room_id, started_time, finished_time, invoice_id)
+    SELECT b.room_id + k * :room_off, b.started_time, b.finished_time, b.invoice_id
+    FROM booking_timeslot b, generate_series(1, :copies) k
+    WHERE b.room_id <= :room_off
+    """,
+]
+
+
+async def scale_up(copies: int):
+    async with AsyncSessionLocal() as db:
+        offsets = {}
+        for key, table in (("resort_off", "resort"), ("room_type_off", "room_type"), ("room_off", "room")):
+            offsets[key] = (await db.execute(text(f"SELECT COALESCE(MAX(id), 0) FROM {table}"))).scalar()
+
+        for sql in SCALE_UP_SQL:
+            await db.execute(text(sql), {"copies": copies, **offsets})
+
+        for table in ("resort", "room_type", "room", "resort_images", "service"):
+            await db.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT MAX(id) FROM {table}))"
+            ))
+        await db.commit()
+
+
+async def search_resorts_old(db, checkin_date: datetime, checkout_date: datetime, number: int):
+    """Bản cũ của search_resorts: 1 truy vấn chính + 2 truy vấn cho mỗi resort"""
+    subq = (
+        select(BookingTimeSlot.room_id)
+        .where(
+            and_(
+                BookingTimeSlot.started_time < checkout_date,
+                BookingTimeSlot.finished_time > checkin_date
+            )
+        )
+    )
+    stmt = (
+        select(
+            Resort.id,
+            Resort.name,
+            Resort.address,
+            Resort.rating,
+            func.min(RoomType.price).label("min_price")
+        )
+        .join(RoomType, RoomType.resort_id == Resort.id)
+        .join(Room, Room.room_type_id == RoomType.id)
+        .where(~Room.id.in_(subq) & (RoomType.people_amount >= number))
+        .group_by(Resort.id)
+    )
+    resorts = (await db.execute(stmt)).all()
+
+    output = []
+    for r in resorts:
+        img_result = await db.execute(
+            select(ResortImage.url).where(ResortImage.resort_id == r.id).limit(4)
+        )
+        sv_result = await db.execute(
+            select(Service.name).where(Service.resort_id == r.id)
+        )
+        output.append({
+            "id": r.id,
+            "images": [row[0] for row in img_result.all()],
+            "services": [row[0] for row in sv_result.all()]
+        })
+    return output
+
+
+async def measure(label: str, make_call, iterations: int):
+    timings = []
+    result_size = 0
+    for _ in range(iterations):
+        async with AsyncSessionLocal() as db:
+            started = time.perf_counter()
+            result = await make_call(db)
+            timings.append((time.perf_counter() - started) * 1000)
+            result_size = len(result)
+
+    timings.sort()
+    p95 = timings[max(0, int(len(timings) * 0.95) - 1)]
+    print(f"{label:<14} resorts={result_size:<6} mean={statistics.mean(timings):8.2f}ms "
+          f"p50={statistics.median(timings):8.2f}ms p95={p95:8.2f}ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=int, default=0, help="Nhân dữ liệu mẫu lên N lần trước khi đo")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--number", type=int, default=1, help="Số người (tham số number của /search)")
+    args = parser.parse_args()
+
+    if args.scale > 1:
+        print(f"Scaling seed data x{args.scale}...")
+        await scale_up(args.scale - 1)
+
+    checkin = datetime.now()
+    checkout = checkin + timedelta(days=7)
+
+    # Warm up connection pool và catalog cache
+    await measure("warmup", lambda db: search_resorts(None, None, args.number, None, db), 1)
+
+    await measure("old (2N+1)", lambda db: search_resorts_old(db, checkin, checkout, args.number), args.iterations)
+    await measure("new (1+cache)", lambda db: search_resorts(None, None, args.number, None, db), args.iterations)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
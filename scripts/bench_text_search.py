@@ -0,0 +1,87 @@
+"""
+Benchmark tìm kiếm không dấu / gần đúng (app.services.text_search) trên một bảng tạm.
+
+Cần `alembic upgrade head` (extension pg_trgm, unaccent và hàm search_normalize):
+
+    python scripts/bench_text_search.py --rows 1000000 --iterations 50
+
+Script tạo TEMP TABLE với --rows tên dạng "<họ> <tên đệm> <tên> - <tỉnh>" có dấu, dựng GIN trigram
+index giống migration c4a8e2f7b913, rồi đo matches() + rank() như /api/v1/search với các từ khóa
+không dấu, sai chính tả và quá ngắn. Bảng tạm tự mất khi kết thúc, không ghi vào bảng thật.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import Column, Integer, MetaData, Table, Text, select, text
+
+from app.db_async import AsyncSessionLocal
+from app.services import text_search
+
+TERMS = ["Da Nang", "nguyen van", "Hoi An", "nguyn", "ha long bay", "xyz", "an"]
+
+FILL_SQL = """
+    INSERT INTO bench_text_search (id, name)
+    SELECT g,
+           (ARRAY['Nguyễn','Trần','Lê','Phạm','Hoàng','Huỳnh','Phan','Võ','Đặng','Bùi'])[1 + g % 10] || ' ' ||
+           (ARRAY['Văn','Thị','Hữu','Đức','Minh','Ngọc','Thanh','Quốc'])[1 + (g / 10) % 8] || ' ' ||
+           (ARRAY['An','Bình','Cường','Dũng','Giang','Hải','Khánh','Linh','Nam','Phúc','Quân','Sơn','Tâm','Vy'])[1 + (g / 80) % 14]
+           || ' - ' ||
+           (ARRAY['Đà Nẵng','Hội An','Hạ Long','Nha Trang','Phú Quốc','Đà Lạt','Sa Pa','Huế','Quy Nhơn','Vũng Tàu'])[1 + (g / 1120) % 10]
+           || ' ' || g
+    FROM generate_series(1, :rows) g
+"""
+
+bench = Table(
+    "bench_text_search",
+    MetaData(),
+    Column("id", Integer, primary_key=True),
+    Column("name", Text),
+)
+
+
+async def main(rows: int, iterations: int, limit: int):
+    async with AsyncSessionLocal() as db:
+        await db.execute(text("CREATE TEMP TABLE bench_text_search (id integer PRIMARY KEY, name text)"))
+        started = time.perf_counter()
+        await db.execute(text(FILL_SQL), {"rows": rows})
+        await db.execute(text(
+            "CREATE INDEX ON bench_text_search USING gin (search_normalize(name) gin_trgm_ops)"
+        ))
+        await db.execute(text("ANALYZE bench_text_search"))
+        print(f"Prepared {rows} rows + GIN index in {time.perf_counter() - started:.1f}s")
+
+        for term in TERMS:
+            stmt = (
+                select(bench.c.id, bench.c.name)
+                .where(text_search.matches(term, bench.c.name))
+                .order_by(text_search.rank(term, bench.c.name).desc(), bench.c.id)
+                .limit(limit)
+            )
+            timings = []
+            for _ in range(iterations):
+                t0 = time.perf_counter()
+                found = (await db.execute(stmt)).all()
+                timings.append((time.perf_counter() - t0) * 1000)
+
+            timings.sort()
+            p95 = timings[max(0, int(len(timings) * 0.95) - 1)]
+            top = found[0].name if found else "-"
+            print(f"{term!r:16} median={statistics.median(timings):7.2f}ms p95={p95:7.2f}ms "
+                  f"rows={len(found):3} top={top!r}")
+
+        await db.rollback()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=20, help="Số kết quả mỗi truy vấn (LIMIT)")
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.iterations, args.limit))
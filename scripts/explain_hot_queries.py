@@ -0,0 +1,143 @@
+"""
+Kiểm tra các truy vấn nóng có dùng index hay không bằng EXPLAIN.
+
+Chạy sau khi `alembic upgrade head` trên database đã có dữ liệu mẫu:
+
+    python scripts/explain_hot_queries.py
+
+Script tắt seq scan (SET enable_seqscan = off) để planner chọn index nếu index dùng được,
+sau đó kiểm tra plan của mỗi truy vấn có Index Scan / Index Only Scan / Bitmap Heap Scan
+trên bảng cần kiểm tra. Thoát với mã 1 nếu có truy vấn không dùng index, dùng được trong CI.
+"""
+import asyncio
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select, func, text
+
+from app.db_async import AsyncSessionLocal
+from app.models.account import Account
+from app.models.account_token import AccountToken
+from app.models.booking import Booking
+from app.models.booking_detail import BookingDetail
+from app.models.booking_timeslot import BookingTimeSlot
+from app.models.customer import Customer
+from app.models.invoice import Invoice
+from app.models.offer import Offer
+from app.models.partner import Partner
+from app.models.resort import Resort
+from app.models.resort_images import ResortImage
+from app.models.room import Room
+from app.models.room_images import RoomImage
+from app.models.room_type import RoomType
+from app.models.room_type_day_availability import RoomTypeDayAvailability
+from app.models.service import Service
+from app.models.withdraw import Withdraw
+from app.services import text_search
+
+
+INDEX_NODES = {"Index Scan", "Index Only Scan", "Bitmap Heap Scan"}
+
+
+def hot_queries():
+    """(tên, bảng phải được đọc qua index, câu truy vấn)"""
+    checkin = datetime.now()
+    checkout = checkin + timedelta(days=7)
+
+    return [
+        ("validate token", "account_token",
+         select(AccountToken.token_id).where(AccountToken.token_value == "token")),
+        ("room overlap", "booking_timeslot",
+         select(BookingTimeSlot.room_id).where(
+             BookingTimeSlot.room_id == 1,
+             BookingTimeSlot.overlaps(checkin, checkout)
+         )),
+        ("timeslots by invoice", "booking_timeslot",
+         select(BookingTimeSlot.room_id).where(BookingTimeSlot.invoice_id == 1)),
+        ("cart / history", "booking",
+         select(Booking.id).where(Booking.customer_id == 1, Booking.status == "Cart")),
+        ("zalopay callback", "booking",
+         select(Booking.id).where(Booking.zp_trans_id == "trans")),
+        ("booking details", "booking_detail",
+         select(BookingDetail.id).where(BookingDetail.booking_id == 1, BookingDetail.status == "Cart")),
+        ("partner revenue", "invoice",
+         select(func.sum(Invoice.cost)).where(
+             Invoice.partner_id == 1,
+             Invoice.finished_time >= checkin - timedelta(days=30)
+         )),
+        ("invoices by detail", "invoice",
+         select(Invoice.id).where(Invoice.booking_detail_id == 1)),
+        ("resort images", "resort_images",
+         select(ResortImage.url).where(ResortImage.resort_id == 1)),
+        ("resort services", "service",
+         select(Service.name).where(Service.resort_id == 1)),
+        ("room types of resort", "room_type",
+         select(RoomType.id).where(RoomType.resort_id == 1)),
+        ("room type images", "room_images",
+         select(RoomImage.url).where(RoomImage.room_type_id == 1)),
+        ("room type offers", "offer",
+         select(Offer.id).where(Offer.room_type_id == 1)),
+        ("search overlap subquery", "booking_timeslot",
+         select(Room.id)
+         .join(BookingTimeSlot, BookingTimeSlot.room_id == Room.id)
+         .where(Room.room_type_id == 1, BookingTimeSlot.overlaps(checkin, checkout))),
+        ("daily availability counters", "room_type_day_availability",
+         select(func.max(RoomTypeDayAvailability.booked_rooms))
+         .where(
+             RoomTypeDayAvailability.room_type_id == 1,
+             RoomTypeDayAvailability.day.between(checkin.date(), checkout.date())
+         )),
+        ("partner withdrawals", "withdraw",
+         select(Withdraw.id)
+         .where(Withdraw.partner_id == 1)
+         .order_by(Withdraw.created_at.desc(), Withdraw.id.desc())
+         .limit(50)),
+        ("resort search by name", "resort",
+         select(Resort.id).where(text_search.matches("da nang", Resort.name))),
+        ("resort search by address", "resort",
+         select(Resort.id).where(text_search.matches("da nang", Resort.address))),
+        ("account search by username", "account",
+         select(Account.account_id).where(text_search.matches("nguyen", Account.username))),
+        ("customer search by fullname", "customer",
+         select(Customer.id).where(text_search.matches("nguyen", Customer.fullname))),
+        ("partner search by name", "partner",
+         select(Partner.id).where(text_search.matches("nguyen", Partner.name))),
+    ]
+
+
+def scanned_with_index(plan: dict, relation: str) -> bool:
+    """Duyệt cây plan, True nếu relation được đọc qua một node dùng index"""
+    if plan.get("Relation Name") == relation and plan.get("Node Type") in INDEX_NODES:
+        return True
+    return any(scanned_with_index(child, relation) for child in plan.get("Plans", []))
+
+
+async def main():
+    failed = 0
+    async with AsyncSessionLocal() as db:
+        await db.execute(text("SET enable_seqscan = off"))
+        dialect = db.bind.dialect
+
+        for name, relation, stmt in hot_queries():
+            sql = str(stmt.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+            raw = (await db.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"))).scalar()
+            plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]["Plan"]
+
+            if scanned_with_index(plan, relation):
+                print(f"[OK]   {name} ({relation})")
+            else:
+                failed += 1
+                print(f"[FAIL] {name}: {relation} không được đọc qua index")
+                print(json.dumps(plan, indent=2))
+
+    if failed:
+        print(f"{failed} truy vấn không dùng index")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,146 @@
+"""
+Fake ZaloPay server để chạy và load test client ZaloPay mà không cần sandbox.
+
+Chạy server (độ trễ và tỉ lệ lỗi giả lập có thể chỉnh):
+
+    python scripts/fake_zalopay.py serve --port 9000 --latency-ms 50 --error-rate 0.05
+
+Trỏ app tới server này:
+
+    ZALOPAY_ENDPOINT=http://localhost:9000/v2 uvicorn app.main:app
+
+Load test client (app/services/zalopay_service.py) trực tiếp:
+
+    ZALOPAY_ENDPOINT=http://localhost:9000/v2 python scripts/fake_zalopay.py load --requests 2000 --concurrency 100
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import os
+import random
+import statistics
+import sys
+import time
+from urllib.parse import parse_qs
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def build_app(latency_ms: float, error_rate: float, key1: str):
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse
+
+    app = FastAPI(title="Fake ZaloPay")
+    orders: dict[str, dict] = {}
+
+    async def simulate():
+        if latency_ms:
+            await asyncio.sleep(random.uniform(0.5, 1.5) * latency_ms / 1000)
+        if random.random() < error_rate:
+            return JSONResponse(status_code=503, content={"return_code": -1, "return_message": "fake outage"})
+        return None
+
+    async def read_form(request: Request) -> dict:
+        # Tự parse form urlencoded để không cần thêm python-multipart
+        return {k: v[0] for k, v in parse_qs((await request.body()).decode(), keep_blank_values=True).items()}
+
+    @app.post("/v2/create")
+    async def create(request: Request):
+        if (failure := await simulate()) is not None:
+            return failure
+
+        form = await read_form(request)
+        raw_data = "|".join(form.get(k, "") for k in (
+            "app_id", "app_trans_id", "app_user", "amount", "app_time", "embed_data", "item"
+        ))
+        if hmac.new(key1.encode(), raw_data.encode(), hashlib.sha256).hexdigest() != form.get("mac"):
+            return {"return_code": 2, "return_message": "mac invalid"}
+
+        app_trans_id = form["app_trans_id"]
+        orders[app_trans_id] = {"amount": int(form["amount"]), "created_at": time.time()}
+        token = hashlib.sha1(app_trans_id.encode()).hexdigest()
+        return {
+            "return_code": 1,
+            "return_message": "success",
+            "order_url": f"http://localhost/fake-zalopay/{token}",
+            "zp_trans_token": token,
+        }
+
+    @app.post("/v2/query")
+    async def query(request: Request):
+        if (failure := await simulate()) is not None:
+            return failure
+
+        app_trans_id = (await read_form(request)).get("app_trans_id", "")
+        order = orders.get(app_trans_id)
+        if order is None:
+            # Đơn không do server này tạo: coi như đã thanh toán để test luồng query
+            order = orders.setdefault(app_trans_id, {"amount": 0, "created_at": 0})
+        return {
+            "return_code": 1,
+            "return_message": "success",
+            "is_processing": False,
+            "amount": order["amount"],
+            "zp_trans_id": int(order["created_at"] * 1000) % 10**9,
+        }
+
+    return app
+
+
+async def load(total: int, concurrency: int, create_every: int):
+    from app.services import zalopay_service
+
+    semaphore = asyncio.Semaphore(concurrency)
+    timings = []
+    codes: dict[int, int] = {}
+
+    async def one(i: int):
+        async with semaphore:
+            started = time.perf_counter()
+            if create_every and i % create_every == 0:
+                result = await zalopay_service.create_order(i, 100000, f"Load test #{i}")
+            else:
+                result = await zalopay_service.query_order(f"loadtest_{i}")
+            timings.append((time.perf_counter() - started) * 1000)
+            code = result.get("return_code")
+            codes[code] = codes.get(code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - started
+    await zalopay_service.close_client()
+
+    timings.sort()
+    print(f"requests={total} concurrency={concurrency} elapsed={elapsed:.2f}s rps={total / elapsed:.0f}")
+    print(f"latency mean={statistics.mean(timings):.1f}ms p50={statistics.median(timings):.1f}ms "
+          f"p99={timings[max(0, int(len(timings) * 0.99) - 1)]:.1f}ms")
+    print(f"return_code counts={codes} breaker={zalopay_service.breaker.state}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    serve = sub.add_parser("serve")
+    serve.add_argument("--port", type=int, default=9000)
+    serve.add_argument("--latency-ms", type=float, default=50)
+    serve.add_argument("--error-rate", type=float, default=0.0)
+
+    load_test = sub.add_parser("load")
+    load_test.add_argument("--requests", type=int, default=1000)
+    load_test.add_argument("--concurrency", type=int, default=50)
+    load_test.add_argument("--create-every", type=int, default=0,
+                           help="Cứ N request thì có 1 create_order, còn lại là query_order (0 = chỉ query)")
+
+    args = parser.parse_args()
+    if args.command == "serve":
+        import uvicorn
+        key1 = os.getenv("ZALOPAY_KEY1", "sdngKKJmqEMzvh5QQcdD2A9XBSKUNaYn")
+        uvicorn.run(build_app(args.latency_ms, args.error_rate, key1), host="0.0.0.0", port=args.port, log_level="warning")
+    else:
+        asyncio.run(load(args.requests, args.concurrency, args.create_every))
+
+
+if __name__ == "__main__":
+    main()